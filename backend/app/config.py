@@ -4,14 +4,43 @@ from typing import List, Optional
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./automatic_switch.db"
+    # SQLite pragmas applied to every connection (empty/0 keeps the SQLite default)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 16384
+    SQLITE_MMAP_SIZE: int = 134217728
+    CONFIG_COMPRESSION_LEVEL: int = 6 # zlib level for stored running-configs
     
     # Serial Defaults
     SERIAL_BAUDRATE: int = 9600
     SERIAL_TIMEOUT: int = 10
     SERIAL_PORT_BASE_PATH: str = "/home/administrator/port"
+    SERIAL_PIPELINE_WINDOW: int = 128 # bytes written ahead of the console when pipelining
+    # A command without a prompt (or a failing port) is retried after reopening the port and re-syncing the prompt
+    SERIAL_RETRIES: int = 2 # 0 fails the device on the first timeout
+    SERIAL_RETRY_BACKOFF: float = 1.0 # seconds before the first retry, doubled for each further one
+    SERIAL_RETRY_MAX_BACKOFF: float = 10.0
+    SERIAL_RESYNC_BREAK: bool = False # send a serial break before the newline when re-syncing
+    SERIAL_PORT_LOCK_WAIT: float = 600.0 # seconds to wait for a port another executor has open before failing the device
+    
+    # Templates
+    TEMPLATE_AUTO_RELOAD: bool = True # recompile a vendor template after its file changed
+    TEMPLATE_BYTECODE_CACHE_DIR: Optional[str] = None # e.g. /var/cache/automatic-switch/jinja
+    VALIDATION_CACHE_SIZE: int = 50000 # devices whose dry-run results are kept between validations
+    PREVIEW_CACHE_SIZE: int = 50000 # devices whose rendered preview is kept
+    PREVIEW_WORKERS: int = 4 # threads rendering bulk previews and the plans of new runs
     
     # Execution
     DEFAULT_PARALLELISM: int = 4
+    RUN_EVENTS_POLL_INTERVAL: float = 0.5 # seconds between checks of a streamed run for new events
+    REPORT_CACHE_DIR: Optional[str] = "./report_cache" # reports of finished runs; empty disables the cache
+    # Run executor (python -m backend.app.executor)
+    EXECUTOR_EMBEDDED: bool = False # also execute runs inside the API process (single-process setups)
+    EXECUTOR_MAX_RUNS: int = 1 # runs one executor works on at the same time
+    EXECUTOR_POLL_INTERVAL: float = 1.0 # seconds between looks at the queue when idle
+    EXECUTOR_LEASE_SECONDS: float = 30.0 # a run whose executor stopped renewing for this long is taken over
+    EXECUTOR_MAX_ATTEMPTS: int = 3 # executions of a run (takeovers included) before it is failed
     
     # Security
     API_PASSCODE: Optional[str] = None
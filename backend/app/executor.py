@@ -0,0 +1,124 @@
+"""
+Run executor: claims queued runs from the database and executes them in its
+own process, so serial I/O and parsing never compete with the API for the
+event loop. Several executors (or API workers) can share one database; the
+run lease makes sure each run is executed by exactly one of them. Console
+ports are locked per process: a device whose port another executor is using
+waits for it (SERIAL_PORT_LOCK_WAIT) when opening it.
+
+    python -m backend.app.executor
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..core.services.scheduler import RunManager
+from ..infra import database, repository
+from ..infra.database import AsyncSessionLocal
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class RunExecutor:
+    def __init__(self, owner: Optional[str] = None, max_runs: Optional[int] = None, poll_interval: Optional[float] = None, lease_seconds: Optional[float] = None):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_runs = max_runs or settings.EXECUTOR_MAX_RUNS
+        self.poll_interval = poll_interval or settings.EXECUTOR_POLL_INTERVAL
+        self.lease_seconds = lease_seconds or settings.EXECUTOR_LEASE_SECONDS
+        self.running: Dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run_forever(self):
+        logger.info(f"Executor {self.owner} waiting for runs")
+        try:
+            while not self._stopping.is_set():
+                claimed = None
+                if len(self.running) < self.max_runs:
+                    async with AsyncSessionLocal() as db:
+                        claimed = await repository.claim_next_run_async(db, self.owner, self.lease_seconds, settings.EXECUTOR_MAX_ATTEMPTS)
+                if claimed is not None:
+                    logger.info(f"Executor {self.owner} claimed run {claimed}")
+                    task = asyncio.create_task(self._execute(claimed))
+                    self.running[claimed] = task
+                    task.add_done_callback(lambda _, run_id=claimed: self.running.pop(run_id, None))
+                    continue
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Stops the runs in progress and hands them back to the queue."""
+        tasks = list(self.running.items())
+        for _, task in tasks:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        async with AsyncSessionLocal() as db:
+            for run_id, _ in tasks:
+                if await repository.release_run_async(db, run_id, self.owner):
+                    logger.info(f"Run {run_id} put back into the queue")
+
+    async def _execute(self, run_id: int):
+        execution = asyncio.create_task(RunManager(run_id).execute_run())
+        heartbeat = asyncio.create_task(self._heartbeat(run_id, execution))
+        try:
+            # Returns when the run is done or the heartbeat cancelled it
+            await asyncio.wait({execution})
+        finally:
+            heartbeat.cancel()
+            execution.cancel()
+            await asyncio.gather(execution, heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, run_id: int, execution: asyncio.Task):
+        interval = self.lease_seconds / 3
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + self.lease_seconds
+        async with AsyncSessionLocal() as db:
+            while True:
+                await asyncio.sleep(interval)
+                attempted_at = loop.time()
+                try:
+                    renewed = await repository.renew_run_lease_async(db, run_id, self.owner, self.lease_seconds)
+                except SQLAlchemyError as e:
+                    # E.g. "database is locked" under write contention: try again on the next tick
+                    await db.rollback()
+                    if loop.time() + interval < expires_at:
+                        logger.warning(f"Executor {self.owner} could not renew the lease of run {run_id}, retrying: {e}")
+                        continue
+                    # Another executor may take the run over once the lease expires
+                    logger.error(f"Executor {self.owner} could not renew the lease of run {run_id} before it expires, stopping it: {e}")
+                    execution.cancel()
+                    return
+                expires_at = attempted_at + self.lease_seconds
+                if not renewed:
+                    # Another executor took the run over; stop touching its devices
+                    logger.error(f"Executor {self.owner} lost the lease of run {run_id}, stopping it")
+                    execution.cancel()
+                    return
+
+def main():
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    database.init_db()
+
+    async def serve():
+        executor = RunExecutor()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, executor.stop)
+        await executor.run_forever()
+
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
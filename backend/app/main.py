@@ -1,28 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks, Response, Request
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Response, Request, Header, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import List, Optional
 from pathlib import Path
 
-from ..infra import database, repository
-from ..core import models, services, policy
+from ..infra import database, repository, config_store
+from ..core import models, services, policy, config_plan
 from ..infra.serial import discover_ports
-from ..core.services.scheduler import RunManager
+from .executor import RunExecutor
+from ..core.services.run_events import stream_run_events
+from ..core.services import preview_service
 from .config import settings
-import hashlib
-from ..vendors.loader import get_vendor
+import asyncio
+import io
+import json
+from contextlib import asynccontextmanager
 from ..core.services.report_service import ReportService
 
 # Initialize DB
 database.init_db()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Normally runs execute in the separate executor process
+    executor = RunExecutor() if settings.EXECUTOR_EMBEDDED else None
+    executor_task = asyncio.create_task(executor.run_forever()) if executor else None
+    yield
+    if executor:
+        executor.stop()
+        await executor_task
+
 app = FastAPI(
     title="Automatic Switch Configuration",
     description="Raspberry Pi service for automatic switch configuration.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -31,6 +47,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 @app.middleware("http")
@@ -41,16 +58,19 @@ async def passcode_protection(request: Request, call_next):
         
     if settings.API_PASSCODE:
         passcode = request.headers.get("X-Passcode")
+        # EventSource cannot set headers, so the event stream may pass it as a query parameter
+        if passcode is None and request.url.path.endswith("/events"):
+            passcode = request.query_params.get("passcode")
         if passcode != settings.API_PASSCODE:
             return JSONResponse(status_code=403, content={"detail": "Invalid or missing passcode"})
     return await call_next(request)
 
 # Health
 @app.get("/health")
-async def health_check(db: Session = Depends(database.get_db)):
+async def health_check(db: AsyncSession = Depends(database.get_async_db)):
     db_ok = False
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         db_ok = True
     except Exception:
         pass
@@ -66,6 +86,8 @@ async def health_check(db: Session = Depends(database.get_db)):
         },
         "frontend_path": str(frontend_path),
         "frontend_exists": frontend_path.exists(),
+        "validation_cache": policy.validation_cache.stats(),
+        "preview_cache": preview_service.preview_cache.stats(),
         "version": "0.1.0"
     }
 
@@ -96,12 +118,18 @@ def list_devices(job_id: int, db: Session = Depends(database.get_db)):
     return repository.get_devices_by_job(db, job_id)
 
 @app.post("/jobs/{job_id}/devices/import-csv")
-async def import_csv(job_id: int, file: UploadFile = File(...), db: Session = Depends(database.get_db)):
-    content = await file.read()
-    csv_text = content.decode("utf-8")
-    success_count, errors = services.import_devices_from_csv(db, job_id, csv_text)
+async def import_csv(
+    job_id: int,
+    file: UploadFile = File(...),
+    mode: str = Query("valid_only", pattern="^(valid_only|all_or_nothing)$"),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    # Parse straight from the spooled upload instead of reading it into memory first
+    csv_lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    success_count, errors = await db.run_sync(services.import_devices_from_csv, job_id, csv_lines, mode=mode)
     return {
         "job_id": job_id,
+        "mode": mode,
         "success_count": success_count,
         "errors": errors
     }
@@ -117,6 +145,7 @@ def update_device(device_id: int, device_update: models.DeviceUpdate, db: Sessio
 def delete_device(device_id: int, db: Session = Depends(database.get_db)):
     if not repository.delete_device(db, device_id):
         raise HTTPException(status_code=404, detail="Device not found")
+    policy.validation_cache.invalidate(device_id)
     return {"status": "deleted"}
 
 # Ports
@@ -135,16 +164,35 @@ def get_ports(db: Session = Depends(database.get_db)):
 
 # Runs
 @app.post("/jobs/{job_id}/runs", response_model=models.Run)
-def create_run(job_id: int, run_create: models.RunCreate, background_tasks: BackgroundTasks, db: Session = Depends(database.get_db)):
+async def create_run(job_id: int, run_create: models.RunCreate, db: AsyncSession = Depends(database.get_async_db)):
     run_create.job_id = job_id
     if run_create.parallelism is None:
         run_create.parallelism = settings.DEFAULT_PARALLELISM
-        
-    db_run = repository.create_run(db, run_create)
-    
-    # Trigger background execution
-    manager = RunManager(db_run.id)
-    background_tasks.add_task(manager.execute_run)
+    if run_create.mode not in models.RUN_MODES:
+        raise HTTPException(status_code=422, detail=f"Unknown run mode: {run_create.mode}")
+
+    devices = await repository.get_devices_by_job_async(db, job_id)
+    if run_create.mode == "resume":
+        # The devices that did not verify, each with its plan and checkpoint
+        if run_create.resumed_from is None:
+            source = await db.run_sync(repository.get_latest_finished_run, job_id)
+        else:
+            source = await repository.get_run_async(db, run_create.resumed_from)
+        if not source or source.job_id != job_id:
+            raise HTTPException(status_code=404, detail="No run of this job to resume")
+        if source.status.lower() in models.RUN_ACTIVE_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Run {source.id} has not finished yet")
+        run_create.resumed_from = source.id
+        sources = await db.run_sync(repository.get_unverified_run_devices, source.id)
+        run_devices = await config_plan.resume_run_devices(sources, {d.id: d for d in devices})
+        if not run_devices:
+            raise HTTPException(status_code=409, detail=f"Nothing to resume, every device of run {source.id} verified")
+    else:
+        run_create.resumed_from = None
+        # Render every device once, off the event loop; the runners execute exactly these plans
+        run_devices = await preview_service.plan_run_devices_in_pool(devices)
+    # Queued for the executor process (backend.app.executor), which claims and runs it
+    db_run = await db.run_sync(repository.create_run, run_create, run_devices, "queued")
     
     return db_run
 
@@ -161,113 +209,143 @@ def get_run(run_id: int, db: Session = Depends(database.get_db)):
 
 @app.get("/runs/{run_id}/devices", response_model=List[models.RunDevice])
 def get_run_devices(run_id: int, db: Session = Depends(database.get_db)):
-    return db.query(database.DBRunDevice).filter(database.DBRunDevice.run_id == run_id).all()
+    return repository.get_run_devices(db, run_id)
 
 @app.get("/runs/{run_id}/logs", response_model=List[models.EventLog])
-def get_run_logs(run_id: int, db: Session = Depends(database.get_db)):
-    return repository.get_run_logs(db, run_id)
+def get_run_logs(
+    run_id: int,
+    since_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    level: Optional[List[str]] = Query(None),
+    device_id: Optional[int] = None,
+    port: Optional[int] = None,
+    include_raw: bool = True,
+    db: Session = Depends(database.get_db),
+):
+    return repository.get_run_logs(
+        db, run_id, since_id=since_id, limit=limit, levels=level,
+        device_id=device_id, port=port, include_raw=include_raw,
+    )
+
+@app.get("/runs/{run_id}/logs/{log_id}/raw", response_class=PlainTextResponse)
+def get_run_log_raw(run_id: int, log_id: int, db: Session = Depends(database.get_db)):
+    db_log = repository.get_event_log(db, run_id, log_id)
+    if not db_log or db_log.raw is None:
+        raise HTTPException(status_code=404, detail="Raw output not found")
+    return db_log.raw
+
+@app.get("/runs/{run_id}/events")
+async def get_run_events(
+    run_id: int,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    if not await repository.get_run_async(db, run_id):
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    # The browser resends the id of the last log it received when it reconnects
+    after_id = last_event_id or 0
+    if last_event_id_header and last_event_id_header.isdigit():
+        after_id = int(last_event_id_header)
+
+    return StreamingResponse(
+        stream_run_events(run_id, last_event_id=after_id, is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # Dry-run
 @app.post("/jobs/{job_id}/dry-run", response_model=List[models.ValidationError])
-async def dry_run_job(job_id: int, db: Session = Depends(database.get_db)):
-    db_job = repository.get_job(db, job_id)
+async def dry_run_job(job_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_job = await repository.get_job_async(db, job_id)
     if not db_job:
         raise HTTPException(status_code=404, detail="Job not found")
         
-    devices = repository.get_devices_by_job(db, job_id)
-    all_errors = []
+    devices = await repository.get_devices_by_job_async(db, job_id)
     
     # Convert DB models to Pydantic for policy validation
     pydantic_devices = [models.Device.model_validate(d) for d in devices]
     
-    for device in pydantic_devices:
-        errors = await policy.validate_device_config(device, pydantic_devices)
-        all_errors.extend(errors)
-        
-    return all_errors
+    return await policy.validate_job(pydantic_devices, cache=policy.validation_cache)
 
 # Preview
 @app.get("/jobs/{job_id}/devices/{device_id}/preview", response_model=models.DevicePreview)
-async def get_device_preview(job_id: int, device_id: int, db: Session = Depends(database.get_db)):
-    db_device = repository.get_device_by_id(db, device_id)
+async def get_device_preview(job_id: int, device_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_device = await repository.get_device_by_id_async(db, device_id)
     if not db_device or db_device.job_id != job_id:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    vendor = get_vendor(db_device.vendor or "generic")
-    config_params = {
-        "hostname": db_device.hostname,
-        "mgmt_ip": db_device.mgmt_ip,
-        "mgmt_mask": db_device.mask,
-        "gateway": db_device.gateway,
-        "mgmt_vlan": db_device.mgmt_vlan,
-    }
-    blocks = await vendor.get_bootstrap_commands(config_params)
-    
-    commands_text = ""
-    for block in blocks:
-        commands_text += f"! Block: {block.name}\n"
-        commands_text += "\n".join(block.commands) + "\n"
-    
-    cmd_hash = hashlib.sha256(commands_text.encode()).hexdigest()[:12]
-    
-    return models.DevicePreview(
-        device_id=device_id,
-        hostname=db_device.hostname,
-        vendor=vendor.vendor_id,
-        commands=commands_text,
-        hash=cmd_hash
-    )
+    previews = await preview_service.get_previews([models.Device.model_validate(db_device)])
+    return previews[0]
 
+@app.get("/jobs/{job_id}/preview", response_model=List[models.DevicePreview])
 @app.post("/jobs/{job_id}/preview", response_model=List[models.DevicePreview])
-async def bulk_preview(job_id: int, db: Session = Depends(database.get_db)):
-    db_job = repository.get_job(db, job_id)
+async def bulk_preview(
+    job_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    db_job = await repository.get_job_async(db, job_id)
     if not db_job:
         raise HTTPException(status_code=404, detail="Job not found")
         
-    devices = repository.get_devices_by_job(db, job_id)
-    previews = []
-    for device in devices:
-        previews.append(await get_device_preview(job_id, device.id, db))
-    return previews
+    devices = [models.Device.model_validate(d) for d in await repository.get_devices_by_job_async(db, job_id)]
+    keys = preview_service.preview_keys(devices)
+    etag = preview_service.preview_etag(devices, keys)
+    # Nothing in the job or its templates changed since the client's copy
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return await preview_service.get_previews(devices, keys)
+
+@app.get("/runs/{run_id}/devices/{device_id}/plan")
+def get_run_device_plan(run_id: int, device_id: int, db: Session = Depends(database.get_db)):
+    stored = repository.get_run_device_plan(db, run_id, device_id)
+    if not stored:
+        raise HTTPException(status_code=404, detail="Run device not found")
+    if not stored.plan:
+        raise HTTPException(status_code=404, detail=stored.error_message or "No config plan stored for this run device")
+    return {"hash": stored.template_hash, **json.loads(stored.plan)}
 
 @app.get("/runs/{run_id}/devices/{device_id}/config")
 def get_run_device_config(run_id: int, device_id: int, db: Session = Depends(database.get_db)):
-    db_rd = db.query(database.DBRunDevice).filter(
-        database.DBRunDevice.run_id == run_id, 
-        database.DBRunDevice.device_id == device_id
-    ).first()
-    
-    if not db_rd:
+    ref = repository.get_run_device_config_ref(db, run_id, device_id)
+    if not ref:
         raise HTTPException(status_code=404, detail="Run device not found")
-        
-    config = db_rd.captured_config or "No configuration captured."
-    
-    return Response(
-        content=config,
+
+    if ref.config_hash:
+        body = config_store.iter_config(db, ref.config_hash)
+    else:
+        body = iter(["No configuration captured."])
+
+    return StreamingResponse(
+        body,
         media_type="text/plain",
         headers={"Content-Disposition": f"attachment; filename=config_{run_id}_{device_id}.txt"}
     )
 
+def report_response(run_id: int, fmt: str, media_type: str, db: Session, download: bool = True):
+    body = ReportService(db).stream_report(run_id, fmt)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    headers = {"Content-Disposition": f"attachment; filename=report_{run_id}.{fmt}"} if download else None
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
 @app.get("/runs/{run_id}/report.json")
 def get_run_report_json(run_id: int, db: Session = Depends(database.get_db)):
-    service = ReportService(db)
-    report = service.generate_json_report(run_id)
-    if "error" in report:
-        raise HTTPException(status_code=404, detail=report["error"])
-    return report
+    return report_response(run_id, "json", "application/json", db, download=False)
+
+@app.get("/runs/{run_id}/report.ndjson")
+def get_run_report_ndjson(run_id: int, db: Session = Depends(database.get_db)):
+    return report_response(run_id, "ndjson", "application/x-ndjson", db)
 
 @app.get("/runs/{run_id}/report.csv")
 def get_run_report_csv(run_id: int, db: Session = Depends(database.get_db)):
-    service = ReportService(db)
-    csv_str = service.generate_csv_report(run_id)
-    if csv_str == "error,Run not found":
-        raise HTTPException(status_code=404, detail="Run not found")
-    
-    return Response(
-        content=csv_str,
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=report_{run_id}.csv"}
-    )
+    return report_response(run_id, "csv", "text/csv", db)
 
 # Static Files (Frontend) - Resolved absolute path
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
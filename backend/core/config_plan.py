@@ -0,0 +1,89 @@
+import hashlib
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+from ..vendors.base import CommandBlock
+from ..vendors.loader import get_vendor
+
+# Stored on run devices whose plan could not be rendered when the run was created
+TEMPLATE_ERROR = "TEMPLATE_ERROR"
+
+class ConfigPlan(BaseModel):
+    """
+    The command blocks for one device, rendered once when its run is created
+    and stored with the run device. The runner executes them as stored, so
+    later edits to the device or its template do not change a run in progress.
+    """
+    vendor: str
+    params: Dict[str, Any]
+    blocks: List[CommandBlock]
+
+    @property
+    def hash(self) -> str:
+        return plan_hash(self.blocks)
+
+def device_params(device) -> Dict[str, Any]:
+    return {
+        "hostname": device.hostname,
+        "mgmt_ip": device.mgmt_ip,
+        "mgmt_mask": device.mask,
+        "gateway": device.gateway,
+        "mgmt_vlan": device.mgmt_vlan,
+    }
+
+def plan_hash(blocks: List[CommandBlock]) -> str:
+    """
+    Canonical hash of a device configuration: the commands sent, block by
+    block. Previews, run devices (template_hash) and reports all show this one.
+    """
+    full_config_str = ""
+    for b in blocks:
+        full_config_str += "\n".join(b.commands) + "\n"
+    return hashlib.sha256(full_config_str.encode()).hexdigest()[:12]
+
+async def render_plan(device) -> ConfigPlan:
+    vendor = get_vendor(device.vendor or "generic")
+    params = device_params(device)
+    blocks = await vendor.get_bootstrap_commands(params)
+    return ConfigPlan(vendor=vendor.vendor_id, params=params, blocks=blocks)
+
+async def plan_run_devices(devices) -> List[Dict[str, Any]]:
+    """
+    run_devices rows for a new run, one per device with its rendered plan. A
+    device whose template fails to render gets the error instead and is failed
+    by its runner without touching the switch.
+    """
+    rows = []
+    for device in devices:
+        row = {"device_id": device.id, "status": "PENDING"}
+        try:
+            plan = await render_plan(device)
+            row.update(template_hash=plan.hash, plan=plan.model_dump_json())
+        except Exception as e:
+            row.update(error_message=f"Template rendering failed: {e}", error_code=TEMPLATE_ERROR)
+        rows.append(row)
+    return rows
+
+async def resume_run_devices(sources, devices) -> List[Dict[str, Any]]:
+    """
+    run_devices rows for a run that resumes another one. sources are the
+    resumed run's devices that did not verify (repository.get_unverified_run_devices);
+    each keeps its plan and checkpoint, so the runner continues after the last
+    block that went through. Devices without a stored plan start over with a
+    new one. devices maps device ids to the job's current devices; sources
+    whose device was deleted are left out.
+    """
+    rows = []
+    for source in sources:
+        device = devices.get(source.device_id)
+        if device is None:
+            continue
+        if source.plan:
+            rows.append({
+                "device_id": source.device_id, "status": "PENDING", "template_hash": source.template_hash,
+                "plan": source.plan, "blocks_completed": source.blocks_completed or 0,
+            })
+        else:
+            rows.extend(await plan_run_devices([device]))
+    return rows
@@ -48,9 +48,19 @@ class Device(DeviceBase):
     class Config:
         from_attributes = True
 
+# A queued run waits for an executor (backend.app.executor); both states mean "not finished"
+RUN_ACTIVE_STATUSES = ("queued", "running")
+
+# full: every block of a freshly rendered plan; resume: the devices of an
+# earlier run that did not verify, from their last checkpoint
+RUN_MODES = ("full", "resume")
+
 class RunBase(BaseModel):
     job_id: int
     parallelism: int = 4
+    mode: str = "full"
+    # The run to resume; defaults to the job's latest finished run
+    resumed_from: Optional[int] = None
 
 class RunCreate(RunBase):
     pass
@@ -73,7 +83,8 @@ class RunDevice(BaseModel):
     error_message: Optional[str] = None
     error_code: Optional[str] = None
     template_hash: Optional[str] = None
-    captured_config: Optional[str] = None
+    blocks_completed: Optional[int] = None
+    # captured_config is not part of listings; see /runs/{run_id}/devices/{device_id}/config
 
     class Config:
         from_attributes = True
@@ -90,6 +101,8 @@ class EventLogBase(BaseModel):
 class EventLog(EventLogBase):
     id: int
     ts: datetime
+    # Set when raw was left out of the response: whether the event has one to fetch
+    has_raw: Optional[bool] = None
 
     class Config:
         from_attributes = True
@@ -1,10 +1,20 @@
+import asyncio
+import hashlib
+import json
 import re
 import ipaddress
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 from . import models
+from .cache import DeviceResultCache
+from ..app.config import settings
 
 HOSTNAME_REGEX = re.compile(r"^[a-zA-Z0-9-]{1,63}$")
 
+# Dotted decimal netmask -> integer mask, for /1 to /32
+NETMASKS = {str(ipaddress.IPv4Network(f"0.0.0.0/{i}").netmask): int(ipaddress.IPv4Network(f"0.0.0.0/{i}").netmask) for i in range(1, 33)}
+
+@lru_cache(maxsize=256)
 def normalize_mask(mask: str) -> str:
     """
     Normalizes a mask (CIDR or dotted decimal) to dotted decimal.
@@ -20,12 +30,45 @@ def normalize_mask(mask: str) -> str:
     # Assume it's already dotted decimal or invalid (ipaddress will catch it later)
     return mask
 
-async def validate_device_config(
-    device: models.Device, 
-    all_devices: List[models.Device]
-) -> List[models.ValidationError]:
+class DeviceIndex:
+    """
+    Management IPs and ports of a job's devices, hashed once so duplicate
+    checks are a lookup instead of a scan of the whole job.
+    """
+    def __init__(self, devices: Iterable[models.Device]):
+        # Up to two distinct device ids per value, in job order: enough to find
+        # the first device other than the one being checked
+        self.ips: Dict[str, List[int]] = {}
+        self.ports: Dict[int, List[int]] = {}
+        for d in devices:
+            _add(self.ips, d.mgmt_ip, d.id)
+            if d.port is not None:
+                _add(self.ports, d.port, d.id)
+
+    def ip_conflict(self, device: models.Device) -> Optional[int]:
+        return _first_other(self.ips.get(device.mgmt_ip), device.id)
+
+    def port_conflict(self, device: models.Device) -> Optional[int]:
+        return _first_other(self.ports.get(device.port), device.id)
+
+def _add(index: Dict, key, device_id: int):
+    ids = index.setdefault(key, [])
+    if len(ids) < 2 and device_id not in ids:
+        ids.append(device_id)
+
+def _first_other(ids: Optional[List[int]], device_id: int) -> Optional[int]:
+    for other in ids or ():
+        if other != device_id:
+            return other
+    return None
+
+def check_device(device: models.Device, norm_mask: str, index: DeviceIndex) -> List[models.ValidationError]:
+    """All checks of one device except the template rendering, in report order."""
+    return check_fields(device, norm_mask) + check_duplicates(device, index) + check_ranges(device)
+
+def check_fields(device: models.Device, norm_mask: str) -> List[models.ValidationError]:
     errors = []
-    
+
     # 1) Hostname Validation
     if not HOSTNAME_REGEX.match(device.hostname):
         errors.append(models.ValidationError(
@@ -34,7 +77,7 @@ async def validate_device_config(
             message=f"Invalid hostname: '{device.hostname}'. Must be 1-63 chars, alphanumeric or hyphen, no spaces.",
             suggestion="Use something like 'sw-lab-01'."
         ))
-        
+
     # 2) IP & Mask Validation
     try:
         ip = ipaddress.IPv4Address(device.mgmt_ip)
@@ -45,28 +88,20 @@ async def validate_device_config(
             message=f"Invalid IPv4 address: '{device.mgmt_ip}'."
         ))
         ip = None
-        
-    norm_mask = normalize_mask(device.mask)
-    try:
-        mask_obj = ipaddress.IPv4Address(norm_mask)
-        # Check if it's a valid netmask
-        valid_masks = [str(ipaddress.IPv4Network(f"0.0.0.0/{i}").netmask) for i in range(1, 33)]
-        if norm_mask not in valid_masks:
-            raise ValueError("Invalid netmask")
-    except ValueError:
+
+    netmask = NETMASKS.get(norm_mask)
+    if netmask is None:
         errors.append(models.ValidationError(
             field="mask",
             device_id=device.id,
             message=f"Invalid subnet mask: '{device.mask}'."
         ))
-        mask_obj = None
 
     # 3) Gateway in same subnet
-    if ip and mask_obj:
+    if ip and netmask is not None:
         try:
             gw = ipaddress.IPv4Address(device.gateway)
-            network = ipaddress.IPv4Network(f"{device.mgmt_ip}/{norm_mask}", strict=False)
-            if gw not in network:
+            if int(gw) & netmask != int(ip) & netmask:
                 errors.append(models.ValidationError(
                     field="gateway",
                     device_id=device.id,
@@ -79,27 +114,37 @@ async def validate_device_config(
                 message=f"Invalid Gateway IPv4: '{device.gateway}'."
             ))
 
+    return errors
+
+def check_duplicates(device: models.Device, index: DeviceIndex) -> List[models.ValidationError]:
+    errors = []
+
     # 4) Duplicate IP within job
-    duplicate_ips = [d for d in all_devices if d.id != device.id and d.mgmt_ip == device.mgmt_ip]
-    if duplicate_ips:
+    conflict = index.ip_conflict(device)
+    if conflict is not None:
         errors.append(models.ValidationError(
             field="mgmt_ip",
             device_id=device.id,
             message=f"Duplicate management IP '{device.mgmt_ip}' found in the same job.",
-            suggestion=f"Conflict with device ID {duplicate_ips[0].id}."
+            suggestion=f"Conflict with device ID {conflict}."
         ))
 
     # 5) Duplicate Port within job
     if device.port:
-        duplicate_ports = [d for d in all_devices if d.id != device.id and d.port == device.port]
-        if duplicate_ports:
+        conflict = index.port_conflict(device)
+        if conflict is not None:
             errors.append(models.ValidationError(
                 field="port",
                 device_id=device.id,
                 message=f"Port {device.port} is already assigned to another device in this job.",
-                suggestion=f"Conflict with device ID {duplicate_ports[0].id}."
+                suggestion=f"Conflict with device ID {conflict}."
             ))
-            
+
+    return errors
+
+def check_ranges(device: models.Device) -> List[models.ValidationError]:
+    errors = []
+
     # 6) VLAN range
     if device.mgmt_vlan is not None:
         if not (1 <= device.mgmt_vlan <= 4094):
@@ -118,10 +163,14 @@ async def validate_device_config(
                 message=f"Invalid port: {device.port}. Raspberry Pi adapter only supports ports 1-16."
             ))
 
+    return errors
+
+async def check_template(device: models.Device, norm_mask: str, vendor=None) -> Optional[models.ValidationError]:
     # 8) Template Rendering Check
     try:
-        from ..vendors.loader import get_vendor
-        vendor = get_vendor(device.vendor or "generic")
+        if vendor is None:
+            from ..vendors.loader import get_vendor
+            vendor = get_vendor(device.vendor or "generic")
         config_params = {
             "hostname": device.hostname,
             "mgmt_ip": device.mgmt_ip,
@@ -131,11 +180,86 @@ async def validate_device_config(
         }
         await vendor.get_bootstrap_commands(config_params)
     except Exception as e:
-        errors.append(models.ValidationError(
+        return models.ValidationError(
             field="vendor",
             device_id=device.id,
             message=f"Template rendering failed: {str(e)}",
             suggestion=f"Check if vendor '{device.vendor}' is supported and template exists."
-        ))
+        )
+    return None
 
+async def validate_device_config(
+    device: models.Device, 
+    all_devices: List[models.Device]
+) -> List[models.ValidationError]:
+    norm_mask = normalize_mask(device.mask)
+    # Only devices sharing the IP or port can conflict, so the index stays small
+    index = DeviceIndex(d for d in all_devices if d.mgmt_ip == device.mgmt_ip or (device.port and d.port == device.port))
+    errors = check_device(device, norm_mask, index)
+    template_error = await check_template(device, norm_mask)
+    if template_error:
+        errors.append(template_error)
     return errors
+
+class ValidationCache(DeviceResultCache):
+    """
+    Device-local validation results (LocalResult): field, range and template
+    checks, keyed by device_fingerprint and the vendor template version, so an
+    edited device or template is validated again. Duplicate IP/port checks
+    depend on the rest of the job and are never cached; validate_job answers
+    them from the job's DeviceIndex on every call.
+    """
+
+# (field errors, range errors, template error) of one device
+LocalResult = Tuple[List[models.ValidationError], List[models.ValidationError], Optional[models.ValidationError]]
+
+validation_cache = ValidationCache(settings.VALIDATION_CACHE_SIZE)
+
+def device_fingerprint(device: models.Device) -> str:
+    """Hash of every field the device-local checks look at."""
+    fields = [device.hostname, device.mgmt_ip, device.mask, device.gateway, device.port, device.mgmt_vlan, device.vendor]
+    return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+async def validate_job(devices: List[models.Device], cache: Optional[ValidationCache] = None) -> List[models.ValidationError]:
+    """
+    Validates all devices of a job at once. Same errors in the same order as
+    calling validate_device_config for each device, but the duplicate index
+    is built once and the template checks run concurrently. With a cache only
+    devices whose fields or template changed are checked again.
+    """
+    from ..vendors.loader import get_vendor
+
+    vendors = {}
+    versions = {}
+    for d in devices:
+        vendor_id = d.vendor or "generic"
+        if vendor_id not in vendors:
+            vendors[vendor_id] = get_vendor(vendor_id)
+            versions[vendor_id] = vendors[vendor_id].template_version() if cache else None
+
+    local: List[Optional[LocalResult]] = [None] * len(devices)
+    pending = []
+    for i, d in enumerate(devices):
+        key = f"{device_fingerprint(d)}:{versions[d.vendor or 'generic']}" if cache else None
+        if cache:
+            local[i] = cache.get(d.id, key)
+        if local[i] is None:
+            pending.append((i, d, key, normalize_mask(d.mask)))
+
+    template_errors = await asyncio.gather(*(
+        check_template(d, norm_mask, vendors[d.vendor or "generic"]) for _, d, _, norm_mask in pending
+    ))
+    for (i, d, key, norm_mask), template_error in zip(pending, template_errors):
+        local[i] = (check_fields(d, norm_mask), check_ranges(d), template_error)
+        if cache:
+            cache.put(d.id, key, local[i])
+
+    index = DeviceIndex(devices)
+    all_errors = []
+    for d, (field_errors, range_errors, template_error) in zip(devices, local):
+        all_errors.extend(field_errors)
+        all_errors.extend(check_duplicates(d, index))
+        all_errors.extend(range_errors)
+        if template_error:
+            all_errors.append(template_error)
+    return all_errors
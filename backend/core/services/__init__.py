@@ -1,52 +1,89 @@
 import csv
 import io
-from typing import List, Dict, Any, Tuple
+from typing import Iterable, List, Dict, Any, Tuple, Union
+from pydantic import ValidationError
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from .. import models
-from ...infra import repository
+from ...infra import database
 
-def import_devices_from_csv(db: Session, job_id: int, csv_content: str) -> Tuple[int, List[str]]:
+# valid_only imports every valid row and reports the rest; all_or_nothing
+# imports nothing as soon as a single row is invalid
+IMPORT_MODES = ("valid_only", "all_or_nothing")
+
+# Required fields based on requirements
+REQUIRED_FIELDS = ["hostname", "mgmt_ip", "mask", "gateway"]
+
+def parse_device_row(job_id: int, row: Dict[str, str]) -> Dict[str, Any]:
+    """Validates one CSV row and returns the device columns. Raises ValueError with the reason."""
+    # Trim spaces
+    row = {k.strip(): v.strip() for k, v in row.items() if k and v}
+
+    # Check for required fields
+    missing = [field for field in REQUIRED_FIELDS if field not in row or not row[field]]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    device_data = {
+        "job_id": job_id,
+        "hostname": row.get("hostname"),
+        "mgmt_ip": row.get("mgmt_ip"),
+        "mask": row.get("mask"),
+        "gateway": row.get("gateway"),
+        "port": int(row["port"]) if row.get("port") and row["port"].isdigit() else None,
+        "vendor": row.get("vendor"),
+        "model": row.get("model"),
+        "mgmt_vlan": int(row["mgmt_vlan"]) if row.get("mgmt_vlan") and row["mgmt_vlan"].isdigit() else None,
+        "status": "pending"
+    }
+    try:
+        return models.DeviceCreate(**device_data).model_dump()
+    except ValidationError as e:
+        raise ValueError(f"Error processing: {str(e)}")
+
+def import_devices_from_csv(db: Session, job_id: int, csv_content: Union[str, Iterable[str]], mode: str = "valid_only", batch_size: int = 1000) -> Tuple[int, List[str]]:
     """
     Parses CSV and creates devices for a job.
+
+    csv_content is the CSV text or any iterable of lines (e.g. a text file
+    object), which is read incrementally. Valid rows are bulk-inserted in
+    batches of batch_size within a single transaction that is committed at the
+    end; in all_or_nothing mode it is rolled back if any row was invalid.
     Returns (count_success, errors).
     """
-    f = io.StringIO(csv_content)
-    reader = csv.DictReader(f)
-    
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+
+    lines = io.StringIO(csv_content) if isinstance(csv_content, str) else csv_content
+    reader = csv.DictReader(lines)
+
     success_count = 0
     errors = []
-    
-    # Required fields based on requirements
-    required_fields = ["hostname", "mgmt_ip", "mask", "gateway"]
-    
-    for i, row in enumerate(reader, start=1):
-        # Trim spaces
-        row = {k.strip(): v.strip() for k, v in row.items() if k and v}
-        
-        # Check for required fields
-        missing = [field for field in required_fields if field not in row or not row[field]]
-        if missing:
-            errors.append(f"Line {i}: Missing required fields: {', '.join(missing)}")
-            continue
-            
-        try:
-            device_data = {
-                "job_id": job_id,
-                "hostname": row.get("hostname"),
-                "mgmt_ip": row.get("mgmt_ip"),
-                "mask": row.get("mask"),
-                "gateway": row.get("gateway"),
-                "port": int(row["port"]) if row.get("port") and row["port"].isdigit() else None,
-                "vendor": row.get("vendor"),
-                "model": row.get("model"),
-                "mgmt_vlan": int(row["mgmt_vlan"]) if row.get("mgmt_vlan") and row["mgmt_vlan"].isdigit() else None,
-                "status": "pending"
-            }
-            
-            device_create = models.DeviceCreate(**device_data)
-            repository.create_device(db, device_create)
-            success_count += 1
-        except Exception as e:
-            errors.append(f"Line {i}: Error processing: {str(e)}")
-            
+    batch: List[Dict[str, Any]] = []
+
+    try:
+        for i, row in enumerate(reader, start=1):
+            try:
+                batch.append(parse_device_row(job_id, row))
+            except ValueError as e:
+                errors.append(f"Line {i}: {e}")
+                continue
+
+            if len(batch) >= batch_size:
+                db.execute(insert(database.DBDevice), batch)
+                success_count += len(batch)
+                batch = []
+
+        if batch:
+            db.execute(insert(database.DBDevice), batch)
+            success_count += len(batch)
+
+        if errors and mode == "all_or_nothing":
+            db.rollback()
+            return 0, errors
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return 0, errors + [f"Import failed, no devices were imported: {str(e)}"]
+
     return success_count, errors
@@ -1,16 +1,19 @@
 import asyncio
+import json
 import logging
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
+from typing import Any, Container, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 import re
 
-from ...infra.serial import SerialSession
+from ...infra.serial import DEFAULT_PROMPT, AsyncSerialSession, PromptTimeout, RetryPolicy
 from ...infra import repository, database
-from ...infra.database import get_db
 from ...app.config import settings
-from .. import models
+from .. import models, config_plan
+from ..config_plan import ConfigPlan
 from ...vendors.loader import get_vendor
+from ...vendors.base import CommandBlock, CommandSpec
+from .event_sink import EventLogSink
 
 logger = logging.getLogger(__name__)
 
@@ -29,123 +32,419 @@ class ErrorCode:
     TEMPLATE_ERROR = "TEMPLATE_ERROR"
     VALIDATION_ERROR = "VALIDATION_ERROR"
 
+def batch_commands(commands: List[str], window: int, alone: Container[str] = ()) -> List[List[str]]:
+    """
+    Groups commands so that each batch, newline-terminated, fits into window
+    bytes. A command longer than the window, or in alone, is sent on its own.
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    size = 0
+    for cmd in commands:
+        length = len(cmd) + 1
+        if cmd in alone:
+            length = window + 1
+        if batch and (size + length > window or batch[-1] in alone):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(cmd)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+def split_echoed_output(output: str, commands: List[str]) -> List[str]:
+    """
+    Splits the combined console output of a pipelined batch at the echo of each
+    command. Returns one segment per command whose echo was found, in order;
+    the last segment runs to the end of the output.
+    """
+    starts = []
+    pos = 0
+    for cmd in commands:
+        idx = output.find(cmd.strip(), pos)
+        if idx < 0:
+            break
+        starts.append(idx)
+        pos = idx + len(cmd.strip())
+    ends = starts[1:] + [len(output)]
+    return [output[start:end] for start, end in zip(starts, ends)]
+
+def first_answer(segment: str) -> str:
+    """
+    Cuts a segment of split_echoed_output after the first prompt that follows
+    the echo. When the next command's echo is missing, the segment also holds
+    the answers to the commands after it, which are not this command's.
+    """
+    match = re.search(r"\n[^\n]*?[#>]", segment)
+    return segment[:match.end()] if match else segment
+
+def cli_mode(output: str) -> Optional[str]:
+    """
+    The CLI mode of the prompt that ends output: "exec", "enable", "config"
+    or a config submode as the prompt names it ("config-if", "config-vlan", ...).
+    """
+    lines = output.rstrip().splitlines()
+    if not lines:
+        return None
+    prompt = lines[-1].strip()
+    match = re.search(r"\((config[^)]*)\)", prompt)
+    if match:
+        return match.group(1)
+    if prompt.endswith("#"):
+        return "enable"
+    if prompt.endswith(">"):
+        return "exec"
+    return None
+
 class BootstrapRunner:
-    def __init__(self, db: Session, run_id: int, device_id: int):
+    def __init__(self, db: AsyncSession, run_id: int, device_id: int, log_sink: Optional[EventLogSink] = None):
         self.db = db
         self.run_id = run_id
         self.device_id = device_id
-        self.device = repository.get_device_by_id(db, device_id)
-        self.session: Optional[SerialSession] = None
-        vendor_id = "generic"
-        if self.device and self.device.vendor:
-            vendor_id = self.device.vendor
-        self.vendor = get_vendor(vendor_id)
+        # Without a shared sink (e.g. a single device), the runner writes its own events
+        self.log_sink = log_sink
+        self._owns_sink = log_sink is None
+        self.device = None
+        self.session: Optional[AsyncSerialSession] = None
+        self.vendor = get_vendor("generic")
+        # Stored when the run was created; runs without one render at execution time
+        self.plan: Optional[ConfigPlan] = None
+        self.plan_error: Optional[str] = None
+        # Leading plan blocks that went through in an earlier attempt (resume runs, takeovers)
+        self.blocks_completed = 0
+        self.retry_policy = RetryPolicy.from_settings()
+        # Mode the console was left in by the last command, restored after a reconnect
+        self.cli_mode: Optional[str] = None
+        self.blocks: List[CommandBlock] = []
 
-    async def log_event(self, level: str, message: str, raw: Optional[str] = None, error_code: Optional[str] = None):
-        # Print to stdout for systemd journal
-        print(f"[{level}] {message}")
-        if raw:
-             print(f"RAW: {raw[:200]}..." if len(raw) > 200 else f"RAW: {raw}")
+    @classmethod
+    async def load(cls, db: AsyncSession, run_id: int, device_id: int, log_sink: Optional[EventLogSink] = None) -> "BootstrapRunner":
+        """Creates a runner with its device and vendor loaded."""
+        runner = cls(db, run_id, device_id, log_sink=log_sink)
+        runner.device = await repository.get_device_by_id_async(db, device_id)
+        if runner.device and runner.device.vendor:
+            runner.vendor = get_vendor(runner.device.vendor)
 
-        event = database.DBEventLog(
+        stored = await repository.get_run_device_plan_async(db, run_id, device_id)
+        if stored and stored.plan:
+            runner.plan = ConfigPlan.model_validate_json(stored.plan)
+            runner.vendor = get_vendor(runner.plan.vendor)
+            runner.blocks_completed = stored.blocks_completed or 0
+        elif stored and stored.error_code == ErrorCode.TEMPLATE_ERROR:
+            runner.plan_error = stored.error_message
+        return runner
+
+    async def log_event(self, level: str, message: str, raw: Optional[str] = None, error_code: Optional[str] = None):
+        # Queued for the sink's batched writer (which also prints to the journal)
+        self.log_sink.emit(
             run_id=self.run_id,
             device_id=self.device_id,
-            port=self.device.port,
+            port=self.device.port if self.device else None,
             level=level,
             message=message,
             raw=raw,
             error_code=error_code,
             ts=datetime.now(timezone.utc)
         )
-        self.db.add(event)
-        self.db.commit()
+
+    def _spec(self, cmd: str, block: Optional[CommandBlock] = None) -> CommandSpec:
+        """
+        The spec cmd is run with: for a command of a block, its entry in
+        block.specs with the block's defaults filled in; for any other command
+        (init, verify, save), the vendor's.
+        """
+        if block is None:
+            return self.vendor.command_spec(cmd) or CommandSpec()
+        spec = block.specs.get(cmd) or CommandSpec()
+        return spec.model_copy(update={
+            "expect_prompt": spec.expect_prompt or block.expect_prompt,
+            "timeout": spec.timeout or block.timeout,
+        })
+
+    async def _read_answer(self, spec: CommandSpec) -> str:
+        """
+        Reads the output of a command up to spec's prompt within spec's
+        timeout. A question of spec.answers on the way is answered, and the
+        reading goes on with a fresh timeout.
+        """
+        prompt = spec.expect_prompt or DEFAULT_PROMPT
+        pending = dict(spec.answers)
+        output = ""
+        while True:
+            try:
+                output += await self.session.read_until_prompt("|".join([prompt, *pending]), spec.timeout, raise_on_timeout=True)
+            except PromptTimeout as e:
+                raise PromptTimeout(output + e.output, e.timeout)
+            question = next((q for q in pending if re.search(f"(?:{q})\\s*$", output)), None)
+            if question is None:
+                return output
+            reply = pending.pop(question)
+            await self.log_event("INFO", f"Answering '{reply}' to: {output.rstrip().splitlines()[-1].strip()}")
+            await self.session.send_line(reply)
+
+    async def _command(self, cmd: str, spec: Optional[CommandSpec] = None) -> str:
+        """
+        Sends one command and returns its output up to the prompt, as spec
+        says. A command without a prompt (or on a failing port) is retried
+        per the retry policy, each time after reconnecting and re-syncing; the
+        last error is raised once the retries are used up.
+        """
+        spec = spec or CommandSpec()
+        attempt = 0
+        error: Optional[Exception] = None
+        while True:
+            try:
+                if attempt:
+                    went_through = await self._recover(cmd, attempt, error)
+                    if went_through is not None:
+                        output = went_through
+                        break
+                await self.session.send_line(cmd)
+                output = await self._read_answer(spec)
+                break
+            except OSError as e: # PromptTimeout, SerialException and I/O errors alike
+                attempt += 1
+                if attempt > self.retry_policy.retries:
+                    raise
+                error = e
+        self.cli_mode = cli_mode(output) or self.cli_mode
+        return output
+
+    async def _recover(self, cmd: str, attempt: int, error: Optional[Exception]) -> Optional[str]:
+        """
+        Reopens the port and re-syncs the prompt before cmd is sent again.
+        The re-synced mode is compared with the one cmd was sent in
+        (self.cli_mode): if it is the mode cmd leads to, cmd went through and
+        the prompt is returned instead of sending it twice. If the console fell
+        back further, the plan's setup blocks are replayed; a config submode
+        cannot be restored that way and raises RuntimeError, as does a replay
+        that does not get back. Returns None when cmd must be sent again.
+        """
+        await self.log_event(
+            "WARNING", f"No answer to '{cmd}' ({error}), reconnecting for retry {attempt}/{self.retry_policy.retries}",
+            raw=getattr(error, "output", None) or None, error_code=ErrorCode.SERIAL_TIMEOUT
+        )
+        await asyncio.sleep(self.retry_policy.delay(attempt))
+        await self.session.reconnect()
+        prompt = await self.session.resync(send_break=self.retry_policy.send_break)
+        mode = cli_mode(prompt)
+        await self.log_event("INFO", f"Prompt re-synced in {mode or 'unknown'} mode", raw=prompt)
+        if not self.cli_mode or not mode or mode == self.cli_mode:
+            return None
+        if mode == self.vendor.next_cli_mode(cmd, self.cli_mode):
+            # Only the answer got lost; sending e.g. "exit" again would leave one mode too many
+            await self.log_event("INFO", f"'{cmd}' went through before the connection was lost, not sending it again")
+            self.cli_mode = mode
+            return prompt
+        if self.cli_mode.startswith("config-"):
+            raise RuntimeError(f"Console fell back from {self.cli_mode} to {mode} mode at '{cmd}', cannot restore the submode")
+
+        # E.g. the switch dropped out of config mode: replay the plan's setup blocks
+        setup = [block for block in self.blocks if block.replay]
+        await self.log_event("WARNING", f"Console is in {mode} mode instead of {self.cli_mode}, replaying {', '.join(b.name for b in setup) or 'nothing'}")
+        for block in setup:
+            for setup_cmd in block.commands:
+                await self.session.send_line(setup_cmd)
+                mode = cli_mode(await self._read_answer(self._spec(setup_cmd, block))) or mode
+        if mode != self.cli_mode:
+            raise RuntimeError(f"Could not return to {self.cli_mode} mode after reconnecting")
+        return None
+
+    async def _fail_timeout(self, cmd: str):
+        await self.log_event("ERROR", f"Serial timeout on command: {cmd}", error_code=ErrorCode.SERIAL_TIMEOUT)
+        await repository.update_run_device_status_async(self.db, self.run_id, self.device_id, "FAILED", error_message=f"Timeout on {cmd}", error_code=ErrorCode.SERIAL_TIMEOUT)
+
+    async def _check_command_output(self, block: CommandBlock, cmd: str, output: str) -> bool:
+        """
+        Reports CLI errors in the output of a single command.
+        Returns True if the device has been marked FAILED and the run must stop.
+        """
+        for pattern in ERROR_PATTERNS:
+            if pattern.search(output):
+                await self.log_event("ERROR", f"Command failed: {cmd}", raw=output, error_code=ErrorCode.COMMAND_ERROR)
+                if block.critical:
+                    await repository.update_run_device_status_async(
+                        self.db, self.run_id, self.device_id, "FAILED", 
+                        error_message=f"Critical Error in {block.name}: {cmd}",
+                        error_code=ErrorCode.COMMAND_ERROR
+                    )
+                    return True
+                else:
+                    await self.log_event("WARNING", f"Ignoring non-critical error in {block.name}")
+        return False
+
+    async def _run_block(self, block: CommandBlock, commands: Optional[List[str]] = None) -> bool:
+        for cmd in (block.commands if commands is None else commands):
+            if not cmd.strip():
+                continue
+
+            try:
+                output = await self._command(cmd, self._spec(cmd, block))
+            except TimeoutError:
+                await self._fail_timeout(cmd)
+                return True
+
+            if await self._check_command_output(block, cmd, output):
+                return True
+        return False
+
+    async def _run_block_pipelined(self, block: CommandBlock) -> bool:
+        """
+        Writes the block in batches of several lines and reads each batch back
+        as one output, which is then split on the echoed commands so errors are
+        still reported per command. A critical error stops before the next batch.
+        Commands with a spec of their own go out on their own, as in _run_block.
+        """
+        window = self.vendor.pipeline_window or settings.SERIAL_PIPELINE_WINDOW
+        commands = [cmd for cmd in block.commands if cmd.strip()]
+        sent = 0
+        for batch in batch_commands(commands, window, alone=block.specs):
+            if batch[0] in block.specs:
+                if await self._run_block(block, batch):
+                    return True
+                sent += 1
+                continue
+            await self.session.send_line("\n".join(batch))
+
+            output = ""
+            segments: List[str] = []
+            while True:
+                try:
+                    chunk = await self.session.read_until_prompt(block.expect_prompt or DEFAULT_PROMPT, block.timeout)
+                except TimeoutError:
+                    chunk = ""
+                if not chunk:
+                    # Nothing arrived before the timeout; blame the first command not echoed yet
+                    failed = min(len(segments), len(batch) - 1)
+                    if not self.retry_policy.retries:
+                        await self._fail_timeout(batch[failed])
+                        return True
+                    # An echoed command reached the switch, sending it again could change the mode
+                    # (think "exit"): keep those and go on with the rest one command at a time
+                    done = len(segments)
+                    if segments:
+                        segments[-1] = first_answer(segments[-1])
+                        self.cli_mode = cli_mode(segments[-1]) or self.cli_mode
+                    for cmd, segment in zip(batch, segments):
+                        if await self._check_command_output(block, cmd, segment):
+                            return True
+                    rest = commands[sent + done:]
+                    try:
+                        went_through = await self._recover(rest[0] if rest else batch[failed], 1, TimeoutError("no prompt"))
+                    except OSError:
+                        await self._fail_timeout(batch[failed])
+                        return True
+                    if went_through is not None:
+                        rest = rest[1:]
+                    return await self._run_block(block, rest)
+                output += chunk
+                segments = split_echoed_output(output, batch)
+                # Done once the last command is echoed and its output ended with a prompt
+                if len(segments) == len(batch) and "\n" in segments[-1]:
+                    break
+
+            for cmd, segment in zip(batch, segments):
+                if await self._check_command_output(block, cmd, segment):
+                    return True
+            self.cli_mode = cli_mode(output) or self.cli_mode
+            sent += len(batch)
+        return False
 
     async def run(self):
+        if self._owns_sink:
+            # The sink's writer task runs concurrently with the runner, so it needs its own session
+            sink_db = AsyncSession(self.db.bind, autoflush=False, expire_on_commit=False)
+            self.log_sink = EventLogSink(sink_db).start()
+        try:
+            await self._run()
+        finally:
+            if self._owns_sink:
+                await self.log_sink.close()
+                await sink_db.close()
+
+    async def _run(self):
         if not self.device or not self.device.port:
             await self.log_event("ERROR", "Device or port not specified")
             return
 
+        if self.plan_error:
+            await self.log_event("ERROR", self.plan_error, error_code=ErrorCode.TEMPLATE_ERROR)
+            await repository.update_run_device_status_async(self.db, self.run_id, self.device_id, "FAILED", error_message=self.plan_error, error_code=ErrorCode.TEMPLATE_ERROR)
+            return
+
         port_path = f"{settings.SERIAL_PORT_BASE_PATH}{self.device.port}"
         
         try:
-            repository.update_run_device_status(self.db, self.run_id, self.device_id, "RUNNING")
+            await repository.update_run_device_status_async(self.db, self.run_id, self.device_id, "RUNNING")
             await self.log_event("INFO", f"Connecting to {port_path} as {self.vendor.vendor_id}")
             
-            # Using asyncio.to_thread for blocking serial I/O
-            self.session = SerialSession(port_path)
-            await asyncio.to_thread(self.session.open)
+            # The session is driven by the event loop, no executor threads involved
+            self.session = AsyncSerialSession(port_path)
+            await self.session.open()
             
             # Step 1: Connect and Sync Prompt
             await self.log_event("INFO", "Synchronizing prompt...")
-            await asyncio.to_thread(self.session.send_line, "")
-            prompt = await asyncio.to_thread(self.session.read_until_prompt)
+            prompt = await self._command("")
             await self.log_event("DEBUG", f"Initial prompt detected", raw=prompt)
 
+            if self.blocks_completed:
+                # The console may still be where the interrupted session left it
+                await self.log_event("INFO", f"Resuming after {self.blocks_completed} completed block(s)")
+                for cmd in await self.vendor.get_resync_commands():
+                    await self._command(cmd, self._spec(cmd))
+
             # Step 1.5: Run Init Commands (e.g. terminal length 0)
             init_cmds = await self.vendor.get_init_commands()
             for cmd in init_cmds:
                 await self.log_event("INFO", f"Running init command: {cmd}")
-                await asyncio.to_thread(self.session.send_line, cmd)
-                await asyncio.to_thread(self.session.read_until_prompt)
-
-            # Step 2: Generate Config
-            config_params = {
-                "hostname": self.device.hostname,
-                "mgmt_ip": self.device.mgmt_ip,
-                "mgmt_mask": self.device.mask,
-                "gateway": self.device.gateway,
-                "mgmt_vlan": self.device.mgmt_vlan,
-            }
-            blocks = await self.vendor.get_bootstrap_commands(config_params)
-            
-            # Calculate template hash
-            import hashlib
-            import json
-            full_config_str = ""
-            for b in blocks:
-                full_config_str += "\n".join(b.commands) + "\n"
-            t_hash = hashlib.sha256(full_config_str.encode()).hexdigest()[:12]
+                await self._command(cmd, self._spec(cmd))
+
+            # Step 2: Config plan, rendered when the run was created
+            if self.plan:
+                config_params = self.plan.params
+                blocks = self.plan.blocks
+            else:
+                config_params = config_plan.device_params(self.device)
+                blocks = await self.vendor.get_bootstrap_commands(config_params)
+            t_hash = config_plan.plan_hash(blocks)
+            self.blocks = blocks
             
             # Update status with hash early
-            repository.update_run_device_status(self.db, self.run_id, self.device_id, "RUNNING", template_hash=t_hash)
+            await repository.update_run_device_status_async(self.db, self.run_id, self.device_id, "RUNNING", template_hash=t_hash)
             
             # Step 3: Apply Command Blocks
             await self.log_event("INFO", f"Applying {len(blocks)} configuration blocks (hash: {t_hash})...")
-            for block in blocks:
+            # Nothing left to apply: only the setup blocks run, and no later block leaves their mode
+            all_completed = bool(blocks) and self.blocks_completed >= len(blocks)
+            for index, block in enumerate(blocks):
+                if index < self.blocks_completed and not block.replay:
+                    await self.log_event("INFO", f"Skipping completed block: {block.name}")
+                    continue
                 await self.log_event("INFO", f"Running block: {block.name}")
-                for cmd in block.commands:
-                    if not cmd.strip():
-                        continue
-                    
-                    try:
-                        await asyncio.to_thread(self.session.send_line, cmd)
-                        output = await asyncio.to_thread(self.session.read_until_prompt)
-                    except TimeoutError:
-                        await self.log_event("ERROR", f"Serial timeout on command: {cmd}", error_code=ErrorCode.SERIAL_TIMEOUT)
-                        repository.update_run_device_status(self.db, self.run_id, self.device_id, "FAILED", error_message=f"Timeout on {cmd}", error_code=ErrorCode.SERIAL_TIMEOUT)
-                        return
-                    
-                    # Check for errors
-                    for pattern in ERROR_PATTERNS:
-                        if pattern.search(output):
-                            await self.log_event("ERROR", f"Command failed: {cmd}", raw=output, error_code=ErrorCode.COMMAND_ERROR)
-                            if block.critical:
-                                repository.update_run_device_status(
-                                    self.db, self.run_id, self.device_id, "FAILED", 
-                                    error_message=f"Critical Error in {block.name}: {cmd}",
-                                    error_code=ErrorCode.COMMAND_ERROR
-                                )
-                                return
-                            else:
-                                await self.log_event("WARNING", f"Ignoring non-critical error in {block.name}")
+                # Lines sent ahead cannot be taken back, so a critical block goes one command at a time
+                pipelined = not block.critical and (block.pipeline if block.pipeline is not None else self.vendor.pipeline_blocks)
+                if pipelined:
+                    aborted = await self._run_block_pipelined(block)
+                else:
+                    aborted = await self._run_block(block)
+                if aborted:
+                    return
+                if index >= self.blocks_completed:
+                    # Checkpoint: a resume continues after this block
+                    self.blocks_completed = index + 1
+                    await repository.save_run_device_checkpoint_async(self.db, self.run_id, self.device_id, self.blocks_completed)
+
+            if all_completed:
+                for cmd in await self.vendor.get_resync_commands():
+                    await self._command(cmd, self._spec(cmd))
 
             # Step 4: Verify
             await self.log_event("INFO", "Verifying configuration...")
             verify_cmds = await self.vendor.get_verify_commands(config_params)
             full_output = ""
             for v_cmd in verify_cmds:
-                await asyncio.to_thread(self.session.send_line, v_cmd)
-                full_output += await asyncio.to_thread(self.session.read_until_prompt)
+                full_output += await self._command(v_cmd, self._spec(v_cmd))
 
             verify_result = self.vendor.parse_verify(full_output, config_params)
             tasks_json = json.dumps(verify_result.get("tasks", []))
@@ -155,30 +454,28 @@ class BootstrapRunner:
                 
                 # Step 4.5: Capture Running Config
                 await self.log_event("INFO", "Capturing running configuration...")
-                await asyncio.to_thread(self.session.send_line, "show running-config")
+                await self.session.send_line("show running-config")
                 # Read potentially large output
-                config_output = await asyncio.to_thread(self.session.read_until_prompt)
+                config_output = await self.session.read_until_prompt(timeout=self._spec("show running-config").timeout)
                 
                 # Step 5: Save (write memory)
                 await self.log_event("INFO", "Saving configuration to NVRAM...")
                 save_cmds = await self.vendor.get_save_commands(config_params)
                 for s_cmd in save_cmds:
-                    await asyncio.to_thread(self.session.send_line, s_cmd)
-                    await asyncio.to_thread(self.session.read_until_prompt)
+                    await self._command(s_cmd, self._spec(s_cmd))
                 
-                repository.update_run_device_status(self.db, self.run_id, self.device_id, "VERIFIED", tasks=tasks_json, captured_config=config_output)
+                await repository.update_run_device_status_async(self.db, self.run_id, self.device_id, "VERIFIED", tasks=tasks_json, captured_config=config_output)
             else:
                 await self.log_event("ERROR", f"Verification failed: {verify_result['details']}", raw=full_output, error_code=ErrorCode.VERIFY_FAILED)
                 # Still try to capture config on failure for debugging
                 try:
-                    await asyncio.to_thread(self.session.send_line, "show running-config")
-                    fail_config = await asyncio.to_thread(self.session.read_until_prompt)
+                    await self.session.send_line("show running-config")
+                    fail_config = await self.session.read_until_prompt(timeout=self._spec("show running-config").timeout)
                 except Exception as e:
                     await self.log_event("ERROR", f"Failed to capture config: {e}")
-                    print(f"Config capture exception: {e}")
                     fail_config = None
 
-                repository.update_run_device_status(
+                await repository.update_run_device_status_async(
                     self.db, self.run_id, self.device_id, "FAILED", 
                     error_message=f"Verification failed: {verify_result['details']}",
                     error_code=ErrorCode.VERIFY_FAILED,
@@ -194,7 +491,7 @@ class BootstrapRunner:
                 err_code = ErrorCode.PROMPT_NOT_FOUND
                 
             await self.log_event("ERROR", f"Execution error: {str(e)}", error_code=err_code)
-            repository.update_run_device_status(self.db, self.run_id, self.device_id, "FAILED", error_message=str(e), error_code=err_code)
+            await repository.update_run_device_status_async(self.db, self.run_id, self.device_id, "FAILED", error_message=str(e), error_code=err_code)
         finally:
             if self.session:
-                await asyncio.to_thread(self.session.close)
+                await self.session.close()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import sys
+from typing import Any, Dict, List, Optional, Union
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...infra import database
+
+logger = logging.getLogger(__name__)
+
+class EventLogSink:
+    """
+    Single writer for run event logs.
+
+    Producers call emit(), which only enqueues. A background task bulk-inserts
+    the queued events in one transaction whenever max_batch events are pending
+    or flush_interval seconds have passed since the first one arrived. A single
+    FIFO queue keeps the order of every device's events.
+    """
+    def __init__(self, db: AsyncSession, max_batch: int = 100, flush_interval: float = 0.25):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "asyncio.Queue[Union[Dict[str, Any], asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "EventLogSink":
+        if not self._task:
+            self._task = asyncio.create_task(self._writer())
+        return self
+
+    def emit(self, **event: Any):
+        self._queue.put_nowait(event)
+
+    async def flush(self):
+        """Waits until every event emitted so far has been written."""
+        if not self._task:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(done)
+        await done
+
+    async def close(self):
+        await self.flush()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            batch: List[Dict[str, Any]] = []
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if isinstance(item, asyncio.Future):
+                    await self._write(batch)
+                    batch = []
+                    if not item.done():
+                        item.set_result(None)
+                else:
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        break
+
+                timeout = deadline - loop.time()
+                if not batch or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+
+        # Print to stdout for systemd journal, one write per batch
+        lines = []
+        for event in batch:
+            lines.append(f"[{event['level']}] {event['message']}")
+            raw = event.get("raw")
+            if raw:
+                lines.append(f"RAW: {raw[:200]}..." if len(raw) > 200 else f"RAW: {raw}")
+        sys.stdout.write("\n".join(lines) + "\n")
+
+        try:
+            await self.db.execute(insert(database.DBEventLog), batch)
+            await self.db.commit()
+        except Exception:
+            logger.exception(f"Failed to write {len(batch)} event log entries")
+            await self.db.rollback()
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class PortArbiter:
+    """
+    Process-wide owner of the console ports.
+
+    A port is held by at most one device at a time, whatever run it belongs
+    to. Devices that want a busy port queue for it in arrival order; a released
+    port is handed straight to the next waiter, so it never sits idle while
+    someone is waiting for it. A device that can use any of several ports
+    (acquire_any) queues for all of them and takes the first one released.
+    """
+    def __init__(self):
+        self._holders: Dict[int, Any] = {}
+        self._waiters: Dict[int, Deque[Tuple[asyncio.Future, Any]]] = {}
+
+    def is_free(self, port: int) -> bool:
+        return port not in self._holders
+
+    def holder(self, port: int) -> Optional[Any]:
+        return self._holders.get(port)
+
+    async def acquire(self, port: int, holder: Any = None):
+        await self.acquire_any({port: holder})
+
+    async def acquire_any(self, holders: Dict[int, Any]) -> int:
+        """
+        Takes one of the ports in holders (port -> holder it is taken for):
+        a free one right away, else whichever is released first. Returns it.
+        """
+        for port, holder in holders.items():
+            if self.is_free(port):
+                self._holders[port] = holder
+                return port
+        waiter = asyncio.get_running_loop().create_future()
+        for port, holder in holders.items():
+            self._waiters.setdefault(port, deque()).append((waiter, holder))
+        logger.debug(f"Ports {sorted(holders)} busy, {list(holders.values())} waiting")
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed over just as the waiter was cancelled; pass it on
+                self.release(waiter.result())
+            raise
+        finally:
+            # Out of the queues of the ports it did not get
+            for port in holders:
+                waiters = self._waiters.get(port)
+                if waiters:
+                    self._waiters[port] = deque(w for w in waiters if w[0] is not waiter)
+
+    def release(self, port: int):
+        waiters = self._waiters.get(port)
+        while waiters:
+            waiter, holder = waiters.popleft()
+            if not waiter.done():
+                self._holders[port] = holder
+                waiter.set_result(port)
+                return
+        self._waiters.pop(port, None)
+        self._holders.pop(port, None)
+
+    @asynccontextmanager
+    async def lease(self, port: int, holder: Any = None) -> AsyncIterator[None]:
+        await self.acquire(port, holder)
+        try:
+            yield
+        finally:
+            self.release(port)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "busy": len(self._holders),
+            "waiting": len({id(waiter) for waiters in self._waiters.values() for waiter, _ in waiters}),
+        }
+
+port_arbiter = PortArbiter()
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from ...app.config import settings
+from ...vendors.loader import get_vendor
+from .. import models
+from ..cache import DeviceResultCache
+from ..config_plan import plan_run_devices, render_plan
+from ..policy import device_fingerprint
+
+# Devices rendered per worker task
+CHUNK_SIZE = 200
+
+preview_cache: DeviceResultCache[models.DevicePreview] = DeviceResultCache(settings.PREVIEW_CACHE_SIZE)
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.PREVIEW_WORKERS, thread_name_prefix="preview")
+    return _pool
+
+def preview_keys(devices) -> List[str]:
+    """Cache key per device: its fields plus the version of the template it renders with."""
+    versions = {}
+    keys = []
+    for d in devices:
+        vendor_id = d.vendor or "generic"
+        if vendor_id not in versions:
+            versions[vendor_id] = get_vendor(vendor_id).template_version()
+        keys.append(f"{device_fingerprint(d)}:{versions[vendor_id]}")
+    return keys
+
+def preview_etag(devices, keys: List[str]) -> str:
+    """Changes whenever any preview of the job would, computed without rendering anything."""
+    digest = hashlib.sha256()
+    for d, key in zip(devices, keys):
+        digest.update(f"{d.id}:{key}\n".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+async def render_preview(device) -> models.DevicePreview:
+    plan = await render_plan(device)
+
+    commands_text = ""
+    for block in plan.blocks:
+        commands_text += f"! Block: {block.name}\n"
+        commands_text += "\n".join(block.commands) + "\n"
+
+    # The same hash the run device gets as template_hash
+    return models.DevicePreview(
+        device_id=device.id,
+        hostname=device.hostname,
+        vendor=plan.vendor,
+        commands=commands_text,
+        hash=plan.hash
+    )
+
+def _render_chunk(devices) -> List[models.DevicePreview]:
+    async def render_all():
+        return [await render_preview(d) for d in devices]
+    return asyncio.run(render_all())
+
+async def _render_in_pool(render_chunk: Callable[[list], list], items: list) -> list:
+    """render_chunk over CHUNK_SIZE slices of items on the worker pool, results in order."""
+    loop = asyncio.get_running_loop()
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    rendered = await asyncio.gather(*(loop.run_in_executor(get_pool(), render_chunk, chunk) for chunk in chunks))
+    return [result for chunk in rendered for result in chunk]
+
+def _plan_chunk(devices) -> List[Dict[str, Any]]:
+    return asyncio.run(plan_run_devices(devices))
+
+async def plan_run_devices_in_pool(devices) -> List[Dict[str, Any]]:
+    """
+    config_plan.plan_run_devices for a new run, rendered on the preview worker
+    pool like bulk previews, so creating a large run does not hold up the
+    event loop (and every other request) while the templates render.
+    """
+    return await _render_in_pool(_plan_chunk, list(devices))
+
+async def get_previews(devices, keys: Optional[List[str]] = None, cache: Optional[DeviceResultCache] = preview_cache) -> List[models.DevicePreview]:
+    """
+    Previews of the given devices in order. Cached previews are reused while
+    the device and its template are unchanged; the rest are rendered in
+    chunks on the preview worker pool, off the event loop.
+    """
+    if keys is None:
+        keys = preview_keys(devices)
+    previews: List[Optional[models.DevicePreview]] = [None] * len(devices)
+    pending = []
+    for i, (d, key) in enumerate(zip(devices, keys)):
+        if cache is not None:
+            previews[i] = cache.get(d.id, key)
+        if previews[i] is None:
+            pending.append(i)
+
+    if len(pending) == 1:
+        rendered = [await render_preview(devices[pending[0]])]
+    else:
+        rendered = await _render_in_pool(_render_chunk, [devices[i] for i in pending])
+
+    for i, preview in zip(pending, rendered):
+        previews[i] = preview
+        if cache is not None:
+            cache.put(devices[i].id, keys[i], preview)
+    return previews
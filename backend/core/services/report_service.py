@@ -1,39 +1,61 @@
 import csv
 import io
 import json
+import os
+import tempfile
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from sqlalchemy.orm import Session
 from ...infra import repository, database
+from ...app.config import settings
 from .. import models
 
+CSV_FIELDS = [
+    "hostname", "mgmt_ip", "port", "status",
+    "started_at", "finished_at", "duration_seconds",
+    "error_message", "error_code", "template_hash", "tasks_summary"
+]
+
+REPORT_FORMATS = ("json", "ndjson", "csv")
+
 class ReportService:
     def __init__(self, db: Session):
         self.db = db
 
-    def generate_json_report(self, run_id: int) -> Dict[str, Any]:
-        """
-        Generates a comprehensive JSON report for a run.
-        """
-        run = repository.get_run(self.db, run_id)
-        if not run:
-            return {"error": "Run not found"}
-
-        devices = self.db.query(database.DBRunDevice).filter_by(run_id=run_id).all()
+    def _header(self, run: database.DBRun) -> Dict[str, Any]:
         job = repository.get_job(self.db, run.job_id)
-        
-        report = {
+        return {
             "run_id": run.id,
             "job_name": job.name if job else "Unknown",
             "status": run.status,
             "started_at": run.started_at.isoformat() if run.started_at else None,
             "finished_at": run.finished_at.isoformat() if run.finished_at else None,
             "parallelism": run.parallelism,
-            "devices": []
         }
 
-        for rd in devices:
-            dev = repository.get_device_by_id(self.db, rd.device_id)
+    def iter_devices(self, run_id: int) -> Iterator[Dict[str, Any]]:
+        """
+        Report entries of all devices of a run, from one joined query that is
+        read in batches rather than loaded up front.
+        """
+        rows = self.db.query(
+            database.DBRunDevice.status,
+            database.DBRunDevice.started_at,
+            database.DBRunDevice.finished_at,
+            database.DBRunDevice.error_message,
+            database.DBRunDevice.error_code,
+            database.DBRunDevice.template_hash,
+            database.DBRunDevice.tasks,
+            database.DBDevice.hostname,
+            database.DBDevice.mgmt_ip,
+            database.DBDevice.port,
+        ).outerjoin(
+            database.DBDevice, database.DBDevice.id == database.DBRunDevice.device_id
+        ).filter(
+            database.DBRunDevice.run_id == run_id
+        ).order_by(database.DBRunDevice.device_id).yield_per(200)
+
+        for rd in rows:
             duration = None
             if rd.started_at and rd.finished_at:
                 duration = (rd.finished_at - rd.started_at).total_seconds()
@@ -42,13 +64,13 @@ class ReportService:
             if rd.tasks:
                 try:
                     tasks_list = json.loads(rd.tasks)
-                except:
+                except ValueError:
                     tasks_list = []
 
-            report["devices"].append({
-                "hostname": dev.hostname if dev else "Unknown",
-                "mgmt_ip": dev.mgmt_ip if dev else "Unknown",
-                "port": dev.port if dev else rd.port, # dev has port, rd has port in DB schema (wait, I should check database.py)
+            yield {
+                "hostname": rd.hostname or "Unknown",
+                "mgmt_ip": rd.mgmt_ip or "Unknown",
+                "port": rd.port,
                 "status": rd.status,
                 "started_at": rd.started_at.isoformat() if rd.started_at else None,
                 "finished_at": rd.finished_at.isoformat() if rd.finished_at else None,
@@ -57,38 +79,96 @@ class ReportService:
                 "error_code": rd.error_code,
                 "template_hash": rd.template_hash,
                 "tasks": tasks_list
-            })
+            }
+
+    def iter_json_report(self, run: database.DBRun) -> Iterator[str]:
+        """The JSON report document, written out one device at a time."""
+        header = json.dumps(self._header(run))
+        yield header[:-1] + ', "devices": ['
+        for i, device in enumerate(self.iter_devices(run.id)):
+            yield ("," if i else "") + json.dumps(device)
+        yield "]}"
+
+    def iter_ndjson_report(self, run: database.DBRun) -> Iterator[str]:
+        """One JSON object per line: the run first, then one line per device."""
+        yield json.dumps({"type": "run", **self._header(run)}) + "\n"
+        for device in self.iter_devices(run.id):
+            yield json.dumps({"type": "device", **device}) + "\n"
 
-        return report
+    def iter_csv_report(self, run: database.DBRun) -> Iterator[str]:
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for dev in self.iter_devices(run.id):
+            # Flatten tasks for CSV
+            dev["tasks_summary"] = "; ".join([f"{t['name']}: {t['status']}" for t in dev.pop("tasks")])
+            writer.writerow(dev)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        yield output.getvalue()
+
+    def stream_report(self, run_id: int, fmt: str) -> Optional[Iterator[str]]:
+        """
+        Streams the report of a run in one of REPORT_FORMATS, None if the run
+        does not exist. Reports of finished runs never change, so they are
+        written to REPORT_CACHE_DIR on the way out and served from there later.
+        """
+        run = repository.get_run(self.db, run_id)
+        if not run:
+            return None
+
+        generators = {"json": self.iter_json_report, "ndjson": self.iter_ndjson_report, "csv": self.iter_csv_report}
+        body = generators[fmt](run)
+        if not settings.REPORT_CACHE_DIR or run.status.lower() in models.RUN_ACTIVE_STATUSES:
+            return body
+
+        # finished_at is part of the name so a run that is picked up again gets a new report
+        stamp = run.finished_at.strftime("%Y%m%dT%H%M%S%f") if run.finished_at else "final"
+        path = os.path.join(settings.REPORT_CACHE_DIR, f"run_{run.id}_{stamp}.{fmt}")
+        if os.path.exists(path):
+            return _read_cached(path)
+        return _write_through(body, path)
+
+    def generate_json_report(self, run_id: int) -> Dict[str, Any]:
+        """
+        Generates a comprehensive JSON report for a run.
+        """
+        run = repository.get_run(self.db, run_id)
+        if not run:
+            return {"error": "Run not found"}
+        return {**self._header(run), "devices": list(self.iter_devices(run_id))}
 
     def generate_csv_report(self, run_id: int) -> str:
         """
         Generates a CSV report string for a run.
         """
-        json_report = self.generate_json_report(run_id)
-        if "error" in json_report:
+        run = repository.get_run(self.db, run_id)
+        if not run:
             return "error,Run not found"
+        return "".join(self.iter_csv_report(run))
 
-        output = io.StringIO()
-        fieldnames = [
-            "hostname", "mgmt_ip", "port", "status", 
-            "started_at", "finished_at", "duration_seconds", 
-            "error_message", "error_code", "template_hash", "tasks_summary"
-        ]
-        
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for dev in json_report["devices"]:
-            # Flatten tasks for CSV
-            tasks_str = ""
-            if dev.get("tasks"):
-                tasks_str = "; ".join([f"{t['name']}: {t['status']}" for t in dev["tasks"]])
-            dev["tasks_summary"] = tasks_str
-            
-            # Remove raw tasks list from CSV dict to avoid error
-            row = dev.copy()
-            if "tasks" in row: del row["tasks"]
-            
-            writer.writerow(row)
-            
-        return output.getvalue()
+def _read_cached(path: str, chunk_size: int = 65536) -> Iterator[str]:
+    with open(path, encoding="utf-8", newline="") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _write_through(body: Iterator[str], path: str) -> Iterator[str]:
+    """Yields the body while saving it; the file only appears once the body was sent completely."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # One tmp file per writer: concurrent downloads of a report run on the threadpool side by side
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    complete = False
+    try:
+        with open(fd, "w", encoding="utf-8", newline="") as f:
+            for chunk in body:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+        complete = True
+    finally:
+        if not complete and os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from ...app.config import settings
+from ...infra import repository
+from ...infra.database import AsyncSessionLocal
+from .. import models
+
+# Sent as an SSE comment so proxies keep an idle stream open
+KEEPALIVE_INTERVAL = 15.0
+LOG_BATCH = 500
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+async def stream_run_events(
+    run_id: int,
+    last_event_id: int = 0,
+    poll_interval: Optional[float] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one run, tailed from the database.
+
+    Emits `run` when the run's status changes, `device` on every run device
+    status transition and `log` for each new event log row. Log events carry
+    the row id as SSE id, so a reconnect with Last-Event-ID resumes after the
+    last log the client saw; run and device state is re-sent in full on every
+    (re)connect. Ends with `end` once the run is finished and fully sent.
+    """
+    poll_interval = poll_interval or settings.RUN_EVENTS_POLL_INTERVAL
+    loop = asyncio.get_running_loop()
+    run_state: Optional[Dict[str, Any]] = None
+    device_states: Dict[int, Dict[str, Any]] = {}
+    last_sent = loop.time()
+
+    yield "retry: 2000\n\n"
+    while True:
+        if is_disconnected and await is_disconnected():
+            return
+
+        chunks = []
+        async with AsyncSessionLocal() as db:
+            # The run status is read first: once it is final, the rows read after it are complete
+            run = await repository.get_run_async(db, run_id)
+            if not run:
+                yield format_sse("end", {"run_id": run_id})
+                return
+            state = models.Run.model_validate(run).model_dump(mode="json")
+            if state != run_state:
+                run_state = state
+                chunks.append(format_sse("run", state))
+
+            for row in await repository.get_run_device_states_async(db, run_id):
+                device = models.RunDevice.model_validate(row._asdict()).model_dump(mode="json")
+                if device_states.get(row.device_id) != device:
+                    device_states[row.device_id] = device
+                    chunks.append(format_sse("device", device))
+
+            # Raw console output stays out of the stream; clients fetch it per event
+            logs = await repository.get_run_logs_async(db, run_id, since_id=last_event_id, limit=LOG_BATCH, include_raw=False)
+            for log in logs:
+                chunks.append(format_sse("log", models.EventLog.model_validate(log).model_dump(mode="json"), event_id=log.id))
+                last_event_id = log.id
+
+        finished = run_state["status"].lower() not in models.RUN_ACTIVE_STATUSES and len(logs) < LOG_BATCH
+        if finished:
+            chunks.append(format_sse("end", {"run_id": run_id}))
+
+        if chunks:
+            yield "".join(chunks)
+            last_sent = loop.time()
+        elif loop.time() - last_sent >= KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            last_sent = loop.time()
+
+        if finished:
+            return
+        if len(logs) < LOG_BATCH:
+            await asyncio.sleep(poll_interval)
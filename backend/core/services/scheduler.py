@@ -1,12 +1,15 @@
 import asyncio
 import logging
-from sqlalchemy.orm import Session
 from .bootstrap_runner import BootstrapRunner
+from .event_sink import EventLogSink
+from .port_arbiter import port_arbiter
 from ...infra import repository, database
-from ...infra.database import get_db
+from ...infra.database import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
+FINISHED_DEVICE_STATUSES = ("VERIFIED", "FAILED")
+
 class RunManager:
     def __init__(self, run_id: int):
         self.run_id = run_id
@@ -16,40 +19,66 @@ class RunManager:
         Main entry point for background execution.
         """
         # Create a new DB session for the background task
-        db = next(get_db())
-        try:
-            run = repository.get_run(db, self.run_id)
-            if not run:
-                logger.error(f"Run {self.run_id} not found")
-                return
-
-            # Get all devices for this job
-            devices = repository.get_devices_by_job(db, run.job_id)
-            if not devices:
-                repository.update_run_status(db, self.run_id, "COMPLETED")
-                return
-
-            # Batching logic using Semaphore
-            semaphore = asyncio.Semaphore(run.parallelism)
-
-            async def run_worker(device_id):
-                async with semaphore:
-                    # Individual worker session to avoid thread conflicts
-                    worker_db = next(get_db())
-                    try:
-                        runner = BootstrapRunner(worker_db, self.run_id, device_id)
-                        await runner.run()
-                    finally:
-                        worker_db.close()
-
-            # Schedule all devices
-            tasks = [run_worker(d.id) for d in devices]
-            await asyncio.gather(*tasks)
-
-            repository.update_run_status(db, self.run_id, "COMPLETED")
-            
-        except Exception as e:
-            logger.exception(f"Error in RunManager for run {self.run_id}")
-            repository.update_run_status(db, self.run_id, "FAILED")
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                run = await repository.get_run_async(db, self.run_id)
+                if not run:
+                    logger.error(f"Run {self.run_id} not found")
+                    return
+
+                # The devices planned when the run was created; runs without plans take the job's devices
+                ports = {d.id: d.port for d in await repository.get_devices_by_job_async(db, run.job_id)}
+                states = await repository.get_run_device_states_async(db, self.run_id)
+                if states:
+                    # A run taken over from a dead executor goes on with the devices that did not finish
+                    device_ids = [rd.device_id for rd in states if rd.status not in FINISHED_DEVICE_STATUSES]
+                else:
+                    device_ids = list(ports)
+                if not device_ids:
+                    await repository.update_run_status_async(db, self.run_id, "COMPLETED")
+                    return
+
+                pending = [(device_id, ports.get(device_id)) for device_id in device_ids]
+
+                # One batched writer for the event logs of all workers
+                log_db = AsyncSessionLocal()
+                log_sink = EventLogSink(log_db).start()
+
+                async def run_worker():
+                    # run.parallelism workers share the pending devices; the port
+                    # arbiter keeps other runs off the ports they are using
+                    while pending:
+                        index = next((i for i, (_, port) in enumerate(pending) if not port), None)
+                        if index is None:
+                            # Whichever pending port is free now, or the first one another run releases
+                            holders = {}
+                            for device_id, port in pending:
+                                holders.setdefault(port, f"run {self.run_id} device {device_id}")
+                            port = await port_arbiter.acquire_any(holders)
+                            index = next((i for i, (_, p) in enumerate(pending) if p == port), None)
+                            if index is None:
+                                # Another worker of this run took the last device on it meanwhile
+                                port_arbiter.release(port)
+                                continue
+                        device_id, port = pending.pop(index)
+                        try:
+                            # Individual worker session, sessions are not shared between tasks
+                            async with AsyncSessionLocal() as worker_db:
+                                runner = await BootstrapRunner.load(worker_db, self.run_id, device_id, log_sink=log_sink)
+                                await runner.run()
+                        finally:
+                            if port:
+                                port_arbiter.release(port)
+
+                workers = [run_worker() for _ in range(min(max(run.parallelism or 1, 1), len(pending)))]
+                try:
+                    await asyncio.gather(*workers)
+                finally:
+                    await log_sink.close()
+                    await log_db.close()
+
+                await repository.update_run_status_async(db, self.run_id, "COMPLETED")
+
+            except Exception as e:
+                logger.exception(f"Error in RunManager for run {self.run_id}")
+                await repository.update_run_status_async(db, self.run_id, "FAILED")
@@ -0,0 +1,72 @@
+import codecs
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..app.config import settings
+from .database import DBConfigBlob, DBRunDevice
+
+# Content-addressed store for captured running-configs: each distinct config is
+# kept once, zlib-compressed, under the sha256 of its text; run_devices only
+# reference it through config_hash.
+
+def config_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def store_config(db: Session, text: str) -> str:
+    """
+    Adds the config to the store unless the same content is already there and
+    returns its hash. Part of the caller's transaction, does not commit.
+    """
+    digest = config_hash(text)
+    if db.query(DBConfigBlob.hash).filter(DBConfigBlob.hash == digest).first() is None:
+        raw = text.encode("utf-8")
+        # Another worker may store the same config concurrently
+        db.execute(sqlite_insert(DBConfigBlob).values(
+            hash=digest, encoding="zlib", size=len(raw), created_at=datetime.now(),
+            data=zlib.compress(raw, settings.CONFIG_COMPRESSION_LEVEL),
+        ).on_conflict_do_nothing(index_elements=["hash"]))
+    return digest
+
+def load_config(db: Session, digest: str) -> Optional[str]:
+    data = db.query(DBConfigBlob.data).filter(DBConfigBlob.hash == digest).scalar()
+    if data is None:
+        return None
+    return zlib.decompress(data).decode("utf-8")
+
+def iter_config(db: Session, digest: str, chunk_size: int = 65536) -> Iterator[str]:
+    """Yields the config text while reading and decompressing the blob in chunks."""
+    length = db.query(func.length(DBConfigBlob.data)).filter(DBConfigBlob.hash == digest).scalar() or 0
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for start in range(1, length + 1, chunk_size):
+        chunk = db.query(func.substr(DBConfigBlob.data, start, chunk_size)).filter(DBConfigBlob.hash == digest).scalar()
+        text = decoder.decode(decompressor.decompress(chunk))
+        if text:
+            yield text
+    tail = decoder.decode(decompressor.flush(), final=True)
+    if tail:
+        yield tail
+
+def migrate_captured_configs(db_engine, batch_size: int = 100) -> int:
+    """Moves plain-text run_devices.captured_config values into the store. Returns the number of rows moved."""
+    moved = 0
+    with sessionmaker(bind=db_engine)() as db:
+        while True:
+            rows = db.query(DBRunDevice.id, DBRunDevice.captured_config).filter(
+                DBRunDevice.captured_config.isnot(None)
+            ).limit(batch_size).all()
+            if not rows:
+                break
+            for row_id, text in rows:
+                digest = store_config(db, text)
+                db.query(DBRunDevice).filter(DBRunDevice.id == row_id).update(
+                    {"config_hash": digest, "captured_config": None}, synchronize_session=False
+                )
+            db.commit()
+            moved += len(rows)
+    return moved
@@ -1,16 +1,58 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, event, make_url, Column, Integer, String, DateTime, ForeignKey, Text, Index, LargeBinary
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
 from datetime import datetime
 from ..app.config import settings
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
+def configure_sqlite(engine):
+    """
+    Applies the SQLITE_* settings as pragmas on every new connection.
+    WAL lets readers proceed while a worker commits, and the busy timeout makes
+    concurrent writers wait for the lock instead of failing with
+    "database is locked".
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if settings.SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        if settings.SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        if settings.SQLITE_BUSY_TIMEOUT_MS:
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        if settings.SQLITE_CACHE_SIZE_KB:
+            # Negative values are KiB rather than pages
+            cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        if settings.SQLITE_MMAP_SIZE:
+            cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.close()
+
+    return engine
+
+def async_database_url(url: str) -> str:
+    """Maps the configured database URL onto its asyncio driver."""
+    parsed = make_url(url)
+    if parsed.drivername in ("sqlite", "sqlite+pysqlite"):
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+engine = configure_sqlite(create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async access for the runner, scheduler and async routes, so DB work does not
+# block the event loop; the sync engine stays for tests, scripts and sync routes
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL))
+configure_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 class DBJob(Base):
@@ -25,7 +67,7 @@ class DBJob(Base):
 class DBDevice(Base):
     __tablename__ = "devices"
     id = Column(Integer, primary_key=True, index=True)
-    job_id = Column(Integer, ForeignKey("jobs.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), index=True)
     port = Column(Integer, nullable=True)  # 1-16
     vendor = Column(String, nullable=True)
     model = Column(String, nullable=True)
@@ -39,18 +81,33 @@ class DBDevice(Base):
 
 class DBRun(Base):
     __tablename__ = "runs"
+    __table_args__ = (
+        # Executors look for queued and expired runs
+        Index("ix_runs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    job_id = Column(Integer, ForeignKey("jobs.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), index=True)
     started_at = Column(DateTime, default=datetime.now)
     finished_at = Column(DateTime, nullable=True)
     status = Column(String, default="running")
     parallelism = Column(Integer, default=4)
+    mode = Column(String, default="full") # "resume": continues the devices of resumed_from at their checkpoints
+    resumed_from = Column(Integer, nullable=True)
+    # Run queue: an executor owns a run while its lease is renewed, see repository.claim_next_run
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
     job = relationship("DBJob", back_populates="runs")
     run_devices = relationship("DBRunDevice", back_populates="run")
     event_logs = relationship("DBEventLog", back_populates="run")
 
 class DBRunDevice(Base):
     __tablename__ = "run_devices"
+    __table_args__ = (
+        # One row per device and run; also serves the (run_id, device_id) status lookups
+        Index("ix_run_devices_run_id_device_id", "run_id", "device_id", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     run_id = Column(Integer, ForeignKey("runs.id"))
     device_id = Column(Integer, ForeignKey("devices.id"))
@@ -60,12 +117,29 @@ class DBRunDevice(Base):
     error_message = Column(Text, nullable=True)
     error_code = Column(String, nullable=True)
     template_hash = Column(String, nullable=True)
-    tasks = Column(Text, nullable=True) # JSON list of verification steps
-    captured_config = Column(Text, nullable=True) # Full running config
+    # Large bodies load only when accessed (or undefer()ed), never as part of a listing
+    tasks = deferred(Column(Text, nullable=True)) # JSON list of verification steps
+    config_hash = Column(String, nullable=True) # Captured running config, see DBConfigBlob
+    captured_config = deferred(Column(Text, nullable=True)) # Legacy plain-text config, moved to config_blobs by init_db
+    plan = deferred(Column(Text, nullable=True)) # ConfigPlan JSON rendered at run creation, see core/config_plan.py
+    blocks_completed = Column(Integer, default=0) # Checkpoint: leading plan blocks that went through
     run = relationship("DBRun", back_populates="run_devices")
 
+class DBConfigBlob(Base):
+    """Captured running-configs, compressed and stored once per distinct content."""
+    __tablename__ = "config_blobs"
+    hash = Column(String, primary_key=True) # sha256 of the uncompressed text
+    encoding = Column(String, default="zlib")
+    size = Column(Integer) # uncompressed length in bytes
+    created_at = Column(DateTime, default=datetime.now)
+    data = deferred(Column(LargeBinary))
+
 class DBEventLog(Base):
     __tablename__ = "event_logs"
+    __table_args__ = (
+        Index("ix_event_logs_run_id_id", "run_id", "id"),
+        Index("ix_event_logs_run_id_device_id_id", "run_id", "device_id", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     run_id = Column(Integer, ForeignKey("runs.id"))
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)
@@ -73,23 +147,27 @@ class DBEventLog(Base):
     ts = Column(DateTime, default=datetime.now)
     level = Column(String)
     message = Column(Text)
-    raw = Column(Text, nullable=True)
+    raw = deferred(Column(Text, nullable=True)) # Console output, loaded on access
     error_code = Column(String, nullable=True)
     run = relationship("DBRun", back_populates="event_logs")
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def init_db(db_engine=None):
+    db_engine = db_engine if db_engine is not None else engine
+    Base.metadata.create_all(bind=db_engine)
     
     # Soft migration: Add missing columns if they don't exist
     from sqlalchemy import inspect, text
-    inspector = inspect(engine)
+    inspector = inspect(db_engine)
     
-    with engine.connect() as conn:
+    with db_engine.connect() as conn:
         # Tables to check
         updates = {
-            "run_devices": ["error_code", "template_hash", "tasks", "captured_config"],
-            "event_logs": ["error_code"]
+            "run_devices": ["error_code", "template_hash", "tasks", "captured_config", "config_hash", "plan", "blocks_completed"],
+            "event_logs": ["error_code"],
+            "runs": ["lease_owner", "lease_expires_at", "heartbeat_at", "attempts", "mode", "resumed_from"],
         }
+        # Everything else is added as VARCHAR (or TEXT, below)
+        column_types = {"lease_expires_at": "DATETIME", "heartbeat_at": "DATETIME", "attempts": "INTEGER DEFAULT 0", "blocks_completed": "INTEGER DEFAULT 0", "mode": "VARCHAR DEFAULT 'full'", "resumed_from": "INTEGER"}
         
         for table, columns in updates.items():
             existing_columns = [c["name"] for c in inspector.get_columns(table)]
@@ -97,16 +175,51 @@ def init_db():
                 if col not in existing_columns:
                     print(f"Adding missing column {col} to {table}")
                     # Map column name to SQL type
-                    col_type = "TEXT" if col in ["template_hash", "tasks", "captured_config"] else "VARCHAR"
+                    col_type = column_types.get(col, "TEXT" if col in ["template_hash", "tasks", "captured_config", "plan"] else "VARCHAR")
                     try:
                         conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
                         conn.commit()
                     except Exception as e:
                         print(f"Failed to add column {col} to {table}: {e}")
 
+    # Soft migration: create_all only indexes tables it creates, so add
+    # indexes introduced later to existing tables as well
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            print(f"Creating missing index {index.name} on {table.name}")
+            try:
+                if index.unique:
+                    # Rows written before the constraint may repeat a key; keep the latest of each
+                    columns = ", ".join(c.name for c in index.columns)
+                    with db_engine.begin() as conn:
+                        dropped = conn.execute(text(
+                            f"DELETE FROM {table.name} WHERE id NOT IN (SELECT MAX(id) FROM {table.name} GROUP BY {columns})"
+                        )).rowcount
+                    if dropped:
+                        print(f"Removed {dropped} duplicate rows from {table.name} for {index.name}")
+                index.create(bind=db_engine, checkfirst=True)
+            except Exception as e:
+                print(f"Failed to create index {index.name} on {table.name}: {e}")
+
+    # Data migration: move plain-text configs into the compressed blob store
+    from .config_store import migrate_captured_configs
+    try:
+        moved = migrate_captured_configs(db_engine)
+        if moved:
+            print(f"Moved {moved} captured configs to config_blobs")
+    except Exception as e:
+        print(f"Failed to migrate captured configs: {e}")
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
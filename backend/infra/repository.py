@@ -1,7 +1,10 @@
-from datetime import datetime, timezone
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session, undefer
+from typing import Any, Dict, List, Optional
 from .database import DBJob, DBDevice, DBRun, DBRunDevice, DBEventLog
+from . import config_store
 from ..core import models
 
 def get_job(db: Session, job_id: int):
@@ -45,9 +48,17 @@ def delete_device(db: Session, device_id: int):
         return True
     return False
 
-def create_run(db: Session, run: models.RunCreate):
-    db_run = DBRun(job_id=run.job_id, parallelism=run.parallelism)
+def create_run(db: Session, run: models.RunCreate, run_devices: Optional[List[Dict[str, Any]]] = None, status: str = "running"):
+    """
+    Creates the run, together with its run_devices rows (e.g. from
+    config_plan.plan_run_devices) in one commit. With status "queued" it waits
+    for an executor to claim it.
+    """
+    db_run = DBRun(job_id=run.job_id, parallelism=run.parallelism, status=status, mode=run.mode, resumed_from=run.resumed_from)
     db.add(db_run)
+    if run_devices:
+        db.flush()
+        db.execute(insert(DBRunDevice), [{"run_id": db_run.id, **row} for row in run_devices])
     db.commit()
     db.refresh(db_run)
     return db_run
@@ -55,8 +66,84 @@ def create_run(db: Session, run: models.RunCreate):
 def get_run(db: Session, run_id: int):
     return db.query(DBRun).filter(DBRun.id == run_id).first()
 
-def get_run_logs(db: Session, run_id: int):
-    return db.query(DBEventLog).filter(DBEventLog.run_id == run_id).all()
+def get_latest_finished_run(db: Session, job_id: int):
+    return db.query(DBRun).filter(
+        DBRun.job_id == job_id, func.lower(DBRun.status).notin_(models.RUN_ACTIVE_STATUSES)
+    ).order_by(DBRun.id.desc()).first()
+
+# Event log columns without the raw console output; has_raw tells whether there is one
+EVENT_LOG_SUMMARY_COLUMNS = (
+    DBEventLog.id, DBEventLog.run_id, DBEventLog.device_id, DBEventLog.port, DBEventLog.ts,
+    DBEventLog.level, DBEventLog.message, DBEventLog.error_code, DBEventLog.raw.isnot(None).label("has_raw"),
+)
+
+def get_run_logs(db: Session, run_id: int, since_id: Optional[int] = None, limit: Optional[int] = None, levels: Optional[List[str]] = None, device_id: Optional[int] = None, port: Optional[int] = None, include_raw: bool = True):
+    """
+    Event logs of a run in id order. since_id/limit page through them (pass the
+    last id received as the next since_id); without include_raw the raw console
+    output is not even read from the database.
+    """
+    query = db.query(DBEventLog).options(undefer(DBEventLog.raw)) if include_raw else db.query(*EVENT_LOG_SUMMARY_COLUMNS)
+    query = query.filter(DBEventLog.run_id == run_id)
+    if since_id is not None:
+        query = query.filter(DBEventLog.id > since_id)
+    if levels:
+        query = query.filter(DBEventLog.level.in_([level.upper() for level in levels]))
+    if device_id is not None:
+        query = query.filter(DBEventLog.device_id == device_id)
+    if port is not None:
+        query = query.filter(DBEventLog.port == port)
+    query = query.order_by(DBEventLog.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+def get_event_log(db: Session, run_id: int, log_id: int):
+    return db.query(DBEventLog).options(undefer(DBEventLog.raw)).filter(DBEventLog.run_id == run_id, DBEventLog.id == log_id).first()
+
+def get_run_devices(db: Session, run_id: int):
+    # captured_config and tasks are deferred, so this never reads the config bodies
+    return db.query(DBRunDevice).filter(DBRunDevice.run_id == run_id).order_by(DBRunDevice.device_id).all()
+
+def get_run_device_config_ref(db: Session, run_id: int, device_id: int):
+    """The run device's (config_hash,) row, None if the run device does not exist."""
+    return db.query(DBRunDevice.config_hash).filter(DBRunDevice.run_id == run_id, DBRunDevice.device_id == device_id).first()
+
+def get_run_device_config(db: Session, run_id: int, device_id: int) -> Optional[str]:
+    ref = get_run_device_config_ref(db, run_id, device_id)
+    if not ref or not ref.config_hash:
+        return None
+    return config_store.load_config(db, ref.config_hash)
+
+# Everything about a run device except the (large) captured config
+RUN_DEVICE_STATE_COLUMNS = (
+    DBRunDevice.run_id, DBRunDevice.device_id, DBRunDevice.status, DBRunDevice.started_at,
+    DBRunDevice.finished_at, DBRunDevice.error_message, DBRunDevice.error_code, DBRunDevice.template_hash,
+    DBRunDevice.blocks_completed,
+)
+
+def get_run_device_plan(db: Session, run_id: int, device_id: int):
+    """The run device's stored plan with its hash and error, None if the run device does not exist."""
+    return db.query(DBRunDevice.template_hash, DBRunDevice.plan, DBRunDevice.error_message, DBRunDevice.error_code, DBRunDevice.blocks_completed).filter(
+        DBRunDevice.run_id == run_id, DBRunDevice.device_id == device_id
+    ).first()
+
+def get_unverified_run_devices(db: Session, run_id: int):
+    """Plan and checkpoint of the run's devices that did not verify, what a resume run picks up."""
+    return db.query(DBRunDevice.device_id, DBRunDevice.template_hash, DBRunDevice.plan, DBRunDevice.blocks_completed).filter(
+        DBRunDevice.run_id == run_id, DBRunDevice.status != "VERIFIED"
+    ).order_by(DBRunDevice.device_id).all()
+
+def save_run_device_checkpoint(db: Session, run_id: int, device_id: int, blocks_completed: int):
+    """Records that the first blocks_completed blocks of the device's plan went through; never moves back."""
+    db.query(DBRunDevice).filter(
+        DBRunDevice.run_id == run_id, DBRunDevice.device_id == device_id,
+        func.coalesce(DBRunDevice.blocks_completed, 0) < blocks_completed
+    ).update({"blocks_completed": blocks_completed}, synchronize_session=False)
+    db.commit()
+
+def get_run_device_states(db: Session, run_id: int):
+    return db.query(*RUN_DEVICE_STATE_COLUMNS).filter(DBRunDevice.run_id == run_id).order_by(DBRunDevice.device_id).all()
 
 def get_runs_by_job(db: Session, job_id: int):
     return db.query(DBRun).filter(DBRun.job_id == job_id).order_by(DBRun.id.desc()).all()
@@ -71,6 +158,8 @@ def update_run_device_status(db: Session, run_id: int, device_id: int, status: s
         db.add(db_rd)
     
     db_rd.status = status
+    if template_hash:
+        db_rd.template_hash = template_hash
     if status == "RUNNING":
         db_rd.started_at = datetime.now(timezone.utc)
     elif status in ["VERIFIED", "FAILED"]:
@@ -79,12 +168,10 @@ def update_run_device_status(db: Session, run_id: int, device_id: int, status: s
             db_rd.error_message = error_message
         if error_code:
             db_rd.error_code = error_code
-        if template_hash:
-            db_rd.template_hash = template_hash
         if tasks:
             db_rd.tasks = tasks
         if captured_config:
-            db_rd.captured_config = captured_config
+            db_rd.config_hash = config_store.store_config(db, captured_config)
     
     db.commit()
     db.refresh(db_rd)
@@ -96,5 +183,100 @@ def update_run_status(db: Session, run_id: int, status: str):
         db_run.status = status
         if status in ["COMPLETED", "FAILED"]:
             db_run.finished_at = datetime.now(timezone.utc)
+            db_run.lease_owner = None
+            db_run.lease_expires_at = None
         db.commit()
     return db_run
+
+# Run queue. Runs are created "queued"; an executor claims one by taking its
+# lease and must renew it before it expires. A run whose lease expired (its
+# executor died) is claimed again, up to max_attempts times.
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def claim_next_run(db: Session, owner: str, lease_seconds: float, max_attempts: int) -> Optional[int]:
+    """Takes the lease of the oldest claimable run and marks it running. Returns its id, None if there is none."""
+    now = _utcnow()
+    expired = (DBRun.status == "running") & DBRun.lease_owner.isnot(None) & (DBRun.lease_expires_at < now)
+
+    # Given up on: crashed executors too often
+    db.query(DBRun).filter(expired, DBRun.attempts >= max_attempts).update(
+        {"status": "FAILED", "finished_at": now, "lease_owner": None, "lease_expires_at": None}, synchronize_session=False
+    )
+    db.commit()
+
+    claimable = (DBRun.status == "queued") | expired
+    for (run_id,) in db.query(DBRun.id).filter(claimable).order_by(DBRun.id).limit(10).all():
+        # Conditional update: only one executor wins a run
+        claimed = db.query(DBRun).filter(DBRun.id == run_id, claimable).update({
+            "status": "running",
+            "lease_owner": owner,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            "heartbeat_at": now,
+            "attempts": func.coalesce(DBRun.attempts, 0) + 1,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return run_id
+    return None
+
+def renew_run_lease(db: Session, run_id: int, owner: str, lease_seconds: float) -> bool:
+    """Heartbeat of the executing owner. False if the lease was lost (expired and claimed by another executor, or finished)."""
+    now = _utcnow()
+    renewed = db.query(DBRun).filter(DBRun.id == run_id, DBRun.lease_owner == owner, DBRun.status == "running").update(
+        {"lease_expires_at": now + timedelta(seconds=lease_seconds), "heartbeat_at": now}, synchronize_session=False
+    )
+    db.commit()
+    return bool(renewed)
+
+def release_run(db: Session, run_id: int, owner: str) -> bool:
+    """Puts a run the owner stops executing (e.g. on shutdown) back into the queue."""
+    released = db.query(DBRun).filter(DBRun.id == run_id, DBRun.lease_owner == owner, DBRun.status == "running").update(
+        {"status": "queued", "lease_owner": None, "lease_expires_at": None}, synchronize_session=False
+    )
+    db.commit()
+    return bool(released)
+
+
+# Async repository: the same queries, run on an AsyncSession so callers on the
+# event loop (runner, scheduler, async routes) never block on the database.
+
+async def get_job_async(db: AsyncSession, job_id: int):
+    return await db.run_sync(get_job, job_id)
+
+async def get_devices_by_job_async(db: AsyncSession, job_id: int):
+    return await db.run_sync(get_devices_by_job, job_id)
+
+async def get_device_by_id_async(db: AsyncSession, device_id: int):
+    return await db.run_sync(get_device_by_id, device_id)
+
+async def get_run_async(db: AsyncSession, run_id: int):
+    return await db.run_sync(get_run, run_id)
+
+async def get_run_logs_async(db: AsyncSession, run_id: int, **filters):
+    return await db.run_sync(get_run_logs, run_id, **filters)
+
+async def get_run_device_plan_async(db: AsyncSession, run_id: int, device_id: int):
+    return await db.run_sync(get_run_device_plan, run_id, device_id)
+
+async def get_run_device_states_async(db: AsyncSession, run_id: int):
+    return await db.run_sync(get_run_device_states, run_id)
+
+async def save_run_device_checkpoint_async(db: AsyncSession, run_id: int, device_id: int, blocks_completed: int):
+    return await db.run_sync(save_run_device_checkpoint, run_id, device_id, blocks_completed)
+
+async def update_run_device_status_async(db: AsyncSession, run_id: int, device_id: int, status: str, **fields):
+    return await db.run_sync(update_run_device_status, run_id, device_id, status, **fields)
+
+async def update_run_status_async(db: AsyncSession, run_id: int, status: str):
+    return await db.run_sync(update_run_status, run_id, status)
+
+async def claim_next_run_async(db: AsyncSession, owner: str, lease_seconds: float, max_attempts: int) -> Optional[int]:
+    return await db.run_sync(claim_next_run, owner, lease_seconds, max_attempts)
+
+async def renew_run_lease_async(db: AsyncSession, run_id: int, owner: str, lease_seconds: float) -> bool:
+    return await db.run_sync(renew_run_lease, run_id, owner, lease_seconds)
+
+async def release_run_async(db: AsyncSession, run_id: int, owner: str) -> bool:
+    return await db.run_sync(release_run, run_id, owner)
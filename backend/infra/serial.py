@@ -1,17 +1,105 @@
+import asyncio
+import errno
+import logging
 import os
+import select
 import serial
 import time
 import re
-from typing import List, Optional
+from typing import Dict, List, Optional
+from pydantic import BaseModel
 
 from ..app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts to open a port that another process has locked
+PORT_LOCK_POLL = 1.0
+
+# Bytes of already-scanned output kept in view when a new chunk arrives. A
+# prompt can straddle a chunk boundary, so this must exceed the longest prompt.
+PROMPT_WINDOW = 256
+
+# Console noise outside 7-bit ASCII is dropped, as the str decode always did
+_NON_ASCII = bytes(range(128, 256))
+
+# What ends the output of a command unless told otherwise: the exec or enable prompt
+DEFAULT_PROMPT = r"[#>]"
+# Matches nothing: read_until_prompt with it reads until the timeout
+NO_PROMPT = r"(?!)"
+
+
+class PromptMatcher:
+    """
+    Streaming, end-anchored prompt detection over a byte buffer.
+
+    Each feed only searches the new chunk plus the trailing PROMPT_WINDOW bytes
+    before it, so reading a large output is linear instead of re-scanning the
+    whole accumulated text per chunk. The output is decoded once, by text().
+    """
+    def __init__(self, prompt_regex: str = DEFAULT_PROMPT, window: int = PROMPT_WINDOW):
+        # Anchor the regex to the end of the buffer (or of a line), allowing for
+        # optional trailing whitespace, so '#' or '>' inside descriptions is ignored
+        self.pattern = re.compile(f"({prompt_regex})\\s*$".encode("ascii"), re.MULTILINE)
+        self.window = window
+        self.buffer = bytearray()
+        self.matched = False
+
+    def feed(self, chunk: bytes) -> bool:
+        start = max(0, len(self.buffer) - self.window)
+        self.buffer += chunk.translate(None, _NON_ASCII)
+        if not self.matched and self.pattern.search(self.buffer, start):
+            self.matched = True
+        return self.matched
+
+    def text(self) -> str:
+        return self.buffer.decode("ascii")
+
+
+class PromptTimeout(TimeoutError):
+    """No prompt arrived in time. output holds what was read until then."""
+    def __init__(self, output: str, timeout: float):
+        super().__init__(f"Serial timeout: no prompt within {timeout:g}s")
+        self.output = output
+        self.timeout = timeout
+
+
+class RetryPolicy(BaseModel):
+    """
+    What the runner does when a command gets no prompt (or the port fails):
+    wait, reopen the port, re-sync the prompt and send the command again, at
+    most retries times.
+    """
+    retries: int = 2
+    backoff: float = 1.0 # seconds before the first retry, doubled for each further one
+    max_backoff: float = 10.0
+    send_break: bool = False # send a break before the newline when re-syncing
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            retries=settings.SERIAL_RETRIES,
+            backoff=settings.SERIAL_RETRY_BACKOFF,
+            max_backoff=settings.SERIAL_RETRY_MAX_BACKOFF,
+            send_break=settings.SERIAL_RESYNC_BREAK,
+        )
+
+    def delay(self, attempt: int) -> float:
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+
 class SerialSession:
     def __init__(self, port: str, baudrate: int = None, timeout: float = None):
         self.port = port
         self.baudrate = baudrate if baudrate is not None else settings.SERIAL_BAUDRATE
         self.timeout = timeout if timeout is not None else settings.SERIAL_TIMEOUT
         self.ser: Optional[serial.Serial] = None
+        # Counters to measure how often a reader is woken and how much it reads
+        self.wakeups = 0
+        self.bytes_read = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"wakeups": self.wakeups, "bytes_read": self.bytes_read}
 
     def open(self):
         if not self.ser:
@@ -37,41 +125,274 @@ class SerialSession:
         self.ser.write((line + "\n").encode("ascii"))
         self.ser.flush()
 
-    def read_until_prompt(self, prompt_regex: str = r"[#>]", timeout: Optional[float] = None) -> str:
+    def read_until_prompt(self, prompt_regex: str = DEFAULT_PROMPT, timeout: Optional[float] = None, raise_on_timeout: bool = False) -> str:
+        """
+        Output up to and including the prompt. Without a prompt before the
+        timeout, returns what arrived, or raises PromptTimeout with
+        raise_on_timeout.
+        """
         if not self.ser:
             raise RuntimeError("Serial port not open")
         
-        start_time = time.time()
         effective_timeout = timeout if timeout is not None else self.timeout
-        output = ""
-        
-        # Anchor the regex to the end of the string, allowing for optional trailing whitespace
-        # This prevents matching '#' or '>' symbols that appear in the middle of command output (like descriptions)
-        pattern = re.compile(f"({prompt_regex})\\s*$", re.MULTILINE)
+        deadline = time.monotonic() + effective_timeout
+        matcher = PromptMatcher(prompt_regex)
         
         while True:
             n = self.ser.in_waiting
-            if n > 0:
-                # Read all available bytes instead of one by one for efficiency
-                chunk = self.ser.read(n).decode("ascii", errors="ignore")
-                output += chunk
-                
-                if pattern.search(output):
-                    break
-            else:
-                # Only check time if we didn't read anything to avoid exiting 
+            if n == 0:
+                # Only check the deadline while the line is idle to avoid exiting
                 # if we are receiving a lot of data fast
-                if time.time() - start_time > effective_timeout:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
                     break
-                time.sleep(0.01)
+                if not self._wait_for_data(remaining):
+                    continue
+                # Readable with nothing queued means a hangup; read() reports it
+                n = self.ser.in_waiting or 1
+
+            # Read all available bytes instead of one by one for efficiency
+            chunk = self.ser.read(n)
+            self.bytes_read += len(chunk)
+            if matcher.feed(chunk):
+                break
             
-        return output
+        if raise_on_timeout and not matcher.matched:
+            raise PromptTimeout(matcher.text(), effective_timeout)
+        return matcher.text()
+
+    def _wait_for_data(self, timeout: float) -> bool:
+        """
+        Block until the port is readable or the timeout expires.
+        Ports without a file descriptor (e.g. pyserial URL handlers) fall back
+        to a short poll.
+        """
+        try:
+            fd = self.ser.fileno()
+        except (AttributeError, OSError, serial.SerialException):
+            time.sleep(min(timeout, 0.01))
+            self.wakeups += 1
+            return self.ser.in_waiting > 0
+
+        readable, _, _ = select.select([fd], [], [], timeout)
+        self.wakeups += 1
+        return bool(readable)
+
+    def flush(self):
+        if self.ser:
+            self.ser.reset_input_buffer()
+            self.ser.reset_output_buffer()
+
+    def send_break(self, duration: float = 0.25):
+        self.ser.send_break(duration)
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def drain(self, quiet: float = 0.5, max_wait: Optional[float] = None):
+        """
+        Discards input until the line has been quiet for quiet seconds, e.g.
+        the rest of an answer that timed out. A console that keeps talking
+        (log spam, a boot loop) raises PromptTimeout after max_wait seconds,
+        by default the session timeout.
+        """
+        max_wait = max_wait if max_wait is not None else self.timeout
+        deadline = time.monotonic() + max_wait
+        self.flush()
+        # A prompt regex that never matches reads until the line goes quiet
+        while output := self.read_until_prompt(NO_PROMPT, timeout=quiet):
+            if time.monotonic() >= deadline:
+                raise PromptTimeout(output, max_wait)
+
+    def resync(self, prompt_regex: str = DEFAULT_PROMPT, timeout: Optional[float] = None, send_break: bool = False, quiet: float = 0.5) -> str:
+        """
+        Drains pending output, optionally sends a break, then a newline, and
+        returns the prompt that answers it. Raises PromptTimeout.
+        """
+        self.drain(quiet)
+        if send_break:
+            self.send_break()
+        self.send_line("")
+        return self.read_until_prompt(prompt_regex, timeout, raise_on_timeout=True)
+
+
+class AsyncSerialSession:
+    """
+    Event-loop driven variant of SerialSession.
+
+    The tty file descriptor is registered with the running loop (add_reader /
+    add_writer), so sending a line or waiting for a prompt never needs an
+    executor thread.
+    """
+    READ_SIZE = 4096
+
+    def __init__(self, port: str, baudrate: int = None, timeout: float = None):
+        self.port = port
+        self.baudrate = baudrate if baudrate is not None else settings.SERIAL_BAUDRATE
+        self.timeout = timeout if timeout is not None else settings.SERIAL_TIMEOUT
+        self.ser: Optional[serial.Serial] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+        self._buffer = bytearray()
+        self._data_ready = asyncio.Event()
+        self._eof = False
+        self.wakeups = 0
+        self.bytes_read = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"wakeups": self.wakeups, "bytes_read": self.bytes_read}
+
+    async def open(self, lock_wait: Optional[float] = None):
+        """
+        Opens the port exclusively (flock). While another process, e.g. a
+        second executor, holds it, retries every PORT_LOCK_POLL seconds for up
+        to lock_wait (default SERIAL_PORT_LOCK_WAIT) before giving up.
+        """
+        if not self.ser:
+            lock_wait = lock_wait if lock_wait is not None else settings.SERIAL_PORT_LOCK_WAIT
+            deadline = asyncio.get_running_loop().time() + lock_wait
+            while True:
+                try:
+                    # timeout=0 keeps pyserial non-blocking; the loop does the waiting
+                    self.ser = serial.Serial(
+                        port=self.port,
+                        baudrate=self.baudrate,
+                        parity=serial.PARITY_NONE,
+                        stopbits=serial.STOPBITS_ONE,
+                        bytesize=serial.EIGHTBITS,
+                        timeout=0,
+                        write_timeout=0,
+                        exclusive=True
+                    )
+                    break
+                except serial.SerialException as e:
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK) or remaining <= 0:
+                        raise
+                    logger.debug(f"{self.port} is locked by another process, waiting")
+                    await asyncio.sleep(min(PORT_LOCK_POLL, remaining))
+        if not self.ser.is_open:
+            self.ser.open()
+
+        self._loop = asyncio.get_running_loop()
+        self._fd = self.ser.fileno()
+        os.set_blocking(self._fd, False)
+        self._eof = False
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    async def close(self):
+        if self._loop and self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop.remove_writer(self._fd)
+        self._fd = None
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+        self.ser = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: the other end of the tty went away
+            data = b""
+        if not data:
+            self._eof = True
+            self._loop.remove_reader(self._fd)
+        self.bytes_read += len(data)
+        self._buffer += data
+        self._data_ready.set()
+
+    async def _wait_writable(self):
+        fut = self._loop.create_future()
+
+        def _on_writable():
+            if not fut.done():
+                fut.set_result(None)
+
+        self._loop.add_writer(self._fd, _on_writable)
+        try:
+            await fut
+        finally:
+            self._loop.remove_writer(self._fd)
+
+    async def send_line(self, line: str):
+        if not self.ser:
+            raise RuntimeError("Serial port not open")
+        view = memoryview((line + "\n").encode("ascii"))
+        while view:
+            try:
+                written = os.write(self._fd, view)
+            except BlockingIOError:
+                written = 0
+            view = view[written:]
+            if view:
+                await self._wait_writable()
+
+    async def read_until_prompt(self, prompt_regex: str = DEFAULT_PROMPT, timeout: Optional[float] = None, raise_on_timeout: bool = False) -> str:
+        """See SerialSession.read_until_prompt."""
+        if not self.ser:
+            raise RuntimeError("Serial port not open")
+
+        effective_timeout = timeout if timeout is not None else self.timeout
+        deadline = self._loop.time() + effective_timeout
+        matcher = PromptMatcher(prompt_regex)
+
+        while True:
+            if self._buffer:
+                matched = matcher.feed(self._buffer)
+                self._buffer.clear()
+                if matched:
+                    break
+                continue
+
+            remaining = deadline - self._loop.time()
+            if remaining <= 0 or self._eof:
+                break
+            self._data_ready.clear()
+            try:
+                await asyncio.wait_for(self._data_ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            finally:
+                self.wakeups += 1
+
+        if raise_on_timeout and not matcher.matched:
+            raise PromptTimeout(matcher.text(), effective_timeout)
+        return matcher.text()
 
     def flush(self):
+        self._buffer.clear()
         if self.ser:
             self.ser.reset_input_buffer()
             self.ser.reset_output_buffer()
 
+    async def send_break(self, duration: float = 0.25):
+        # tcsendbreak blocks for the duration of the break
+        await self._loop.run_in_executor(None, self.ser.send_break, duration)
+
+    async def reconnect(self):
+        await self.close()
+        await self.open()
+
+    async def drain(self, quiet: float = 0.5, max_wait: Optional[float] = None):
+        """See SerialSession.drain."""
+        max_wait = max_wait if max_wait is not None else self.timeout
+        deadline = asyncio.get_running_loop().time() + max_wait
+        self.flush()
+        while output := await self.read_until_prompt(NO_PROMPT, timeout=quiet):
+            if asyncio.get_running_loop().time() >= deadline:
+                raise PromptTimeout(output, max_wait)
+
+    async def resync(self, prompt_regex: str = DEFAULT_PROMPT, timeout: Optional[float] = None, send_break: bool = False, quiet: float = 0.5) -> str:
+        """See SerialSession.resync."""
+        await self.drain(quiet)
+        if send_break:
+            await self.send_break()
+        await self.send_line("")
+        return await self.read_until_prompt(prompt_regex, timeout, raise_on_timeout=True)
 
 
 def discover_ports(base_path: str = None) -> List[str]:
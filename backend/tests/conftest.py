@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend.infra import database
+
+
+# File-backed so the sync fixtures and the async code under test share one database
+@pytest.fixture(scope="session")
+def engine(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    engine = database.configure_sqlite(create_engine(url, connect_args={"check_same_thread": False}))
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope="session")
+def async_engine(engine):
+    # NullPool: no connection outlives the event loop of the test that opened it
+    async_engine = create_async_engine(database.async_database_url(engine.url.render_as_string()), poolclass=NullPool)
+    database.configure_sqlite(async_engine.sync_engine)
+    return async_engine
+
+@pytest.fixture(scope="session")
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture(scope="session")
+def async_session_factory(async_engine):
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+@pytest.fixture
+def tables(engine):
+    """A fresh schema for each test."""
+    database.Base.metadata.create_all(bind=engine)
+    yield
+    database.Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def db(tables, session_factory):
+    session = session_factory()
+    yield session
+    session.close()
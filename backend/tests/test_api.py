@@ -1,37 +1,33 @@
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from backend.app.main import app
-from backend.infra.database import Base, get_db
+from backend.core import models
+from backend.core.services.run_events import stream_run_events
+from backend.infra import database, repository
+from backend.infra.database import get_db, get_async_db
+import json
 import pytest
+from unittest.mock import patch
 
-from sqlalchemy.pool import StaticPool
-
-# Setup in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite://"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
 
 client = TestClient(app)
 
 @pytest.fixture(autouse=True)
-def setup_db():
-    Base.metadata.create_all(bind=engine)
+def setup_db(tables, session_factory, async_session_factory):
+    def override_get_db():
+        try:
+            db = session_factory()
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     yield
-    Base.metadata.drop_all(bind=engine)
+    app.dependency_overrides.clear()
 
 def test_create_and_list_jobs():
     response = client.post("/jobs", json={"name": "Job 1", "customer": "Cust A"})
@@ -68,6 +64,108 @@ def test_import_csv_endpoint():
     assert len(dev_resp.json()) == 1
     assert dev_resp.json()[0]["hostname"] == "Switch1"
 
+def test_import_csv_all_or_nothing():
+    job_id = client.post("/jobs", json={"name": "Strict Import Job"}).json()["id"]
+
+    # BOM and a row without a hostname
+    csv_data = "\ufeffport,hostname,mgmt_ip,mask,gateway,mgmt_vlan,model\n1,Switch1,10.0.0.1,255.255.255.0,10.0.0.254,10,C3750\n2,,10.0.0.2,255.255.255.0,10.0.0.254,10,C3750\n"
+    files = {"file": ("data.csv", csv_data.encode("utf-8"), "text/csv")}
+
+    response = client.post(f"/jobs/{job_id}/devices/import-csv?mode=all_or_nothing", files=files)
+    assert response.status_code == 200
+    assert response.json()["mode"] == "all_or_nothing"
+    assert response.json()["success_count"] == 0
+    assert response.json()["errors"] == ["Line 2: Missing required fields: hostname"]
+    assert client.get(f"/jobs/{job_id}/devices").json() == []
+
+    # Same file, default mode: the valid row goes in
+    response = client.post(f"/jobs/{job_id}/devices/import-csv", files=files)
+    assert response.json()["success_count"] == 1
+
+    assert client.post(f"/jobs/{job_id}/devices/import-csv?mode=partial", files=files).status_code == 422
+
+def test_create_run_stores_config_plans():
+    job_id = client.post("/jobs", json={"name": "Plan Job"}).json()["id"]
+    device = client.post(f"/jobs/{job_id}/devices", json={
+        "job_id": job_id, "hostname": "sw1", "mgmt_ip": "10.0.0.1", "mask": "/24", "gateway": "10.0.0.254", "port": 1, "vendor": "cisco"
+    }).json()
+    preview = client.get(f"/jobs/{job_id}/devices/{device['id']}/preview").json()
+
+    run = client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id, "parallelism": 1}).json()
+    assert run["status"] == "queued"
+
+    # Preview, run device and plan share one hash
+    run_devices = client.get(f"/runs/{run['id']}/devices").json()
+    assert [(d["device_id"], d["status"], d["template_hash"]) for d in run_devices] == [(device["id"], "PENDING", preview["hash"])]
+    plan = client.get(f"/runs/{run['id']}/devices/{device['id']}/plan").json()
+    assert plan["hash"] == preview["hash"]
+    assert plan["vendor"] == "cisco"
+    assert "hostname sw1" in plan["blocks"][1]["commands"]
+
+    # Editing the device afterwards leaves the stored plan alone
+    client.patch(f"/devices/{device['id']}", json={"hostname": "sw-edited"})
+    assert client.get(f"/runs/{run['id']}/devices/{device['id']}/plan").json() == plan
+    assert client.get(f"/jobs/{job_id}/devices/{device['id']}/preview").json()["hash"] != plan["hash"]
+
+def test_create_run_renders_plans_off_the_event_loop():
+    import threading
+    from backend.core import config_plan
+
+    job_id = client.post("/jobs", json={"name": "Pool Job"}).json()["id"]
+    device_ids = [client.post(f"/jobs/{job_id}/devices", json={
+        "job_id": job_id, "hostname": f"sw{i}", "mgmt_ip": f"10.0.0.{i}", "mask": "/24", "gateway": "10.0.0.254", "port": i
+    }).json()["id"] for i in range(1, 6)]
+
+    render_plan = config_plan.render_plan
+    threads = []
+    async def recording_render_plan(device):
+        threads.append(threading.current_thread().name)
+        return await render_plan(device)
+
+    with patch("backend.core.config_plan.render_plan", recording_render_plan), \
+         patch("backend.core.services.preview_service.CHUNK_SIZE", 2):
+        run = client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id}).json()
+
+    assert len(threads) == 5 and all(name.startswith("preview") for name in threads)
+    # Chunks come back in device order
+    run_devices = client.get(f"/runs/{run['id']}/devices").json()
+    assert sorted(d["device_id"] for d in run_devices) == device_ids
+    for d in run_devices:
+        plan = client.get(f"/runs/{run['id']}/devices/{d['device_id']}/plan").json()
+        assert plan["params"]["hostname"] == f"sw{device_ids.index(d['device_id']) + 1}"
+
+def test_resume_run_continues_unverified_devices(session_factory):
+    job_id = client.post("/jobs", json={"name": "Resume Job"}).json()["id"]
+    devices = [client.post(f"/jobs/{job_id}/devices", json={
+        "job_id": job_id, "hostname": f"sw{i}", "mgmt_ip": f"10.0.0.{i}", "mask": "/24", "gateway": "10.0.0.254", "port": i, "vendor": "cisco"
+    }).json() for i in (1, 2)]
+    run = client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id}).json()
+
+    # Not finished yet
+    assert client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id, "mode": "resume", "resumed_from": run["id"]}).status_code == 409
+
+    db = session_factory()
+    repository.update_run_device_status(db, run["id"], devices[0]["id"], "VERIFIED")
+    repository.save_run_device_checkpoint(db, run["id"], devices[1]["id"], 2)
+    repository.update_run_device_status(db, run["id"], devices[1]["id"], "FAILED", error_code="SERIAL_TIMEOUT")
+    repository.update_run_status(db, run["id"], "COMPLETED")
+    db.close()
+
+    resumed = client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id, "mode": "resume"}).json()
+    assert (resumed["status"], resumed["mode"], resumed["resumed_from"]) == ("queued", "resume", run["id"])
+    run_devices = client.get(f"/runs/{resumed['id']}/devices").json()
+    assert [(d["device_id"], d["status"], d["blocks_completed"]) for d in run_devices] == [(devices[1]["id"], "PENDING", 2)]
+    assert client.get(f"/runs/{resumed['id']}/devices/{devices[1]['id']}/plan").json() == client.get(f"/runs/{run['id']}/devices/{devices[1]['id']}/plan").json()
+
+    # Nothing left to resume once every device verified
+    db = session_factory()
+    repository.update_run_device_status(db, resumed["id"], devices[1]["id"], "VERIFIED")
+    repository.update_run_status(db, resumed["id"], "COMPLETED")
+    db.close()
+    assert client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id, "mode": "resume"}).status_code == 409
+    assert client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id, "mode": "resume", "resumed_from": 999}).status_code == 404
+    assert client.post(f"/jobs/{job_id}/runs", json={"job_id": job_id, "mode": "partial"}).status_code == 422
+
 def test_dry_run_endpoint():
     # Create job
     job_resp = client.post("/jobs", json={"name": "Dry Run Job"})
@@ -87,3 +185,154 @@ def test_dry_run_endpoint():
     errors = response.json()
     assert len(errors) > 0
     assert any("Duplicate management IP" in e["message"] for e in errors)
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith((":", "retry")))
+        if "event" in fields:
+            events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return events
+
+def seed_finished_run(session_factory):
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="Stream Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1", mask="/24", gateway="10.0.0.254", port=1
+    ))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+    repository.update_run_device_status(db, run.id, device.id, "VERIFIED", captured_config="hostname sw1")
+    for message in ("Connecting", "Applying", "Verified"):
+        db.add(database.DBEventLog(run_id=run.id, device_id=device.id, port=1, level="INFO", message=message))
+    db.commit()
+    repository.update_run_status(db, run.id, "COMPLETED")
+    ids = (run.id, device.id)
+    db.close()
+    return ids
+
+def test_run_events_stream(session_factory, async_session_factory):
+    run_id, device_id = seed_finished_run(session_factory)
+
+    with patch("backend.core.services.run_events.AsyncSessionLocal", async_session_factory):
+        response = client.get(f"/runs/{run_id}/events")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    kinds = [e[0] for e in events]
+    assert kinds == ["run", "device", "log", "log", "log", "end"]
+    assert events[0][2]["status"] == "COMPLETED"
+    assert events[1][2]["device_id"] == device_id and events[1][2]["status"] == "VERIFIED"
+    assert "captured_config" not in events[1][2]
+    assert [e[2]["message"] for e in events if e[0] == "log"] == ["Connecting", "Applying", "Verified"]
+    assert all(int(e[1]) == e[2]["id"] for e in events if e[0] == "log")
+
+def test_run_events_resume_from_last_event_id(session_factory, async_session_factory):
+    run_id, _ = seed_finished_run(session_factory)
+
+    with patch("backend.core.services.run_events.AsyncSessionLocal", async_session_factory):
+        first = parse_sse(client.get(f"/runs/{run_id}/events").text)
+        first_log_id = next(e[1] for e in first if e[0] == "log")
+        resumed = parse_sse(client.get(f"/runs/{run_id}/events", headers={"Last-Event-ID": first_log_id}).text)
+
+    assert [e[2]["message"] for e in resumed if e[0] == "log"] == ["Applying", "Verified"]
+    assert client.get("/runs/999/events").status_code == 404
+
+@pytest.mark.asyncio
+async def test_run_events_push_device_transitions(session_factory, async_session_factory):
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="Live Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1", mask="/24", gateway="10.0.0.254", port=1
+    ))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+    repository.update_run_device_status(db, run.id, device.id, "RUNNING")
+
+    with patch("backend.core.services.run_events.AsyncSessionLocal", async_session_factory):
+        stream = stream_run_events(run.id, poll_interval=0.01)
+        assert await stream.__anext__() == "retry: 2000\n\n"
+        assert [e[0] for e in parse_sse(await stream.__anext__())] == ["run", "device"]
+
+        repository.update_run_device_status(db, run.id, device.id, "FAILED", error_message="Timeout on conf t", error_code="SERIAL_TIMEOUT")
+        events = parse_sse(await stream.__anext__())
+        assert [(e[0], e[2]["status"]) for e in events] == [("device", "FAILED")]
+
+        repository.update_run_status(db, run.id, "COMPLETED")
+        assert [e[0] for e in parse_sse(await stream.__anext__())] == ["run", "end"]
+        await stream.aclose()
+    db.close()
+
+def test_run_logs_cursor_filters_and_raw(session_factory):
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="Log Job"))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+    for i in range(6):
+        db.add(database.DBEventLog(
+            run_id=run.id, device_id=i % 2 + 1, port=i % 2 + 1, level="ERROR" if i == 4 else "INFO",
+            message=f"event {i}", raw=f"raw output {i}" if i % 3 == 0 else None,
+        ))
+    db.commit()
+    run_id = run.id
+    db.close()
+
+    page = client.get(f"/runs/{run_id}/logs", params={"limit": 4}).json()
+    assert [l["message"] for l in page] == ["event 0", "event 1", "event 2", "event 3"]
+    rest = client.get(f"/runs/{run_id}/logs", params={"since_id": page[-1]["id"]}).json()
+    assert [l["message"] for l in rest] == ["event 4", "event 5"]
+
+    assert [l["message"] for l in client.get(f"/runs/{run_id}/logs", params={"level": "error"}).json()] == ["event 4"]
+    assert [l["message"] for l in client.get(f"/runs/{run_id}/logs", params={"device_id": 2}).json()] == ["event 1", "event 3", "event 5"]
+    assert [l["message"] for l in client.get(f"/runs/{run_id}/logs", params={"port": 1, "level": ["INFO", "ERROR"]}).json()] == ["event 0", "event 2", "event 4"]
+
+    slim = client.get(f"/runs/{run_id}/logs", params={"include_raw": False}).json()
+    assert all(l["raw"] is None for l in slim)
+    assert [l["has_raw"] for l in slim] == [True, False, False, True, False, False]
+
+    response = client.get(f"/runs/{run_id}/logs/{slim[3]['id']}/raw")
+    assert response.status_code == 200
+    assert response.text == "raw output 3"
+    assert client.get(f"/runs/{run_id}/logs/{slim[1]['id']}/raw").status_code == 404
+
+def test_run_devices_listing_leaves_out_config_and_config_streams(session_factory):
+    config = "".join(f"interface GigabitEthernet1/0/{i}\n description port {i}\n" for i in range(4000))
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="Config Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1", mask="/24", gateway="10.0.0.254", port=1
+    ))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+    repository.update_run_device_status(db, run.id, device.id, "VERIFIED", tasks="[]", captured_config=config)
+    run_id, device_id = run.id, device.id
+    db.close()
+
+    # Listing queries never touch the large columns
+    db = session_factory()
+    rd = repository.get_run_devices(db, run_id)[0]
+    assert "captured_config" not in rd.__dict__ and "tasks" not in rd.__dict__
+    db.close()
+
+    listing = client.get(f"/runs/{run_id}/devices").json()
+    assert listing[0]["status"] == "VERIFIED"
+    assert "captured_config" not in listing[0]
+
+    response = client.get(f"/runs/{run_id}/devices/{device_id}/config")
+    assert response.status_code == 200
+    assert len(config) > 65536
+    assert response.text == config
+    assert client.get(f"/runs/{run_id}/devices/999/config").status_code == 404
+
+def test_report_endpoints_stream(tmp_path, monkeypatch, session_factory):
+    from backend.app.config import settings
+    monkeypatch.setattr(settings, "REPORT_CACHE_DIR", str(tmp_path))
+    run_id, _ = seed_finished_run(session_factory)
+
+    response = client.get(f"/runs/{run_id}/report.ndjson")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [l["type"] for l in lines] == ["run", "device"]
+
+    assert client.get(f"/runs/{run_id}/report.json").json()["devices"][0]["hostname"] == "sw1"
+    assert client.get(f"/runs/{run_id}/report.csv").text.startswith("hostname,mgmt_ip,port,status")
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".csv", ".json", ".ndjson"]
+    assert client.get("/runs/999/report.csv").status_code == 404
@@ -1,42 +1,19 @@
 import pytest
-from unittest.mock import MagicMock, patch
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from unittest.mock import AsyncMock, patch
 
 from backend.core.services.bootstrap_runner import BootstrapRunner
+from backend.infra.serial import PromptTimeout, RetryPolicy
 from backend.infra import repository, database
 from backend.core import models
 
-from sqlalchemy.pool import StaticPool
-
-# Setup in-memory SQLite with SHARED connection
-SQLALCHEMY_DATABASE_URL = "sqlite://"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture(autouse=True)
-def setup_db():
-    database.Base.metadata.create_all(bind=engine)
-    def override_get_db():
-        db = TestingSessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-    
-    with patch("backend.core.services.bootstrap_runner.get_db", side_effect=lambda: override_get_db()):
-        yield
-    database.Base.metadata.drop_all(bind=engine)
 
-from backend.vendors.base import CommandBlock
+pytestmark = pytest.mark.usefixtures("tables")
+
+from backend.vendors.base import CommandBlock, CommandSpec
 
 @pytest.mark.asyncio
-async def test_bootstrap_runner_success():
-    db = TestingSessionLocal()
+async def test_bootstrap_runner_success(session_factory, async_session_factory):
+    db = session_factory()
     
     # Create job and device
     job = repository.create_job(db, models.JobCreate(name="Test Job"))
@@ -47,12 +24,13 @@ async def test_bootstrap_runner_success():
     run = repository.create_run(db, models.RunCreate(job_id=job.id))
     
     # Mock SerialSession
-    mock_ser = MagicMock()
-    # 1. sync prompt, 2. conf t, 3. hostname, 4. end, 5. verify, 6. save
-    mock_ser.read_until_prompt.side_effect = ["switch>", "sw1#", "sw1#", "sw1#", "sw1#", "sw1#"] 
+    mock_ser = AsyncMock()
+    # 1. sync prompt, 2. conf t, 3. hostname, 4. end, 5. verify, 6. show run, 7. save
+    mock_ser.read_until_prompt.side_effect = ["switch>", "sw1#", "sw1#", "sw1#", "sw1#", "sw1#", "sw1#"]
     
-    with patch("backend.core.services.bootstrap_runner.SerialSession", return_value=mock_ser):
-        runner = BootstrapRunner(db, run.id, device.id)
+    with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+        async_db = async_session_factory()
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
         
         # We need to mock the vendor methods
         with patch.object(runner.vendor, "get_bootstrap_commands", return_value=[
@@ -63,6 +41,8 @@ async def test_bootstrap_runner_success():
                     with patch.object(runner.vendor, "get_save_commands", return_value=["write"]):
                         await runner.run()
 
+    await async_db.close()
+
     # Check device status
     db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
     assert db_rd.status == "VERIFIED"
@@ -74,8 +54,8 @@ async def test_bootstrap_runner_success():
     db.close()
 
 @pytest.mark.asyncio
-async def test_bootstrap_runner_cli_error():
-    db = TestingSessionLocal()
+async def test_bootstrap_runner_cli_error(session_factory, async_session_factory):
+    db = session_factory()
     
     job = repository.create_job(db, models.JobCreate(name="Test Job"))
     device = repository.create_device(db, models.DeviceCreate(
@@ -84,20 +64,430 @@ async def test_bootstrap_runner_cli_error():
     ))
     run = repository.create_run(db, models.RunCreate(job_id=job.id))
     
-    mock_ser = MagicMock()
+    mock_ser = AsyncMock()
     # First prompt OK, second one contains an error
     mock_ser.read_until_prompt.side_effect = ["switch>", "% Invalid input detected at", "sw1#"]
     
-    with patch("backend.core.services.bootstrap_runner.SerialSession", return_value=mock_ser):
-        runner = BootstrapRunner(db, run.id, device.id)
+    with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+        async_db = async_session_factory()
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
         with patch.object(runner.vendor, "get_bootstrap_commands", return_value=[
             CommandBlock(name="ErrorBlock", commands=["invalid command"], critical=True)
         ]):
             await runner.run()
 
+    await async_db.close()
+
     # Check device status
     db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
     assert db_rd.status == "FAILED"
     assert "Critical Error" in db_rd.error_message
     
     db.close()
+
+def test_batch_commands_respects_window():
+    from backend.core.services.bootstrap_runner import batch_commands
+
+    cmds = ["hostname sw1", "vlan 10", " name MANAGEMENT", "x" * 50]
+    batches = batch_commands(cmds, window=30)
+    assert batches == [["hostname sw1", "vlan 10"], [" name MANAGEMENT"], ["x" * 50]]
+
+def test_batch_commands_sends_commands_with_specs_alone():
+    from backend.core.services.bootstrap_runner import batch_commands
+
+    cmds = ["hostname sw1", "crypto key generate rsa modulus 2048", "vlan 10", "exit"]
+    batches = batch_commands(cmds, window=128, alone={"crypto key generate rsa modulus 2048"})
+    assert batches == [["hostname sw1"], ["crypto key generate rsa modulus 2048"], ["vlan 10", "exit"]]
+
+def test_split_echoed_output():
+    from backend.core.services.bootstrap_runner import split_echoed_output
+
+    output = "sw1(config)#vlan 10\r\nsw1(config-vlan)#exit\r\nsw1(config)#exit\r\nsw1#"
+    segments = split_echoed_output(output, ["vlan 10", "exit", "exit"])
+    assert segments == ["vlan 10\r\nsw1(config-vlan)#", "exit\r\nsw1(config)#", "exit\r\nsw1#"]
+
+def test_first_answer_drops_output_of_later_commands():
+    from backend.core.services.bootstrap_runner import first_answer, split_echoed_output
+
+    # "vlan 10" was lost on the line, so " name MANAGEMENT" ran in global config
+    output = "sw1(config)#hostname sw1\r\nsw1(config)# name MANAGEMENT\r\n% Invalid input detected at '^' marker.\r\nsw1(config)#"
+    segments = split_echoed_output(output, ["hostname sw1", "vlan 10", " name MANAGEMENT"])
+    assert len(segments) == 1
+    assert first_answer(segments[0]) == "hostname sw1\r\nsw1(config)#"
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_pipelined_error_reported_per_command(session_factory, async_session_factory):
+    db = session_factory()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1",
+        mask="/24", gateway="10.0.0.254", port=1, vendor="generic"
+    ))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+
+    mock_ser = AsyncMock()
+    mock_ser.read_until_prompt.side_effect = [
+        "switch>",
+        # The whole batch comes back in two reads
+        "hostname sw1\r\nsw1(config)#",
+        "bogus command\r\n% Invalid input detected at '^' marker.\r\n"
+        "sw1(config)#ip default-gateway 10.0.0.254\r\nsw1(config)#",
+    ] + ["sw1#"] * 5
+
+    with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+        async_db = async_session_factory()
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
+        with patch.object(runner.vendor, "get_bootstrap_commands", return_value=[
+            CommandBlock(name="Pipelined", commands=["hostname sw1", "bogus command", "ip default-gateway 10.0.0.254"], critical=False, pipeline=True)
+        ]):
+            await runner.run()
+
+    await async_db.close()
+
+    # One write for the whole batch
+    mock_ser.send_line.assert_any_call("hostname sw1\nbogus command\nip default-gateway 10.0.0.254")
+
+    logs = db.query(database.DBEventLog).filter_by(run_id=run.id, level="ERROR").all()
+    assert [(log.message, log.raw) for log in logs][0] == (
+        "Command failed: bogus command", "bogus command\r\n% Invalid input detected at '^' marker.\r\nsw1(config)#"
+    )
+
+    db.close()
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_never_pipelines_critical_blocks(run_with_console):
+    def answer(line):
+        if line == "bogus command":
+            return "bogus command\r\n% Invalid input detected at '^' marker.\r\nsw1(config)#"
+        return "sw1(config)#"
+
+    block = CommandBlock(name="Apply", commands=["hostname sw1", "bogus command", "ip default-gateway 10.0.0.254"], pipeline=True)
+    mock_ser, db_rd, _ = await run_with_console([block], answer)
+
+    assert db_rd.error_message == "Critical Error in Apply: bogus command"
+    # One command at a time, and nothing after the failed one
+    assert [c.args[0] for c in mock_ser.send_line.call_args_list] == ["", "hostname sw1", "bogus command"]
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_executes_stored_plan(session_factory, async_session_factory):
+    from backend.core.config_plan import ConfigPlan, plan_hash
+    db = session_factory()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1",
+        mask="/24", gateway="10.0.0.254", port=1, vendor="generic"
+    ))
+    blocks = [CommandBlock(name="Planned", commands=["hostname sw1"])]
+    plan = ConfigPlan(vendor="generic", params={"hostname": "sw1", "mgmt_ip": "10.0.0.1"}, blocks=blocks)
+    run = repository.create_run(db, models.RunCreate(job_id=job.id), [
+        {"device_id": device.id, "status": "PENDING", "template_hash": plan.hash, "plan": plan.model_dump_json()}
+    ])
+    # Edited after the run was created: the plan is what gets sent
+    repository.update_device(db, device.id, models.DeviceUpdate(hostname="sw-edited"))
+
+    mock_ser = AsyncMock()
+    mock_ser.read_until_prompt.return_value = "sw1#"
+
+    with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+        async_db = async_session_factory()
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
+        with patch.object(runner.vendor, "get_bootstrap_commands", side_effect=AssertionError("rendered again")):
+            with patch.object(runner.vendor, "parse_verify", return_value={"success": True, "details": "Matches"}) as parse_verify:
+                await runner.run()
+    await async_db.close()
+
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    assert "hostname sw1" in sent
+    assert parse_verify.call_args.args[1]["hostname"] == "sw1"
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+    assert db_rd.status == "VERIFIED"
+    assert db_rd.template_hash == plan_hash(blocks)
+    db.close()
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_fails_unrenderable_plan_without_connecting(session_factory, async_session_factory):
+    db = session_factory()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1",
+        mask="/24", gateway="10.0.0.254", port=1
+    ))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id), [
+        {"device_id": device.id, "status": "PENDING", "error_message": "Template rendering failed: boom", "error_code": "TEMPLATE_ERROR"}
+    ])
+
+    with patch("backend.core.services.bootstrap_runner.AsyncSerialSession") as serial:
+        async_db = async_session_factory()
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
+        await runner.run()
+    await async_db.close()
+
+    serial.assert_not_called()
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+    assert db_rd.status == "FAILED"
+    assert db_rd.error_code == "TEMPLATE_ERROR"
+    assert db_rd.error_message == "Template rendering failed: boom"
+    db.close()
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_resumes_after_last_completed_block(session_factory, async_session_factory):
+    from backend.core import config_plan
+    from backend.core.config_plan import ConfigPlan
+    db = session_factory()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1",
+        mask="/24", gateway="10.0.0.254", port=1, vendor="generic"
+    ))
+    blocks = [
+        CommandBlock(name="Enter", commands=["conf t"], replay=True),
+        CommandBlock(name="Keys", commands=["crypto key generate rsa modulus 2048"]),
+        CommandBlock(name="Finish", commands=["end"]),
+    ]
+    plan = ConfigPlan(vendor="generic", params={"hostname": "sw1", "mgmt_ip": "10.0.0.1"}, blocks=blocks)
+    run = repository.create_run(db, models.RunCreate(job_id=job.id), [
+        {"device_id": device.id, "status": "PENDING", "template_hash": plan.hash, "plan": plan.model_dump_json()}
+    ])
+
+    async def attempt(run_id, fail_on=None):
+        mock_ser = AsyncMock()
+        async def read_until_prompt(*args, **kwargs):
+            if fail_on and mock_ser.send_line.call_args.args[0] == fail_on:
+                raise TimeoutError()
+            return "sw1#"
+        mock_ser.read_until_prompt.side_effect = read_until_prompt
+        with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+            async with async_session_factory() as async_db:
+                runner = await BootstrapRunner.load(async_db, run_id, device.id)
+                runner.retry_policy = RetryPolicy(retries=0)
+                with patch.object(runner.vendor, "parse_verify", return_value={"success": True, "details": "Matches"}):
+                    await runner.run()
+        return [c.args[0] for c in mock_ser.send_line.call_args_list]
+
+    # Times out in the last block; the first two are checkpointed
+    await attempt(run.id, fail_on="end")
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+    assert (db_rd.status, db_rd.blocks_completed) == ("FAILED", 2)
+
+    sources = repository.get_unverified_run_devices(db, run.id)
+    resumed = repository.create_run(db, models.RunCreate(job_id=job.id, mode="resume", resumed_from=run.id),
+                                    await config_plan.resume_run_devices(sources, {device.id: device}))
+    sent = await attempt(resumed.id)
+
+    # Setup replayed, the key not generated again, verify at the end
+    assert "conf t" in sent
+    assert "crypto key generate rsa modulus 2048" not in sent
+    assert sent.index("end") < sent.index("show ip interface brief")
+    db.expire_all()
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=resumed.id, device_id=device.id).first()
+    assert (db_rd.status, db_rd.blocks_completed) == ("VERIFIED", 3)
+    assert db_rd.template_hash == plan.hash
+    db.close()
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_resume_with_all_blocks_completed_leaves_config_mode(session_factory, async_session_factory):
+    from backend.core.config_plan import ConfigPlan
+    db = session_factory()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1",
+        mask="/24", gateway="10.0.0.254", port=1, vendor="generic"
+    ))
+    blocks = [
+        CommandBlock(name="Enter", commands=["conf t"], replay=True),
+        CommandBlock(name="Apply", commands=["hostname sw1"]),
+        CommandBlock(name="Finish", commands=["end"]),
+    ]
+    plan = ConfigPlan(vendor="generic", params={"hostname": "sw1", "mgmt_ip": "10.0.0.1"}, blocks=blocks)
+    # Failed after its last block, e.g. in verify or write memory
+    run = repository.create_run(db, models.RunCreate(job_id=job.id, mode="resume"), [
+        {"device_id": device.id, "status": "PENDING", "template_hash": plan.hash, "plan": plan.model_dump_json(), "blocks_completed": 3}
+    ])
+
+    mock_ser = AsyncMock()
+    mock_ser.read_until_prompt.return_value = "sw1#"
+    with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+        async with async_session_factory() as async_db:
+            runner = await BootstrapRunner.load(async_db, run.id, device.id)
+            with patch.object(runner.vendor, "get_resync_commands", return_value=["end"]), \
+                    patch.object(runner.vendor, "parse_verify", return_value={"success": True, "details": "Matches"}):
+                await runner.run()
+
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    # "Finish" is skipped, so the replayed "conf t" is left before verifying
+    assert "hostname sw1" not in sent
+    assert sent.index("conf t") < len(sent) - 1 - sent[::-1].index("end") < sent.index("show ip interface brief")
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+    assert db_rd.status == "VERIFIED"
+    db.close()
+
+@pytest.fixture
+def run_with_console(session_factory, async_session_factory):
+    """Runs a device with the given plan against a console answering each sent line with answer(line)."""
+    async def run_device(blocks, answer, resync_prompt="sw1#", retries=2, vendor="generic"):
+        from backend.core.config_plan import ConfigPlan
+        db = session_factory()
+        job = repository.create_job(db, models.JobCreate(name="Test Job"))
+        device = repository.create_device(db, models.DeviceCreate(
+            job_id=job.id, hostname="sw1", mgmt_ip="10.0.0.1",
+            mask="/24", gateway="10.0.0.254", port=1, vendor=vendor
+        ))
+        plan = ConfigPlan(vendor=vendor, params={"hostname": "sw1", "mgmt_ip": "10.0.0.1"}, blocks=blocks)
+        run = repository.create_run(db, models.RunCreate(job_id=job.id), [
+            {"device_id": device.id, "status": "PENDING", "template_hash": plan.hash, "plan": plan.model_dump_json()}
+        ])
+
+        mock_ser = AsyncMock()
+        async def read_until_prompt(*args, **kwargs):
+            return answer(mock_ser.send_line.call_args.args[0])
+        mock_ser.read_until_prompt.side_effect = read_until_prompt
+        mock_ser.resync.return_value = resync_prompt
+
+        with patch("backend.core.services.bootstrap_runner.AsyncSerialSession", return_value=mock_ser):
+            async with async_session_factory() as async_db:
+                runner = await BootstrapRunner.load(async_db, run.id, device.id)
+                runner.retry_policy = RetryPolicy(retries=retries, backoff=0)
+                with patch.object(runner.vendor, "parse_verify", return_value={"success": True, "details": "Matches"}):
+                    await runner.run()
+
+        db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+        logs = [(log.level, log.message) for log in db.query(database.DBEventLog).filter_by(run_id=run.id).order_by(database.DBEventLog.id)]
+        db.close()
+        return mock_ser, db_rd, logs
+    return run_device
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_retries_command_after_reconnect(run_with_console):
+    timeouts = ["hostname sw1"]
+    def answer(line):
+        if line in timeouts:
+            timeouts.remove(line)
+            raise PromptTimeout("hostname s", 10)
+        return "sw1#"
+
+    mock_ser, db_rd, logs = await run_with_console([CommandBlock(name="Apply", commands=["hostname sw1"])], answer)
+
+    assert db_rd.status == "VERIFIED"
+    mock_ser.reconnect.assert_awaited_once()
+    mock_ser.resync.assert_awaited_once()
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    assert sent.count("hostname sw1") == 2
+    assert any(level == "WARNING" and "retry 1/2" in message for level, message in logs)
+    assert ("INFO", "Prompt re-synced in enable mode") in logs
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_restores_config_mode_before_retrying(run_with_console):
+    timeouts = ["hostname sw1"]
+    def answer(line):
+        if line in timeouts:
+            timeouts.remove(line)
+            raise PromptTimeout("", 10)
+        return "sw1(config)#" if line in ("conf t", "hostname sw1") else "sw1#"
+
+    blocks = [
+        CommandBlock(name="Enter", commands=["conf t"], replay=True),
+        CommandBlock(name="Apply", commands=["hostname sw1"]),
+    ]
+    # The console dropped back to the enable prompt while disconnected
+    mock_ser, db_rd, logs = await run_with_console(blocks, answer, resync_prompt="sw1#")
+
+    assert db_rd.status == "VERIFIED"
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    assert sent[:4] == ["", "conf t", "hostname sw1", "conf t"]
+    assert sent[4] == "hostname sw1"
+    assert any("instead of config, replaying Enter" in message for _, message in logs)
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_fails_once_retries_are_used_up(run_with_console):
+    def answer(line):
+        if line == "hostname sw1":
+            raise PromptTimeout("", 10)
+        return "sw1#"
+
+    mock_ser, db_rd, logs = await run_with_console([CommandBlock(name="Apply", commands=["hostname sw1"])], answer, retries=1)
+
+    assert (db_rd.status, db_rd.error_code) == ("FAILED", "SERIAL_TIMEOUT")
+    assert mock_ser.reconnect.await_count == 1
+    assert [c.args[0] for c in mock_ser.send_line.call_args_list].count("hostname sw1") == 2
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_enforces_command_specs(run_with_console):
+    keygen = "crypto key generate rsa modulus 2048"
+    def answer(line):
+        if line == keygen:
+            return "% Do you really want to replace them? [yes/no]: "
+        return "sw1(config)#" if line in ("yes", "hostname sw1") else "sw1#"
+
+    block = CommandBlock(
+        name="Apply", commands=["hostname sw1", keygen], timeout=5,
+        specs={keygen: CommandSpec(timeout=120, answers={r"\[yes/no\]:": "yes"})},
+    )
+    mock_ser, db_rd, logs = await run_with_console([block], answer)
+
+    assert db_rd.status == "VERIFIED"
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    assert sent[1:4] == ["hostname sw1", keygen, "yes"]
+    reads = [c.args for c in mock_ser.read_until_prompt.call_args_list]
+    # The one-line command fails fast, key generation waits long and takes its question as a prompt
+    assert reads[1] == ("[#>]", 5)
+    assert reads[2] == ("[#>]|\\[yes/no\\]:", 120)
+    assert reads[3] == ("[#>]", 120)
+    assert ("INFO", "Answering 'yes' to: % Do you really want to replace them? [yes/no]:") in logs
+
+INTERFACE_BLOCKS = [
+    CommandBlock(name="Enter", commands=["conf t"], replay=True),
+    CommandBlock(name="Apply", commands=[
+        "interface Vlan10", " ip address 10.0.0.1 255.255.255.0", "exit", "ip default-gateway 10.0.0.254"
+    ]),
+]
+
+def interface_console(timeouts):
+    """A console for INTERFACE_BLOCKS whose answers to the lines in timeouts are lost once."""
+    def answer(line):
+        if line in timeouts:
+            timeouts.remove(line)
+            raise PromptTimeout("", 10)
+        if line in ("interface Vlan10", " ip address 10.0.0.1 255.255.255.0"):
+            return "sw1(config-if)#"
+        return "sw1(config)#" if line in ("conf t", "exit", "ip default-gateway 10.0.0.254") else "sw1#"
+    return answer
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_does_not_resend_command_that_went_through(run_with_console):
+    # "exit" was run, only its answer got lost: the console is back at (config)#
+    mock_ser, db_rd, logs = await run_with_console(
+        INTERFACE_BLOCKS, interface_console(["exit"]), resync_prompt="sw1(config)#", vendor="cisco"
+    )
+
+    assert db_rd.status == "VERIFIED"
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    assert sent.count("exit") == 1
+    assert ("INFO", "'exit' went through before the connection was lost, not sending it again") in logs
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_resends_command_that_did_not_arrive(run_with_console):
+    # Still in the interface: the same "exit" never reached the switch
+    mock_ser, db_rd, _ = await run_with_console(
+        INTERFACE_BLOCKS, interface_console(["exit"]), resync_prompt="sw1(config-if)#", vendor="cisco"
+    )
+
+    assert db_rd.status == "VERIFIED"
+    assert [c.args[0] for c in mock_ser.send_line.call_args_list].count("exit") == 2
+
+@pytest.mark.asyncio
+async def test_bootstrap_runner_fails_when_submode_is_lost(run_with_console):
+    # Back at the exec prompt, replaying "conf t" would send the address to global config
+    mock_ser, db_rd, _ = await run_with_console(
+        INTERFACE_BLOCKS, interface_console([" ip address 10.0.0.1 255.255.255.0"]), resync_prompt="sw1>", vendor="cisco"
+    )
+
+    assert db_rd.status == "FAILED"
+    assert "cannot restore the submode" in db_rd.error_message
+    sent = [c.args[0] for c in mock_ser.send_line.call_args_list]
+    assert sent.count(" ip address 10.0.0.1 255.255.255.0") == 1
+    assert "exit" not in sent
@@ -57,3 +57,42 @@ def test_csv_import_missing_fields():
     
     db.close()
     Base.metadata.drop_all(bind=engine)
+
+def test_csv_import_all_or_nothing_rolls_back():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    csv_content = """port,hostname,mgmt_ip,mask,gateway,mgmt_vlan,model
+1,Switch1,10.0.0.1,255.255.255.0,10.0.0.254,10,C3750
+2,,10.0.0.2,255.255.255.0,10.0.0.254,10,C3750
+3,Switch3,10.0.0.3,255.255.255.0,10.0.0.254,10,C3750
+"""
+    success_count, errors = services.import_devices_from_csv(db, job.id, csv_content, mode="all_or_nothing", batch_size=1)
+
+    assert success_count == 0
+    assert errors == ["Line 2: Missing required fields: hostname"]
+    assert repository.get_devices_by_job(db, job.id) == []
+
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_csv_import_streams_lines_in_batches():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+
+    job = repository.create_job(db, models.JobCreate(name="Test Job"))
+    lines = ["port,hostname,mgmt_ip,mask,gateway,mgmt_vlan,model\n"]
+    lines += [f"{i % 16 + 1},Switch{i},10.0.{i // 256}.{i % 256},255.255.0.0,10.0.0.254,10,C3750\n" for i in range(25)]
+    # Port out of range: rejected by the model, reported with its line number
+    lines.append("17,Switch99,10.0.9.9,255.255.0.0,10.0.0.254,10,C3750\n")
+
+    success_count, errors = services.import_devices_from_csv(db, job.id, iter(lines), batch_size=10)
+
+    assert success_count == 25
+    assert len(errors) == 1 and errors[0].startswith("Line 26: Error processing")
+    devices = repository.get_devices_by_job(db, job.id)
+    assert [d.hostname for d in devices] == [f"Switch{i}" for i in range(25)]
+
+    db.close()
+    Base.metadata.drop_all(bind=engine)
@@ -0,0 +1,104 @@
+from sqlalchemy import create_engine, text
+
+from backend.app.config import settings
+from backend.infra import database
+
+def test_sqlite_pragmas_applied(tmp_path):
+    engine = database.configure_sqlite(create_engine(
+        f"sqlite:///{tmp_path / 'tuned.db'}", connect_args={"check_same_thread": False}
+    ))
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == settings.SQLITE_JOURNAL_MODE.lower()
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -settings.SQLITE_CACHE_SIZE_KB
+        # NORMAL
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+    engine.dispose()
+
+def test_init_db_adds_indexes_to_existing_database(tmp_path):
+    from sqlalchemy import inspect
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    # Simulate a database created before the indexes existed
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_run_devices_run_id_device_id"))
+        conn.execute(text("DROP INDEX ix_event_logs_run_id_id"))
+        conn.execute(text("DROP INDEX ix_devices_job_id"))
+
+    database.init_db(engine)
+
+    inspector = inspect(engine)
+    run_device_indexes = {i["name"]: i for i in inspector.get_indexes("run_devices")}
+    assert run_device_indexes["ix_run_devices_run_id_device_id"]["unique"]
+    assert "ix_event_logs_run_id_id" in {i["name"] for i in inspector.get_indexes("event_logs")}
+    assert "ix_devices_job_id" in {i["name"] for i in inspector.get_indexes("devices")}
+    engine.dispose()
+
+def test_init_db_drops_duplicates_before_adding_unique_index(tmp_path):
+    from sqlalchemy import inspect
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'dupes.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    # A database from before the unique index, with a device planned twice in run 1
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_run_devices_run_id_device_id"))
+        conn.execute(text(
+            "INSERT INTO run_devices (id, run_id, device_id, status) VALUES "
+            "(1, 1, 1, 'FAILED'), (2, 1, 2, 'VERIFIED'), (3, 1, 1, 'VERIFIED'), (4, 2, 1, 'PENDING')"
+        ))
+
+    database.init_db(engine)
+
+    indexes = {i["name"]: i for i in inspect(engine).get_indexes("run_devices")}
+    assert indexes["ix_run_devices_run_id_device_id"]["unique"]
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, run_id, device_id, status FROM run_devices ORDER BY id")).all()
+    # The latest row of each (run_id, device_id) stays
+    assert [tuple(r) for r in rows] == [(2, 1, 2, "VERIFIED"), (3, 1, 1, "VERIFIED"), (4, 2, 1, "PENDING")]
+    engine.dispose()
+
+def test_config_store_dedupes_and_streams(tmp_path):
+    from sqlalchemy.orm import sessionmaker
+    from backend.infra import config_store
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'configs.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    config = "".join(f"interface GigabitEthernet1/0/{i}\n description café {i}\n" for i in range(5000))
+
+    first = config_store.store_config(db, config)
+    second = config_store.store_config(db, config)
+    db.commit()
+
+    assert first == second == config_store.config_hash(config)
+    blob = db.query(database.DBConfigBlob).one()
+    assert blob.size == len(config.encode("utf-8"))
+    assert len(blob.data) < blob.size / 5
+    assert config_store.load_config(db, first) == config
+    # Small chunks split multi-byte characters; the incremental decoder joins them again
+    assert "".join(config_store.iter_config(db, first, chunk_size=7)) == config
+    db.close()
+    engine.dispose()
+
+def test_init_db_moves_plain_text_configs_to_blob_store(tmp_path):
+    from sqlalchemy.orm import sessionmaker
+    from backend.infra import repository
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    # Rows written before the blob store existed
+    with engine.begin() as conn:
+        for device_id, config in ((1, "hostname sw1\n"), (2, "hostname sw1\n"), (3, "hostname sw3\n"), (4, None)):
+            conn.execute(text("INSERT INTO run_devices (run_id, device_id, status, captured_config) VALUES (1, :d, 'VERIFIED', :c)"), {"d": device_id, "c": config})
+
+    database.init_db(engine)
+
+    db = sessionmaker(bind=engine)()
+    assert db.query(database.DBRunDevice).filter(database.DBRunDevice.captured_config.isnot(None)).count() == 0
+    assert db.query(database.DBConfigBlob).count() == 2
+    assert repository.get_run_device_config(db, 1, 2) == "hostname sw1\n"
+    assert repository.get_run_device_config(db, 1, 3) == "hostname sw3\n"
+    assert repository.get_run_device_config(db, 1, 4) is None
+    db.close()
+    engine.dispose()
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from backend.core.services.event_sink import EventLogSink
+from backend.infra import database
+
+
+@pytest_asyncio.fixture
+async def async_db(db, async_session_factory):
+    async with async_session_factory() as session:
+        yield session
+
+def emit(sink, device_id, message):
+    sink.emit(run_id=1, device_id=device_id, port=device_id, level="INFO",
+              message=message, raw=None, error_code=None, ts=datetime.now(timezone.utc))
+
+@pytest.mark.asyncio
+async def test_sink_batches_and_keeps_device_order(db, async_db):
+    sink = EventLogSink(async_db, max_batch=50, flush_interval=10).start()
+    with patch.object(sink, "_write", wraps=sink._write) as write:
+        for i in range(120):
+            emit(sink, device_id=i % 3 + 1, message=f"step {i}")
+        await sink.close()
+
+    batch_sizes = [len(c.args[0]) for c in write.call_args_list if c.args[0]]
+    assert batch_sizes == [50, 50, 20]
+
+    logs = db.query(database.DBEventLog).order_by(database.DBEventLog.id).all()
+    assert len(logs) == 120
+    for device_id in (1, 2, 3):
+        steps = [int(l.message.split()[1]) for l in logs if l.device_id == device_id]
+        assert steps == sorted(steps)
+
+@pytest.mark.asyncio
+async def test_sink_flushes_on_interval(db, async_db):
+    sink = EventLogSink(async_db, max_batch=100, flush_interval=0.05).start()
+    try:
+        emit(sink, device_id=1, message="connected")
+        await asyncio.sleep(0.2)
+        assert db.query(database.DBEventLog).count() == 1
+    finally:
+        await sink.close()
@@ -0,0 +1,215 @@
+import pytest
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+from sqlalchemy.exc import OperationalError
+
+from backend.app.executor import RunExecutor
+from backend.infra import repository, database
+from backend.core import models
+
+
+@pytest.fixture(autouse=True)
+def setup_db(tables, async_session_factory):
+    with patch("backend.app.executor.AsyncSessionLocal", async_session_factory), \
+         patch("backend.core.services.scheduler.AsyncSessionLocal", async_session_factory):
+        yield
+
+def queue_runs(db, count):
+    job = repository.create_job(db, models.JobCreate(name="Queue Job"))
+    return [repository.create_run(db, models.RunCreate(job_id=job.id), status="queued").id for _ in range(count)]
+
+def expire_lease(db, run_id):
+    db.query(database.DBRun).filter_by(id=run_id).update({"lease_expires_at": repository._utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+def test_claim_takes_each_run_once(session_factory):
+    db = session_factory()
+    first, second = queue_runs(db, 2)
+
+    assert repository.claim_next_run(db, "a", 30, 3) == first
+    assert repository.claim_next_run(db, "b", 30, 3) == second
+    assert repository.claim_next_run(db, "c", 30, 3) is None
+
+    run = repository.get_run(db, first)
+    assert (run.status, run.lease_owner, run.attempts) == ("running", "a", 1)
+    assert repository.renew_run_lease(db, first, "a", 30)
+    assert not repository.renew_run_lease(db, first, "b", 30)
+
+    repository.update_run_status(db, first, "COMPLETED")
+    assert not repository.renew_run_lease(db, first, "a", 30)
+    assert repository.get_run(db, first).lease_owner is None
+    db.close()
+
+def test_expired_lease_is_taken_over_until_max_attempts(session_factory):
+    db = session_factory()
+    (run_id,) = queue_runs(db, 1)
+
+    assert repository.claim_next_run(db, "a", 30, 2) == run_id
+    expire_lease(db, run_id)
+    assert repository.claim_next_run(db, "b", 30, 2) == run_id
+    assert not repository.renew_run_lease(db, run_id, "a", 30)
+
+    expire_lease(db, run_id)
+    assert repository.claim_next_run(db, "c", 30, 2) is None
+    db.expire_all()
+    run = repository.get_run(db, run_id)
+    assert run.status == "FAILED" and run.finished_at is not None
+    db.close()
+
+def test_legacy_running_runs_are_not_claimed(session_factory):
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="Old Job"))
+    repository.create_run(db, models.RunCreate(job_id=job.id))
+    assert repository.claim_next_run(db, "a", 30, 3) is None
+    db.close()
+
+@pytest.mark.asyncio
+async def test_executor_runs_queued_runs(session_factory):
+    db = session_factory()
+    run_ids = queue_runs(db, 2)
+    db.close()
+
+    executor = RunExecutor(owner="test", poll_interval=0.05, lease_seconds=5)
+    task = asyncio.create_task(executor.run_forever())
+    for _ in range(100):
+        db = session_factory()
+        statuses = [repository.get_run(db, run_id).status for run_id in run_ids]
+        db.close()
+        if statuses == ["COMPLETED", "COMPLETED"]:
+            break
+        await asyncio.sleep(0.05)
+    executor.stop()
+    await task
+
+    # Jobs without devices complete right away
+    assert statuses == ["COMPLETED", "COMPLETED"]
+
+@pytest.mark.asyncio
+async def test_executor_shutdown_requeues_run_in_progress(session_factory):
+    db = session_factory()
+    (run_id,) = queue_runs(db, 1)
+    db.close()
+
+    started = asyncio.Event()
+    async def never_finishes(self):
+        started.set()
+        await asyncio.sleep(3600)
+
+    with patch("backend.app.executor.RunManager.execute_run", never_finishes):
+        executor = RunExecutor(owner="test", poll_interval=0.05, lease_seconds=5)
+        task = asyncio.create_task(executor.run_forever())
+        await asyncio.wait_for(started.wait(), 5)
+        executor.stop()
+        await task
+
+    db = session_factory()
+    run = repository.get_run(db, run_id)
+    assert (run.status, run.lease_owner) == ("queued", None)
+    db.close()
+
+@pytest.mark.asyncio
+async def test_executor_stops_run_after_losing_lease(session_factory):
+    db = session_factory()
+    (run_id,) = queue_runs(db, 1)
+    db.close()
+
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+    async def never_finishes(self):
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch("backend.app.executor.RunManager.execute_run", never_finishes):
+        executor = RunExecutor(owner="test", poll_interval=0.05, lease_seconds=0.3)
+        task = asyncio.create_task(executor.run_forever())
+        await asyncio.wait_for(started.wait(), 5)
+        # Another executor took the run over
+        db = session_factory()
+        db.query(database.DBRun).filter_by(id=run_id).update({"lease_owner": "other"})
+        db.commit()
+        db.close()
+        await asyncio.wait_for(cancelled.wait(), 5)
+        executor.stop()
+        await task
+
+    db = session_factory()
+    assert repository.get_run(db, run_id).lease_owner == "other"
+    db.close()
+
+def database_locked():
+    return OperationalError("UPDATE runs", {}, Exception("database is locked"))
+
+@pytest.mark.asyncio
+async def test_executor_keeps_run_when_one_lease_renewal_fails(session_factory):
+    db = session_factory()
+    (run_id,) = queue_runs(db, 1)
+    db.close()
+
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+    async def never_finishes(self):
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    renew = repository.renew_run_lease_async
+    calls = []
+    async def locked_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise database_locked()
+        return await renew(*args)
+
+    with patch("backend.app.executor.RunManager.execute_run", never_finishes), \
+         patch("backend.app.executor.repository.renew_run_lease_async", locked_once):
+        executor = RunExecutor(owner="test", poll_interval=0.05, lease_seconds=0.3)
+        task = asyncio.create_task(executor.run_forever())
+        await asyncio.wait_for(started.wait(), 5)
+        # Several lease periods: the heartbeat survived the error and kept renewing
+        await asyncio.sleep(1)
+        assert not cancelled.is_set()
+        assert len(calls) > 3
+        executor.stop()
+        await task
+
+    db = session_factory()
+    run = repository.get_run(db, run_id)
+    assert (run.status, run.lease_owner) == ("queued", None)
+    db.close()
+
+@pytest.mark.asyncio
+async def test_executor_stops_run_when_lease_renewals_keep_failing(session_factory):
+    db = session_factory()
+    queue_runs(db, 1)
+    db.close()
+
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+    async def never_finishes(self):
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def always_locked(*args):
+        raise database_locked()
+
+    with patch("backend.app.executor.RunManager.execute_run", never_finishes), \
+         patch("backend.app.executor.repository.renew_run_lease_async", always_locked):
+        executor = RunExecutor(owner="test", poll_interval=0.05, lease_seconds=0.3)
+        task = asyncio.create_task(executor.run_forever())
+        await asyncio.wait_for(started.wait(), 5)
+        # Stopped rather than left running once another executor could claim the run
+        await asyncio.wait_for(cancelled.wait(), 5)
+        executor.stop()
+        await task
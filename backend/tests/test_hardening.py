@@ -36,3 +36,17 @@ def test_passcode_protection():
 def test_root_public():
     response = client.get("/")
     assert response.status_code == 200
+
+def test_event_stream_accepts_passcode_query():
+    original_passcode = settings.API_PASSCODE
+    settings.API_PASSCODE = "secret123"
+
+    # Only the middleware matters here, not what the route does with the database
+    lenient_client = TestClient(app, raise_server_exceptions=False)
+    try:
+        # Only the event stream reads the query parameter; EventSource cannot send headers
+        assert lenient_client.get("/runs/999999/events?passcode=wrong").status_code == 403
+        assert lenient_client.get("/runs/999999/events?passcode=secret123").status_code != 403
+        assert lenient_client.get("/jobs?passcode=secret123").status_code == 403
+    finally:
+        settings.API_PASSCODE = original_passcode
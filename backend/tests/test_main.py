@@ -13,3 +13,4 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
     assert "version" in response.json()
+    assert response.json()["validation_cache"]["max_entries"] > 0
@@ -56,3 +56,61 @@ async def test_validate_vlan_range():
     )
     errors = await policy.validate_device_config(device, [device])
     assert any(e.field == "mgmt_vlan" and "Must be between" in e.message for e in errors)
+
+@pytest.mark.asyncio
+async def test_validate_job_matches_per_device():
+    devices = [
+        models.Device(id=1, job_id=1, hostname="sw1", mgmt_ip="10.0.0.1", mask="/24", gateway="10.0.0.254", port=1),
+        models.Device(id=2, job_id=1, hostname="sw 2", mgmt_ip="10.0.0.1", mask="24", gateway="10.0.1.254", port=1),
+        models.Device(id=3, job_id=1, hostname="sw3", mgmt_ip="10.0.0.999", mask="255.255.0.255", gateway="bad", port=2),
+        models.Device(id=4, job_id=1, hostname="sw4", mgmt_ip="10.0.0.1", mask="255.255.255.0", gateway="10.0.0.254", port=1, mgmt_vlan=0),
+        models.Device(id=5, job_id=1, hostname="sw5", mgmt_ip="10.0.0.5", mask="/24", gateway="gw", vendor="cisco"),
+    ]
+    expected = []
+    for device in devices:
+        expected.extend(await policy.validate_device_config(device, devices))
+
+    errors = await policy.validate_job(devices)
+    assert [e.model_dump() for e in errors] == [e.model_dump() for e in expected]
+    # Every device reports the first other device with its IP
+    assert [e.suggestion for e in errors if e.field == "mgmt_ip" and "Duplicate" in e.message] == [
+        "Conflict with device ID 2.", "Conflict with device ID 1.", "Conflict with device ID 1."
+    ]
+
+@pytest.mark.asyncio
+async def test_validate_job_cache_revalidates_only_changes():
+    cache = policy.ValidationCache()
+    devices = [
+        models.Device(id=i, job_id=1, hostname=f"sw{i}", mgmt_ip=f"10.0.0.{i}", mask="/24", gateway="10.0.0.254", port=i)
+        for i in range(1, 5)
+    ]
+    assert await policy.validate_job(devices, cache=cache) == []
+    assert cache.stats()["misses"] == 4
+
+    # Same job again: nothing is re-checked
+    assert await policy.validate_job(devices, cache=cache) == []
+    assert cache.stats()["hits"] == 4
+
+    # Editing one device re-checks it alone, but its new duplicate shows up on both sides
+    devices[3] = devices[3].model_copy(update={"mgmt_ip": "10.0.0.1", "hostname": "sw 4"})
+    errors = await policy.validate_job(devices, cache=cache)
+    assert cache.stats()["misses"] == 5
+    expected = []
+    for device in devices:
+        expected.extend(await policy.validate_device_config(device, devices))
+    assert [e.model_dump() for e in errors] == [e.model_dump() for e in expected]
+    assert {(e.device_id, e.field) for e in errors} == {(1, "mgmt_ip"), (4, "hostname"), (4, "mgmt_ip")}
+
+@pytest.mark.asyncio
+async def test_validate_job_cache_follows_template_version(monkeypatch):
+    from backend.vendors.base import BaseVendor
+    cache = policy.ValidationCache()
+    devices = [models.Device(id=1, job_id=1, hostname="sw1", mgmt_ip="10.0.0.1", mask="/24", gateway="10.0.0.254")]
+
+    await policy.validate_job(devices, cache=cache)
+    await policy.validate_job(devices, cache=cache)
+    assert cache.stats()["hits"] == 1
+
+    monkeypatch.setattr(BaseVendor, "template_version", lambda self: "edited")
+    await policy.validate_job(devices, cache=cache)
+    assert cache.stats()["misses"] == 2
@@ -1,43 +1,34 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 
 from backend.app.main import app
 from backend.infra import database, repository
 from backend.core import models
 
-# Setup in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite://"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @pytest.fixture
-def client():
-    database.Base.metadata.create_all(bind=engine)
-    
+def client(tables, session_factory, async_session_factory):
     def override_get_db():
-        db = TestingSessionLocal()
+        db = session_factory()
         try:
             yield db
         finally:
             db.close()
     
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
     app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[database.get_async_db] = override_get_async_db
     with TestClient(app) as c:
         yield c
     
     app.dependency_overrides.clear()
-    database.Base.metadata.drop_all(bind=engine)
 
-def test_get_preview_endpoint(client):
+def test_get_preview_endpoint(client, session_factory):
     # Setup: Create a job and device
-    db = TestingSessionLocal()
+    db = session_factory()
     job = repository.create_job(db, models.JobCreate(name="Preview Job"))
     device = repository.create_device(db, models.DeviceCreate(
         job_id=job.id, hostname="sw-preview", mgmt_ip="1.1.1.1", 
@@ -56,8 +47,8 @@ def test_get_preview_endpoint(client):
     assert "conf t" in data["commands"]
     assert len(data["hash"]) == 12
 
-def test_bulk_preview_endpoint(client):
-    db = TestingSessionLocal()
+def test_bulk_preview_endpoint(client, session_factory):
+    db = session_factory()
     job = repository.create_job(db, models.JobCreate(name="Bulk Preview"))
     repository.create_device(db, models.DeviceCreate(
         job_id=job.id, hostname="sw1", mgmt_ip="1.1.1.1", mask="/24", gateway="1.1.1.254"
@@ -74,3 +65,39 @@ def test_bulk_preview_endpoint(client):
     assert len(data) == 2
     assert data[0]["hostname"] == "sw1"
     assert data[1]["hostname"] == "sw2"
+
+def test_bulk_preview_etag_and_cache(client, session_factory):
+    from backend.core.services import preview_service
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="ETag Preview"))
+    devices = [
+        repository.create_device(db, models.DeviceCreate(
+            job_id=job.id, hostname=f"sw{i}", mgmt_ip=f"1.1.1.{i}", mask="/24", gateway="1.1.1.254", vendor="cisco" if i % 2 else None
+        ))
+        for i in range(1, 6)
+    ]
+    job_id = job.id
+    device_id = devices[2].id
+    db.close()
+
+    response = client.get(f"/jobs/{job_id}/preview")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    first = response.json()
+    assert [p["hostname"] for p in first] == [f"sw{i}" for i in range(1, 6)]
+    assert first[1] == client.get(f"/jobs/{job_id}/devices/{first[1]['device_id']}/preview").json()
+
+    # Unchanged job: the client's copy is still good
+    response = client.get(f"/jobs/{job_id}/preview", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Editing one device changes the ETag and re-renders only that device
+    client.patch(f"/devices/{device_id}", json={"hostname": "sw-edited"})
+    hits = preview_service.preview_cache.hits
+    response = client.post(f"/jobs/{job_id}/preview", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    data = response.json()
+    assert data[2]["hostname"] == "sw-edited" and "sw-edited" in data[2]["commands"]
+    assert data[:2] + data[3:] == first[:2] + first[3:]
+    assert preview_service.preview_cache.hits == hits + 4
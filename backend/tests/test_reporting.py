@@ -5,6 +5,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from backend.app.config import settings
 from backend.infra import database, repository
 from backend.core import models
 from backend.core.services.report_service import ReportService
@@ -70,3 +71,90 @@ def test_generate_csv_report(db):
     assert rows[0]["hostname"] == "sw-csv"
     assert rows[0]["error_code"] == "SERIAL_TIMEOUT"
     assert rows[0]["status"] == "FAILED"
+
+def seed_run(db, devices=3):
+    job = repository.create_job(db, models.JobCreate(name="Stream Job"))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+    for i in range(1, devices + 1):
+        dev = repository.create_device(db, models.DeviceCreate(
+            job_id=job.id, hostname=f"sw{i}", mgmt_ip=f"1.1.1.{i}", mask="/24", gateway="1.1.1.254", port=i
+        ))
+        repository.update_run_device_status(
+            db, run.id, dev.id, "VERIFIED", template_hash=f"hash{i}",
+            tasks='[{"name": "Verify SSH", "status": "success"}]'
+        )
+    return run
+
+def test_report_devices_come_from_one_query(db):
+    from sqlalchemy import event
+
+    run_id = seed_run(db, devices=10).id
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        devices = list(ReportService(db).iter_devices(run_id))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(devices) == 10
+    assert devices[3]["hostname"] == "sw4" and devices[3]["port"] == 4
+    assert devices[3]["tasks"] == [{"name": "Verify SSH", "status": "success"}]
+    assert len(statements) == 1
+
+def test_streamed_formats_match(db, monkeypatch):
+    import json
+    monkeypatch.setattr(settings, "REPORT_CACHE_DIR", None)
+    run = seed_run(db)
+    service = ReportService(db)
+
+    assert json.loads("".join(service.stream_report(run.id, "json"))) == service.generate_json_report(run.id)
+
+    lines = [json.loads(line) for line in "".join(service.stream_report(run.id, "ndjson")).splitlines()]
+    assert lines[0]["type"] == "run" and lines[0]["run_id"] == run.id
+    assert [l["hostname"] for l in lines[1:]] == ["sw1", "sw2", "sw3"]
+
+    rows = list(csv.DictReader(io.StringIO("".join(service.stream_report(run.id, "csv")))))
+    assert [r["template_hash"] for r in rows] == ["hash1", "hash2", "hash3"]
+    assert rows[0]["tasks_summary"] == "Verify SSH: success"
+    assert service.stream_report(999, "csv") is None
+
+def test_finished_run_report_is_cached_on_disk(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "REPORT_CACHE_DIR", str(tmp_path))
+    run = seed_run(db, devices=2)
+    service = ReportService(db)
+
+    # Still running: never cached
+    "".join(service.stream_report(run.id, "csv"))
+    assert list(tmp_path.iterdir()) == []
+
+    repository.update_run_status(db, run.id, "COMPLETED")
+    first = "".join(service.stream_report(run.id, "csv"))
+    assert len(list(tmp_path.glob("*.csv"))) == 1
+
+    # Served from the cache from now on
+    db.query(database.DBRunDevice).update({"template_hash": "changed"})
+    db.commit()
+    assert "".join(service.stream_report(run.id, "csv")) == first
+
+def test_concurrent_downloads_write_the_cache_separately(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "REPORT_CACHE_DIR", str(tmp_path))
+    run = seed_run(db, devices=3)
+    repository.update_run_status(db, run.id, "COMPLETED")
+    service = ReportService(db)
+
+    # Two downloads of the same report, interleaved as on the threadpool
+    first, second = service.stream_report(run.id, "ndjson"), service.stream_report(run.id, "ndjson")
+    bodies = ["", ""]
+    pending = [first, second]
+    while pending:
+        for stream in list(pending):
+            try:
+                bodies[0 if stream is first else 1] += next(stream)
+            except StopIteration:
+                pending.remove(stream)
+
+    assert bodies[0] == bodies[1]
+    (cached,) = tmp_path.glob("*.ndjson")
+    assert cached.read_text() == bodies[0]
+    assert list(tmp_path.glob("*.tmp")) == []
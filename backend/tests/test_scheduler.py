@@ -1,42 +1,22 @@
 import pytest
 import asyncio
 from unittest.mock import AsyncMock, patch
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from backend.core.services.scheduler import RunManager
+from backend.core.services.port_arbiter import PortArbiter
 from backend.infra import repository, database
 from backend.core import models
 
-from sqlalchemy.pool import StaticPool
-
-# Setup in-memory SQLite with SHARED connection
-SQLALCHEMY_DATABASE_URL = "sqlite://"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @pytest.fixture(autouse=True)
-def setup_db():
-    database.Base.metadata.create_all(bind=engine)
-    # Patch database.get_db to use our testing session
-    def override_get_db():
-        db = TestingSessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-    
-    with patch("backend.core.services.scheduler.get_db", side_effect=lambda: override_get_db()):
+def setup_db(tables, async_session_factory):
+    # Point the scheduler's sessions at the testing database
+    with patch("backend.core.services.scheduler.AsyncSessionLocal", async_session_factory):
         yield
-    database.Base.metadata.drop_all(bind=engine)
 
 @pytest.mark.asyncio
-async def test_scheduler_batching():
-    db = TestingSessionLocal()
+async def test_scheduler_batching(session_factory):
+    db = session_factory()
     
     # Create job and 8 devices
     job = repository.create_job(db, models.JobCreate(name="Batch Job"))
@@ -79,3 +59,116 @@ async def test_scheduler_batching():
     assert max_active_workers_observed >= 2
     
     db.close()
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_never_share_a_port(session_factory):
+    db = session_factory()
+
+    # Two jobs cabled to the same four ports
+    run_ids = []
+    for name in ("Job A", "Job B"):
+        job = repository.create_job(db, models.JobCreate(name=name))
+        for port in range(1, 5):
+            repository.create_device(db, models.DeviceCreate(
+                job_id=job.id, hostname=f"{name[-1]}-sw{port}", mgmt_ip=f"10.0.{len(run_ids)}.{port}",
+                mask="/24", gateway="10.0.0.254", port=port
+            ))
+        run_ids.append(repository.create_run(db, models.RunCreate(job_id=job.id, parallelism=4)).id)
+    db.commit()
+
+    in_use = {}
+    collisions = []
+    max_busy = 0
+
+    async def mock_runner_run(self):
+        nonlocal max_busy
+        port = self.device.port
+        if port in in_use:
+            collisions.append((port, in_use[port], self.run_id))
+        in_use[port] = self.run_id
+        max_busy = max(max_busy, len(in_use))
+        await asyncio.sleep(0.05)
+        del in_use[port]
+
+    with patch("backend.core.services.scheduler.BootstrapRunner.run", mock_runner_run):
+        await asyncio.gather(*(RunManager(run_id).execute_run() for run_id in run_ids))
+
+    assert collisions == []
+    # Both runs together keep every port busy
+    assert max_busy == 4
+    db.expire_all()
+    assert all(repository.get_run(db, run_id).status == "COMPLETED" for run_id in run_ids)
+    db.close()
+
+@pytest.mark.asyncio
+async def test_port_arbiter_hands_ports_over_in_order():
+    arbiter = PortArbiter()
+    order = []
+
+    async def use(name):
+        async with arbiter.lease(1, name):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await arbiter.acquire(1, "first")
+    tasks = [asyncio.create_task(use(name)) for name in ("a", "b", "c")]
+    await asyncio.sleep(0)
+    tasks[1].cancel()
+    assert arbiter.stats() == {"busy": 1, "waiting": 3}
+
+    arbiter.release(1)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert order == ["a", "c"]
+    assert arbiter.is_free(1)
+    assert arbiter.stats() == {"busy": 0, "waiting": 0}
+
+@pytest.mark.asyncio
+async def test_port_arbiter_acquire_any_takes_first_released_port():
+    arbiter = PortArbiter()
+    await arbiter.acquire(1, "other run")
+    await arbiter.acquire(2, "other run")
+
+    task = asyncio.create_task(arbiter.acquire_any({1: "a", 2: "a"}))
+    await asyncio.sleep(0)
+    assert arbiter.stats() == {"busy": 2, "waiting": 1}
+
+    arbiter.release(2)
+    assert await task == 2
+    assert arbiter.holder(2) == "a"
+    # No longer queued for port 1
+    arbiter.release(1)
+    assert arbiter.is_free(1)
+    assert arbiter.stats() == {"busy": 1, "waiting": 0}
+
+@pytest.mark.asyncio
+async def test_run_waits_for_whichever_port_frees_first(session_factory):
+    db = session_factory()
+    job = repository.create_job(db, models.JobCreate(name="Job"))
+    for port in (1, 2):
+        repository.create_device(db, models.DeviceCreate(
+            job_id=job.id, hostname=f"sw{port}", mgmt_ip=f"10.0.0.{port}",
+            mask="/24", gateway="10.0.0.254", port=port
+        ))
+    run_id = repository.create_run(db, models.RunCreate(job_id=job.id, parallelism=1)).id
+    db.close()
+
+    arbiter = PortArbiter()
+    await arbiter.acquire(1, "other run")
+    await arbiter.acquire(2, "other run")
+    started = []
+
+    async def mock_runner_run(self):
+        started.append(self.device.port)
+        if len(started) == 1:
+            # The other run is still on port 1 while port 2 is in use here
+            arbiter.release(1)
+
+    with patch("backend.core.services.scheduler.BootstrapRunner.run", mock_runner_run), \
+            patch("backend.core.services.scheduler.port_arbiter", arbiter):
+        execution = asyncio.create_task(RunManager(run_id).execute_run())
+        await asyncio.sleep(0.1)
+        assert started == []
+        arbiter.release(2)
+        await asyncio.wait_for(execution, 5)
+
+    assert started == [2, 1]
@@ -85,3 +85,158 @@ def test_read_until_prompt_anchored(mock_serial_port):
     
     assert chunk1 in output
     assert chunk2 in output
+
+@pytest.mark.asyncio
+async def test_async_session_over_pty():
+    """
+    AsyncSerialSession should send and read through the event loop on a real tty.
+    """
+    import asyncio
+    import os
+    from backend.infra.serial import AsyncSerialSession
+
+    master, slave = os.openpty()
+    session = AsyncSerialSession(os.ttyname(slave), timeout=2.0)
+    await session.open()
+    try:
+        await session.send_line("show clock")
+        sent = await asyncio.get_running_loop().run_in_executor(None, os.read, master, 100)
+        assert sent == b"show clock\n"
+
+        os.write(master, b"show clock\r\n*10:00:00.000 UTC\r\nsw1#")
+        output = await session.read_until_prompt()
+        assert output.endswith("sw1#")
+        assert "10:00:00" in output
+    finally:
+        await session.close()
+        os.close(master)
+        os.close(slave)
+
+def test_prompt_matcher_prompt_split_across_chunks():
+    """
+    A prompt arriving in two chunks must still be detected, and '#' inside
+    earlier lines must not be.
+    """
+    from backend.infra.serial import PromptMatcher
+
+    matcher = PromptMatcher(prompt_regex=r"sw1\(config\)#")
+    assert not matcher.feed(b" description uplink #3\r\n" * 100)
+    assert not matcher.feed(b"sw1(con")
+    assert matcher.feed(b"fig)# ")
+    assert matcher.text().endswith("sw1(config)# ")
+
+def test_prompt_matcher_drops_non_ascii_noise():
+    from backend.infra.serial import PromptMatcher
+
+    matcher = PromptMatcher()
+    assert matcher.feed(b"\xffSwitch>\xfe")
+    assert matcher.text() == "Switch>"
+
+def test_read_until_prompt_waits_without_polling():
+    """
+    The blocking wait should wake once when the prompt arrives instead of
+    polling every 10 ms while the switch is busy.
+    """
+    import os
+    import threading
+
+    master, slave = os.openpty()
+    session = SerialSession(os.ttyname(slave), timeout=2.0)
+    session.open()
+    try:
+        timer = threading.Timer(0.3, os.write, args=(master, b"\r\nsw1#"))
+        timer.start()
+        output = session.read_until_prompt()
+        timer.join()
+
+        assert output.endswith("sw1#")
+        assert session.stats()["bytes_read"] == len(b"\r\nsw1#")
+        assert session.stats()["wakeups"] <= 3
+    finally:
+        session.close()
+        os.close(master)
+        os.close(slave)
+
+def test_read_until_prompt_raises_on_timeout(mock_serial_port):
+    from backend.infra.serial import PromptTimeout
+
+    session = SerialSession("COM1", timeout=0.05)
+    session.ser = mock_serial_port
+    mock_serial_port.buffer = b"crypto key generate rsa\r\n% Generating"
+    mock_serial_port.in_waiting = len(mock_serial_port.buffer)
+
+    with pytest.raises(PromptTimeout) as exc:
+        session.read_until_prompt(raise_on_timeout=True)
+    assert exc.value.output.endswith("% Generating")
+
+def test_resync_drops_stale_input_and_reads_fresh_prompt(mock_serial_port):
+    session = SerialSession("COM1", timeout=0.2)
+    session.ser = mock_serial_port
+    mock_serial_port.buffer = b"stale output sw1(config)#"
+    mock_serial_port.in_waiting = len(mock_serial_port.buffer)
+
+    # The switch answers the newline
+    def write(data):
+        mock_serial_port._output_buffer += data
+        mock_serial_port.buffer = b"\r\nsw1#"
+        mock_serial_port.in_waiting = len(mock_serial_port.buffer)
+    mock_serial_port.write = write
+
+    assert session.resync() == "\r\nsw1#"
+    assert mock_serial_port._output_buffer == b"\n"
+
+@pytest.mark.asyncio
+async def test_async_session_waits_for_port_locked_by_another_process():
+    import asyncio
+    import fcntl
+    import os
+    import serial
+    from backend.infra.serial import AsyncSerialSession
+
+    master, slave = os.openpty()
+    # flock is per open file, so a second open of the tty stands in for another executor
+    holder = os.open(os.ttyname(slave), os.O_RDWR | os.O_NOCTTY)
+    fcntl.flock(holder, fcntl.LOCK_EX)
+    try:
+        with pytest.raises(serial.SerialException):
+            await AsyncSerialSession(os.ttyname(slave)).open(lock_wait=0)
+
+        session = AsyncSerialSession(os.ttyname(slave))
+        opening = asyncio.create_task(session.open(lock_wait=10))
+        await asyncio.sleep(0.3)
+        assert not opening.done()
+
+        fcntl.flock(holder, fcntl.LOCK_UN)
+        await asyncio.wait_for(opening, 5)
+        assert session.ser.is_open
+        await session.close()
+    finally:
+        os.close(holder)
+        os.close(master)
+        os.close(slave)
+
+@pytest.mark.asyncio
+async def test_async_resync_gives_up_on_a_console_that_never_goes_quiet():
+    import asyncio
+    import os
+    from backend.infra.serial import AsyncSerialSession, PromptTimeout
+
+    master, slave = os.openpty()
+    session = AsyncSerialSession(os.ttyname(slave), timeout=0.5)
+    await session.open()
+
+    async def log_spam():
+        while True:
+            os.write(master, b"%LINK-3-UPDOWN: Interface Gi1/0/1, changed state to down\r\n")
+            await asyncio.sleep(0.05)
+
+    feeder = asyncio.create_task(log_spam())
+    try:
+        with pytest.raises(PromptTimeout) as exc:
+            await asyncio.wait_for(session.resync(quiet=0.2), 5)
+        assert "UPDOWN" in exc.value.output
+    finally:
+        feeder.cancel()
+        await session.close()
+        os.close(master)
+        os.close(slave)
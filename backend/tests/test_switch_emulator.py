@@ -0,0 +1,88 @@
+import pytest
+from unittest.mock import patch
+
+from backend.app.config import settings
+from backend.core import models
+from backend.core.services.bootstrap_runner import BootstrapRunner
+from backend.infra import database, repository
+from backend.tools.switch_emulator import SwitchEmulator
+from backend.vendors.base import CommandBlock
+
+
+@pytest.fixture
+def emulator(tmp_path, monkeypatch):
+    base_path = str(tmp_path / "port")
+    monkeypatch.setattr(settings, "SERIAL_PORT_BASE_PATH", base_path)
+    monkeypatch.setattr(settings, "SERIAL_TIMEOUT", 2)
+    with SwitchEmulator(ports=1, base_path=base_path, baudrate=0, latency=0.0, config_kb=4) as emu:
+        yield emu
+
+def create_cisco_device(db):
+    job = repository.create_job(db, models.JobCreate(name="Emulated Job"))
+    device = repository.create_device(db, models.DeviceCreate(
+        job_id=job.id, hostname="sw-emu", mgmt_ip="10.0.0.5", mask="255.255.255.0",
+        gateway="10.0.0.1", mgmt_vlan=10, port=1, vendor="cisco"
+    ))
+    run = repository.create_run(db, models.RunCreate(job_id=job.id))
+    return run, device
+
+@pytest.mark.asyncio
+async def test_cisco_bootstrap_against_emulator(db, emulator, async_session_factory):
+    run, device = create_cisco_device(db)
+
+    async with async_session_factory() as async_db:
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
+        await runner.run()
+
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+    assert db_rd.status == "VERIFIED", db_rd.error_message
+    captured_config = repository.get_run_device_config(db, run.id, device.id)
+    assert "hostname sw-emu" in captured_config
+    assert "ip address 10.0.0.5 255.255.255.0" in captured_config
+
+    switch = emulator.consoles[0].switch
+    assert switch.saved
+    assert switch.vlans[10] == "MANAGEMENT"
+
+@pytest.mark.asyncio
+async def test_pipelined_error_against_emulator(db, emulator, async_session_factory):
+    run, device = create_cisco_device(db)
+    async with async_session_factory() as async_db:
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
+
+        with patch.object(runner.vendor, "get_bootstrap_commands", return_value=[
+            CommandBlock(name="Enter Configuration", commands=["en", "conf t"]),
+            CommandBlock(name="Apply Baseline", commands=[
+                "hostname sw-emu", "vlan 10", " name MANAGEMENT", "exit", "spanning-tree bogus", "ip default-gateway 10.0.0.1"
+            ], critical=False, pipeline=True),
+        ]):
+            await runner.run()
+
+    # The error is reported for its own line, the rest of the batch went through
+    log = db.query(database.DBEventLog).filter_by(run_id=run.id, message="Command failed: spanning-tree bogus").first()
+    assert log is not None
+    switch = emulator.consoles[0].switch
+    assert switch.vlans[10] == "MANAGEMENT"
+    assert switch.gateway == "10.0.0.1"
+
+@pytest.mark.asyncio
+async def test_critical_block_is_not_pipelined_against_emulator(db, emulator, async_session_factory):
+    run, device = create_cisco_device(db)
+    async with async_session_factory() as async_db:
+        runner = await BootstrapRunner.load(async_db, run.id, device.id)
+
+        with patch.object(runner.vendor, "get_bootstrap_commands", return_value=[
+            CommandBlock(name="Enter Configuration", commands=["en", "conf t"]),
+            CommandBlock(name="Apply Baseline", commands=[
+                "hostname sw-emu", "spanning-tree bogus", "vlan 10", " name MANAGEMENT", "exit", "ip default-gateway 10.0.0.1"
+            ], pipeline=True),
+        ]):
+            await runner.run()
+
+    db_rd = db.query(database.DBRunDevice).filter_by(run_id=run.id, device_id=device.id).first()
+    assert db_rd.status == "FAILED"
+    assert db_rd.error_message == "Critical Error in Apply Baseline: spanning-tree bogus"
+    # Nothing after the failed line reached the switch
+    switch = emulator.consoles[0].switch
+    assert 10 not in switch.vlans
+    assert switch.gateway is None
@@ -44,3 +44,53 @@ async def test_cisco_vendor_rendering():
     assert "vlan 10" in full_cmds
     assert "interface Vlan10" in full_cmds
     assert "ip address 10.0.0.5 255.255.255.0" in full_cmds
+
+    # Key generation is slow and may ask first; the other config lines answer at once
+    baseline = next(b for b in blocks if b.name == "Apply Baseline")
+    keygen = baseline.specs["crypto key generate rsa modulus 2048"]
+    assert keygen.timeout > baseline.timeout
+    assert list(keygen.answers.values()) == ["yes"]
+    assert list(baseline.specs) == ["crypto key generate rsa modulus 2048"]
+
+def test_template_registry_compiles_once_and_reloads_on_change(tmp_path):
+    import os
+    from backend.vendors.templates import TemplateRegistry
+
+    vendor_dir = tmp_path / "acme"
+    vendor_dir.mkdir()
+    template_file = vendor_dir / "bootstrap.j2"
+    template_file.write_text("hostname {{ hostname }}\n")
+
+    registry = TemplateRegistry(root=str(tmp_path))
+    first = registry.get_template("acme")
+    assert registry.get_template("acme") is first
+    assert registry.render("acme", hostname="sw1") == "hostname sw1"
+
+    template_file.write_text("hostname {{ hostname }}-new\n")
+    stat = template_file.stat()
+    os.utime(template_file, (stat.st_atime, stat.st_mtime + 5))
+
+    assert registry.get_template("acme") is not first
+    assert registry.render("acme", hostname="sw1") == "hostname sw1-new"
+
+def test_template_registry_bytecode_cache(tmp_path):
+    from backend.vendors.templates import TemplateRegistry
+
+    cache_dir = tmp_path / "cache"
+    registry = TemplateRegistry(bytecode_cache_dir=str(cache_dir))
+    rendered = registry.render("cisco", hostname="sw1", mgmt_ip="10.0.0.1", mgmt_mask="255.255.255.0", gateway="10.0.0.254", mgmt_vlan=10)
+    assert any(cache_dir.iterdir())
+
+    # A second process-like registry loads the compiled code and renders the same
+    fresh = TemplateRegistry(bytecode_cache_dir=str(cache_dir))
+    assert fresh.render("cisco", hostname="sw1", mgmt_ip="10.0.0.1", mgmt_mask="255.255.255.0", gateway="10.0.0.254", mgmt_vlan=10) == rendered
+
+def test_cisco_next_cli_mode():
+    vendor = get_vendor("cisco")
+    assert vendor.next_cli_mode("en", "exec") == "enable"
+    assert vendor.next_cli_mode("conf t", "enable") == "config"
+    assert vendor.next_cli_mode("interface Vlan10", "config") == "config-if"
+    assert vendor.next_cli_mode(" ip address 10.0.0.1 255.255.255.0", "config-if") == "config-if"
+    assert vendor.next_cli_mode("exit", "config-if") == "config"
+    assert vendor.next_cli_mode("exit", "config") == "enable"
+    assert vendor.next_cli_mode("end", "config-line") == "enable"
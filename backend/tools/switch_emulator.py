@@ -0,0 +1,415 @@
+"""
+Pseudo-terminal switch emulator for tests and benchmarks.
+
+Every emulated console is a pty whose slave side is symlinked as
+{base_path}{n}, so the service can be pointed at it through
+SERIAL_PORT_BASE_PATH. The far end speaks a small Cisco-IOS-like dialect
+(exec/enable/config modes, terminal length, show commands, write memory) and
+can simulate console baud rate, command latency, running-config size and a
+noisy line that loses commands.
+
+    python -m backend.tools.switch_emulator --ports 16 --base-path /tmp/port
+"""
+import argparse
+import os
+import random
+import selectors
+import signal
+import threading
+import time
+import tty
+from typing import Dict, List, Optional, Tuple
+
+INVALID_INPUT = "% Invalid input detected at '^' marker.\r\n"
+PAGE_LINES = 24
+
+
+class EmulatedSwitch:
+    """CLI state of one Cisco-IOS-like switch."""
+
+    def __init__(self, hostname: str = "Switch", config_kb: int = 0,
+                 keygen_delay: float = 0.0, rsa_keys_present: bool = False):
+        self.hostname = hostname
+        self.config_kb = config_kb
+        self.keygen_delay = keygen_delay
+        self.mode = "exec"
+        self.enabled = False
+        self.terminal_length = PAGE_LINES
+        self.vlans: Dict[int, str] = {1: "default"}
+        self.interfaces: Dict[str, Dict[str, Optional[str]]] = {}
+        self.current: Optional[str] = None
+        self.gateway: Optional[str] = None
+        self.vty: List[str] = []
+        self.rsa_keys = rsa_keys_present
+        self.confirm: Optional[str] = None
+        self.saved = False
+
+    def prompt(self) -> str:
+        if self.confirm:
+            return ""
+        if self.mode == "exec":
+            return f"{self.hostname}{'#' if self.enabled else '>'}"
+        if self.mode == "config":
+            return f"{self.hostname}(config)#"
+        return f"{self.hostname}(config-{self.mode})#"
+
+    def handle(self, line: str) -> Tuple[str, float]:
+        """Runs one input line. Returns (output, extra processing delay)."""
+        cmd = line.strip()
+        if self.confirm:
+            return self._answer_confirm(cmd)
+        if not cmd:
+            return "", 0.0
+        if self.mode == "exec":
+            return self._exec(cmd)
+        return self._config(cmd)
+
+    def _answer_confirm(self, answer: str) -> Tuple[str, float]:
+        self.confirm = None
+        if answer.lower() in ("yes", "y"):
+            return self._generate_keys()
+        return "", 0.0
+
+    def _generate_keys(self) -> Tuple[str, float]:
+        self.rsa_keys = True
+        return (
+            f"The name for the keys will be: {self.hostname}.lab\r\n"
+            "% Generating 2048 bit RSA keys, keys will be non-exportable...\r\n"
+            "[OK] (elapsed time was 1 seconds)\r\n",
+            self.keygen_delay,
+        )
+
+    def _exec(self, cmd: str) -> Tuple[str, float]:
+        if cmd in ("en", "enable"):
+            self.enabled = True
+            return "", 0.0
+        if cmd == "disable":
+            self.enabled = False
+            return "", 0.0
+        if cmd.startswith("terminal length"):
+            self.terminal_length = int(cmd.split()[-1])
+            return "", 0.0
+        if cmd.startswith("show"):
+            return self._show(cmd), 0.0
+        if not self.enabled:
+            return INVALID_INPUT, 0.0
+        if cmd in ("conf t", "configure terminal"):
+            self.mode = "config"
+            return "Enter configuration commands, one per line.  End with CNTL/Z.\r\n", 0.0
+        if cmd in ("write", "write memory", "copy run start", "copy running-config startup-config"):
+            self.saved = True
+            return "Building configuration...\r\n[OK]\r\n", 0.0
+        return INVALID_INPUT, 0.0
+
+    def _config(self, cmd: str) -> Tuple[str, float]:
+        words = cmd.split()
+        if cmd == "end":
+            self.mode, self.current = "exec", None
+            return "", 0.0
+        if cmd == "exit":
+            if self.mode == "config":
+                self.mode = "exec"
+            else:
+                self.mode, self.current = "config", None
+            return "", 0.0
+        if words[0] == "hostname" and len(words) == 2:
+            self.hostname = words[1]
+            return "", 0.0
+        if words[0] == "vlan" and len(words) == 2 and words[1].isdigit():
+            self.vlans.setdefault(int(words[1]), f"VLAN{int(words[1]):04d}")
+            self.mode, self.current = "vlan", words[1]
+            return "", 0.0
+        if words[0] == "interface" and len(words) >= 2:
+            name = "".join(words[1:])
+            if name.lower().startswith("vlan"):
+                name = "Vlan" + name[4:]
+            self.interfaces.setdefault(name, {"ip": None, "mask": None, "shutdown": "yes"})
+            self.mode, self.current = "if", name
+            return "", 0.0
+        if cmd.startswith("line vty"):
+            self.mode, self.current = "line", None
+            return "", 0.0
+        if cmd.startswith("ip default-gateway") and len(words) == 3:
+            self.gateway = words[2]
+            return "", 0.0
+        if cmd.startswith("crypto key generate rsa"):
+            if self.rsa_keys:
+                self.confirm = "rsa"
+                return (
+                    f"% You already have RSA keys defined named {self.hostname}.lab.\r\n"
+                    "% Do you really want to replace them? [yes/no]: ",
+                    0.0,
+                )
+            return self._generate_keys()
+        if self.mode == "vlan" and words[0] == "name" and len(words) == 2:
+            self.vlans[int(self.current)] = words[1]
+            return "", 0.0
+        if self.mode == "if":
+            iface = self.interfaces[self.current]
+            if words[:2] == ["ip", "address"] and len(words) == 4:
+                iface["ip"], iface["mask"] = words[2], words[3]
+                return "", 0.0
+            if cmd == "no shutdown":
+                iface["shutdown"] = None
+                return "", 0.0
+            if cmd == "shutdown":
+                iface["shutdown"] = "yes"
+                return "", 0.0
+            if words[0] == "description":
+                return "", 0.0
+        if self.mode == "line" and (cmd.startswith("transport input") or cmd.startswith("login")):
+            self.vty.append(cmd)
+            return "", 0.0
+        return INVALID_INPUT, 0.0
+
+    def _show(self, cmd: str) -> str:
+        words = cmd.split()
+        if cmd.startswith("show ip interface brief"):
+            lines = ["Interface              IP-Address      OK? Method Status                Protocol"]
+            for name, iface in sorted(self.interfaces.items()):
+                ip = iface["ip"] or "unassigned"
+                status = "administratively down" if iface["shutdown"] else "up"
+                lines.append(f"{name:<22} {ip:<15} YES manual {status:<21} {'down' if iface['shutdown'] else 'up'}")
+            return "\r\n".join(lines) + "\r\n"
+        if cmd.startswith("show vlan brief"):
+            lines = [
+                "VLAN Name                             Status    Ports",
+                "---- -------------------------------- --------- -------------------------------",
+            ]
+            for vid, name in sorted(self.vlans.items()):
+                lines.append(f"{vid:<4} {name:<32} active")
+            return "\r\n".join(lines) + "\r\n"
+        if cmd.startswith("show ip ssh"):
+            if self.rsa_keys:
+                return "SSH Enabled - version 2.0\r\nAuthentication timeout: 120 secs; Authentication retries: 3\r\n"
+            return "SSH Disabled - version 1.99\r\n%Please create RSA keys to enable SSH.\r\n"
+        if cmd.startswith("show version"):
+            return "Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(7)E\r\n"
+        if cmd.startswith("show running-config") or cmd.startswith("show run"):
+            if len(words) > 3 and words[2] == "interface":
+                return self._running_config(only=words[3])
+            return self._running_config()
+        return INVALID_INPUT
+
+    def _running_config(self, only: Optional[str] = None) -> str:
+        body: List[str] = []
+        for name, iface in sorted(self.interfaces.items()):
+            if only and name.lower() != only.lower():
+                continue
+            body.append(f"interface {name}")
+            body.append(f" ip address {iface['ip']} {iface['mask']}" if iface["ip"] else " no ip address")
+            if iface["shutdown"]:
+                body.append(" shutdown")
+            body.append("!")
+        if not only:
+            body = [f"hostname {self.hostname}", "!"] + [
+                f"vlan {vid}\r\n name {name}\r\n!" for vid, name in sorted(self.vlans.items()) if vid != 1
+            ] + body
+            # Pad with access ports until the configured size is reached
+            port = 1
+            size = sum(len(line) + 2 for line in body)
+            while size < self.config_kb * 1024:
+                section = [
+                    f"interface GigabitEthernet1/0/{port}",
+                    " switchport mode access",
+                    " spanning-tree portfast",
+                    "!",
+                ]
+                body.extend(section)
+                size += sum(len(line) + 2 for line in section)
+                port += 1
+            if self.gateway:
+                body.append(f"ip default-gateway {self.gateway}")
+            body.append("line vty 0 4")
+            body.extend(f" {line}" for line in self.vty)
+            body.append("!")
+        text = "\r\n".join(body) + "\r\nend\r\n"
+        return f"Building configuration...\r\n\r\nCurrent configuration : {len(text)} bytes\r\n!\r\n{text}"
+
+
+class EmulatedConsole:
+    """One pty pair plus the pacing of what the switch sends back."""
+
+    def __init__(self, path: str, switch: EmulatedSwitch, baudrate: int, latency: float, drop_rate: float = 0.0, seed: Optional[int] = None):
+        self.path = path
+        self.switch = switch
+        self.latency = latency
+        # Share of commands lost on the line: no echo, no answer, no prompt
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.dropped = 0
+        # 8N1: ten bit times per byte
+        self.bytes_per_sec = baudrate / 10 if baudrate else 0
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.inbox = b""
+        self.outbox = bytearray()
+        self.pending: Optional[bytes] = None
+        self.pending_at = 0.0
+        self.more: List[str] = []
+        self.next_write_at = 0.0
+        self.commands = 0
+
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.symlink(os.ttyname(self.slave), path)
+
+    def close(self):
+        if os.path.islink(self.path):
+            os.unlink(self.path)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def feed(self, data: bytes):
+        self.inbox += data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+    def step(self, now: float) -> float:
+        """Advances processing and output. Returns seconds until the next deadline."""
+        if self.pending is not None and now >= self.pending_at:
+            self.outbox += self.pending
+            self.pending = None
+
+        if self.pending is None and b"\n" in self.inbox:
+            raw, self.inbox = self.inbox.split(b"\n", 1)
+            line = raw.decode("ascii", errors="ignore")
+            self.commands += 1
+            if line.strip() and self.drop_rate and self.rng.random() < self.drop_rate:
+                self.dropped += 1
+                return 0.0
+            if self.more:
+                # Any key continues a paged output
+                output, delay = self._page(), 0.0
+                echo = ""
+            else:
+                output, delay = self.switch.handle(line)
+                output = self._paginate(output)
+                echo = line + "\r\n"
+            self.pending = (echo + output + self.switch.prompt()).encode("ascii")
+            self.pending_at = now + self.latency + delay
+
+        if self.outbox and now >= self.next_write_at:
+            size = len(self.outbox)
+            if self.bytes_per_sec:
+                # Write in 10 ms slices of line time
+                size = min(size, max(1, int(self.bytes_per_sec / 100)))
+            try:
+                written = os.write(self.master, self.outbox[:size])
+            except BlockingIOError:
+                # Nobody is reading the console; retry shortly
+                written = 0
+                self.next_write_at = now + 0.01
+            del self.outbox[:written]
+            if self.bytes_per_sec and written:
+                self.next_write_at = now + written / self.bytes_per_sec
+
+        deadlines = []
+        if self.pending is not None:
+            deadlines.append(self.pending_at - now)
+        if self.outbox:
+            deadlines.append(self.next_write_at - now)
+        return max(0.0, min(deadlines)) if deadlines else 0.05
+
+    def _paginate(self, output: str) -> str:
+        lines = output.split("\r\n")
+        if not self.switch.terminal_length or len(lines) <= self.switch.terminal_length:
+            return output
+        page, self.more = lines[:self.switch.terminal_length - 1], lines[self.switch.terminal_length - 1:]
+        return "\r\n".join(page) + "\r\n --More-- "
+
+    def _page(self) -> str:
+        return self._paginate("\r\n".join(self.more))
+
+
+class SwitchEmulator:
+    """
+    Runs a set of emulated consoles on a background thread.
+
+        with SwitchEmulator(ports=4, base_path="/tmp/port"):
+            ...  # /tmp/port1 .. /tmp/port4 answer like switches
+    """
+
+    def __init__(self, ports: int, base_path: str, baudrate: int = 9600,
+                 latency: float = 0.005, config_kb: int = 0,
+                 keygen_delay: float = 0.0, rsa_keys_present: bool = False,
+                 drop_rate: float = 0.0, seed: Optional[int] = None):
+        self.consoles = [
+            EmulatedConsole(
+                f"{base_path}{i}",
+                EmulatedSwitch(config_kb=config_kb, keygen_delay=keygen_delay,
+                               rsa_keys_present=rsa_keys_present),
+                baudrate,
+                latency,
+                drop_rate=drop_rate,
+                seed=None if seed is None else seed + i,
+            )
+            for i in range(1, ports + 1)
+        ]
+        self._selector = selectors.DefaultSelector()
+        for console in self.consoles:
+            self._selector.register(console.master, selectors.EVENT_READ, console)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="switch-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self._selector.close()
+        for console in self.consoles:
+            console.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _loop(self):
+        timeout = 0.0
+        while self._running:
+            for key, _ in self._selector.select(timeout=timeout):
+                try:
+                    key.data.feed(os.read(key.fd, 4096))
+                except (BlockingIOError, OSError):
+                    pass
+            now = time.monotonic()
+            timeout = min([console.step(now) for console in self.consoles] + [0.05])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate Cisco-IOS-like switch consoles on pseudo-terminals.")
+    parser.add_argument("--ports", type=int, default=16)
+    parser.add_argument("--base-path", default="/tmp/port", help="symlinks are created as <base-path><n>")
+    parser.add_argument("--baud", type=int, default=9600, help="simulated console speed, 0 for unthrottled")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds before a command answers")
+    parser.add_argument("--config-kb", type=int, default=0, help="approximate running-config size")
+    parser.add_argument("--keygen-delay", type=float, default=0.0, help="seconds RSA key generation takes")
+    parser.add_argument("--rsa-keys-present", action="store_true", help="ask for confirmation before replacing keys")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of commands lost on the line (0..1)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for --drop-rate")
+    args = parser.parse_args()
+
+    emulator = SwitchEmulator(
+        ports=args.ports, base_path=args.base_path, baudrate=args.baud,
+        latency=args.latency, config_kb=args.config_kb,
+        keygen_delay=args.keygen_delay, rsa_keys_present=args.rsa_keys_present,
+        drop_rate=args.drop_rate, seed=args.seed,
+    )
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    emulator.start()
+    print(f"Emulating {args.ports} consoles at {args.base_path}1..{args.ports}", flush=True)
+    stop.wait()
+    emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,52 @@
 from abc import ABC, abstractmethod
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
+from .templates import get_template_registry
+
+class CommandSpec(BaseModel):
+    """How the runner waits for the answer to one command."""
+    # Regex of the prompt that ends the output; None: the block's, else [#>]
+    expect_prompt: Optional[str] = None
+    # Seconds until the prompt must be there; None: the block's, else SERIAL_TIMEOUT
+    timeout: Optional[float] = None
+    # Questions the command may ask (regex) and the line sent in reply, each answered once
+    answers: Dict[str, str] = {}
 
 class CommandBlock(BaseModel):
     name: str
     commands: List[str]
+    # Defaults for the commands of the block, see CommandSpec
     expect_prompt: Optional[str] = None
+    timeout: Optional[float] = None
+    # Commands that need more than the defaults, keyed by the command as in commands.
+    # In a pipelined block they are sent on their own.
+    specs: Dict[str, CommandSpec] = {}
     critical: bool = True
+    # Send several lines per round trip; None falls back to BaseVendor.pipeline_blocks.
+    # Critical blocks are never pipelined: they must stop at the first error.
+    pipeline: Optional[bool] = None
+    # Sent again when a resumed device skips past it: sets up CLI state (e.g.
+    # enters config mode) that the later blocks rely on
+    replay: bool = False
 
 class BaseVendor(ABC):
+    # Pipeline every non-critical block that does not set CommandBlock.pipeline itself
+    pipeline_blocks: bool = False
+    # Max bytes in flight to the console per pipelined batch (None: settings)
+    pipeline_window: Optional[int] = None
+    # Specs of commands that need them, keyed by command prefix (see command_spec)
+    command_specs: Dict[str, CommandSpec] = {}
+
     @property
     @abstractmethod
     def vendor_id(self) -> str:
         """Unique ID for the vendor (e.g., 'cisco_ios')."""
         pass
 
+    def template_version(self) -> str:
+        """Version of the bootstrap template behind get_bootstrap_commands."""
+        return get_template_registry().template_version(self.vendor_id)
+
     @abstractmethod
     def detect(self, transcript: str) -> float:
         """
@@ -22,12 +54,38 @@ class BaseVendor(ABC):
         """
         pass
 
+    def command_spec(self, cmd: str) -> Optional[CommandSpec]:
+        """The spec of the longest command_specs prefix cmd starts with, if any."""
+        matches = [prefix for prefix in self.command_specs if cmd.strip().startswith(prefix)]
+        return self.command_specs[max(matches, key=len)] if matches else None
+
+    def block_specs(self, commands: List[str]) -> Dict[str, CommandSpec]:
+        """CommandBlock.specs for commands, from command_specs."""
+        return {cmd: spec for cmd in commands if (spec := self.command_spec(cmd))}
+
+    def next_cli_mode(self, cmd: str, mode: str) -> Optional[str]:
+        """
+        The CLI mode (see bootstrap_runner.cli_mode) the console is in after
+        cmd was run in mode, None if unknown. Tells the runner whether a
+        command whose answer was lost went through, so it is not sent twice.
+        """
+        return None
+
     async def get_init_commands(self) -> List[str]:
         """
         Commands to run immediately after connection (e.g. ['terminal length 0']).
         """
         return []
 
+    async def get_resync_commands(self) -> List[str]:
+        """
+        Commands that bring a console left in any mode by an interrupted run
+        back to the exec prompt before a device is resumed, and again before
+        verifying one whose blocks had all gone through. Their output is not
+        checked.
+        """
+        return []
+
     @abstractmethod
     async def get_bootstrap_commands(self, device_data: Dict[str, Any]) -> List[CommandBlock]:
         """
@@ -1,27 +1,54 @@
-import os
-from typing import List, Dict, Any
-from jinja2 import Environment, FileSystemLoader
-from .base import BaseVendor, CommandBlock
+from typing import List, Dict, Any, Optional
+from .base import BaseVendor, CommandBlock, CommandSpec
+from .templates import get_template_registry
+
+# Config commands that enter a submode, and the mode the prompt names
+CONFIG_SUBMODES = {"interface": "config-if", "vlan": "config-vlan", "line": "config-line", "router": "config-router"}
 
 class CiscoVendor(BaseVendor):
     @property
     def vendor_id(self) -> str:
         return "cisco"
 
+    command_specs = {
+        # Takes a minute on older platforms; asks before replacing existing keys
+        "crypto key generate rsa": CommandSpec(timeout=120, answers={r"\[yes/no\]:": "yes"}),
+        "write memory": CommandSpec(timeout=60),
+        "show running-config": CommandSpec(timeout=60),
+    }
+
     def detect(self, transcript: str) -> float:
         low_transcript = transcript.lower()
         if "cisco" in low_transcript or "ios" in low_transcript:
             return 0.9
         return 0.0
 
+    def next_cli_mode(self, cmd: str, mode: str) -> Optional[str]:
+        words = cmd.lower().split()
+        if not words:
+            return mode
+        if mode.startswith("config"):
+            if words[0] == "end":
+                return "enable"
+            if words[0] == "exit":
+                return "config" if mode != "config" else "enable"
+            submode = CONFIG_SUBMODES.get(words[0])
+            return submode if submode and len(words) > 1 else mode
+        if mode == "exec" and words[0] in ("en", "enable"):
+            return "enable"
+        if mode == "enable" and "configure".startswith(words[0]) and len(words[0]) >= 4:
+            return "config"
+        return mode
+
     async def get_init_commands(self) -> List[str]:
         return ["terminal length 0"]
 
+    async def get_resync_commands(self) -> List[str]:
+        # Leaves config mode; also answers a pending [yes/no] question with "no"
+        return ["end"]
+
     async def get_bootstrap_commands(self, device_data: Dict[str, Any]) -> List[CommandBlock]:
-        template_dir = os.path.join(os.path.dirname(__file__), "..", "templates", "cisco")
-        env = Environment(loader=FileSystemLoader(template_dir))
-        template = env.get_template("bootstrap.j2")
-        rendered = template.render(**device_data)
+        rendered = get_template_registry().render("cisco", "bootstrap.j2", **device_data)
         
         # Breakdown into blocks for better control
         blocks = []
@@ -35,7 +62,8 @@ class CiscoVendor(BaseVendor):
         blocks.append(CommandBlock(
             name="Enter Configuration",
             commands=["en", "conf t"],
-            critical=True
+            critical=True,
+            replay=True
         ))
         
         # Block 2: Main Config
@@ -43,14 +71,18 @@ class CiscoVendor(BaseVendor):
         blocks.append(CommandBlock(
             name="Apply Baseline",
             commands=main_cmds,
-            critical=True
+            critical=True,
+            # One-line config commands answer at once; a lost one should not cost SERIAL_TIMEOUT
+            timeout=5,
+            specs=self.block_specs(main_cmds)
         ))
         
         # Block 3: Exit and Save
         blocks.append(CommandBlock(
             name="Save Configuration",
             commands=["end", "write memory"],
-            critical=False
+            critical=False,
+            specs=self.block_specs(["write memory"])
         ))
         
         return blocks
@@ -1,7 +1,6 @@
-import os
 from typing import List, Dict, Any
-from jinja2 import Environment, FileSystemLoader
 from .base import BaseVendor, CommandBlock
+from .templates import get_template_registry
 
 class GenericVendor(BaseVendor):
     @property
@@ -12,10 +11,7 @@ class GenericVendor(BaseVendor):
         return 0.1 # Very low confidence for generic
 
     async def get_bootstrap_commands(self, device_data: Dict[str, Any]) -> List[CommandBlock]:
-        template_dir = os.path.join(os.path.dirname(__file__), "..", "templates", "generic")
-        env = Environment(loader=FileSystemLoader(template_dir))
-        template = env.get_template("bootstrap.j2")
-        rendered = template.render(**device_data)
+        rendered = get_template_registry().render("generic", "bootstrap.j2", **device_data)
         
         return [
             CommandBlock(
@@ -0,0 +1,58 @@
+import os
+import threading
+from typing import Optional
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+from ..app.config import settings
+
+TEMPLATE_ROOT = os.path.join(os.path.dirname(__file__), "..", "templates")
+
+class TemplateRegistry:
+    """
+    Process-wide home of the vendor templates.
+
+    A single Environment compiles each template once and keeps it; with
+    auto_reload the loader compares the file's mtime on every lookup and
+    recompiles only after the template was edited. The optional bytecode cache
+    lets a fresh process skip the parse/compile step as well.
+    """
+    def __init__(self, root: str = TEMPLATE_ROOT, bytecode_cache_dir: Optional[str] = None, auto_reload: bool = True):
+        self.root = root
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(root),
+            auto_reload=auto_reload,
+            bytecode_cache=bytecode_cache,
+            cache_size=-1,
+        )
+
+    def get_template(self, vendor_id: str, name: str = "bootstrap.j2") -> Template:
+        return self.env.get_template(f"{vendor_id}/{name}")
+
+    def template_version(self, vendor_id: str, name: str = "bootstrap.j2") -> str:
+        """Changes whenever the template file is edited; used in keys of anything derived from a rendering."""
+        try:
+            st = os.stat(os.path.join(self.root, vendor_id, name))
+        except OSError:
+            return "missing"
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def render(self, vendor_id: str, name: str = "bootstrap.j2", **data) -> str:
+        return self.get_template(vendor_id, name).render(**data)
+
+_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_template_registry() -> TemplateRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TemplateRegistry(
+                    bytecode_cache_dir=settings.TEMPLATE_BYTECODE_CACHE_DIR,
+                    auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+                )
+    return _registry
@@ -0,0 +1,130 @@
+"""
+API latency while a 16-port run is executing.
+
+Starts the pty switch emulator, queues a run with one Cisco device per port
+and polls the API (run status and run devices, as the dashboard does) until
+the run is finished. Twice: with the run executed inside the API process, as
+BackgroundTasks used to, and with a separate executor process
+(python -m backend.app.executor) claiming it from the queue. Requests go
+through the ASGI app in this process; an idle baseline comes first.
+
+    python -m benchmarks.api_latency --ports 16
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Settings are read at import time, so point the service at scratch locations first
+_workdir = tempfile.mkdtemp(prefix="switch-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/bench.db")
+os.environ.setdefault("SERIAL_PORT_BASE_PATH", f"{_workdir}/port")
+os.environ.setdefault("REPORT_CACHE_DIR", "")
+
+import httpx  # noqa: E402
+
+from backend.app.main import app  # noqa: E402
+from backend.core import config_plan, models  # noqa: E402
+from backend.core.services.scheduler import RunManager  # noqa: E402
+from backend.infra import database, repository  # noqa: E402
+from benchmarks.run_throughput import start_emulator  # noqa: E402
+
+POLL_INTERVAL = 0.05
+
+
+async def seed_run(ports: int, status: str) -> int:
+    db = database.SessionLocal()
+    try:
+        job = repository.create_job(db, models.JobCreate(name=f"latency-{status}"))
+        for port in range(1, ports + 1):
+            repository.create_device(db, models.DeviceCreate(
+                job_id=job.id, hostname=f"bench-sw{port}", mgmt_ip=f"10.10.0.{port}",
+                mask="255.255.255.0", gateway="10.10.0.254", mgmt_vlan=10,
+                port=port, vendor="cisco",
+            ))
+        run_devices = await config_plan.plan_run_devices(repository.get_devices_by_job(db, job.id))
+        run = repository.create_run(db, models.RunCreate(job_id=job.id, parallelism=ports), run_devices, status=status)
+        return run.id
+    finally:
+        db.close()
+
+
+async def poll(client: httpx.AsyncClient, run_id: int, until_done: bool, duration: float = 2.0):
+    """Latencies of dashboard requests, until the run is finished (or for duration seconds)."""
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        run = (await client.get(f"/runs/{run_id}")).json()
+        await client.get(f"/runs/{run_id}/devices")
+        latencies.append(time.perf_counter() - start)
+        if until_done and run["status"] not in models.RUN_ACTIVE_STATUSES:
+            return latencies
+        if not until_done and time.perf_counter() > deadline:
+            return latencies
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def in_process(ports: int):
+    run_id = await seed_run(ports, "running")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # The runner prints every event for the journal; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            execution = asyncio.create_task(RunManager(run_id).execute_run())
+            latencies = await poll(client, run_id, until_done=True)
+            await execution
+    return latencies
+
+
+async def executor_process(ports: int):
+    run_id = await seed_run(ports, "queued")
+    executor = subprocess.Popen([sys.executable, "-m", "backend.app.executor"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            return await poll(client, run_id, until_done=True)
+    finally:
+        executor.terminate()
+        executor.wait()
+
+
+async def idle():
+    run_id = await seed_run(1, "COMPLETED")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        return await poll(client, run_id, until_done=False)
+
+
+def summary(label: str, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"{label:<22}{len(latencies):>9}{statistics.median(latencies) * 1e3:>9.1f}{p95 * 1e3:>9.1f}{latencies[-1] * 1e3:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=16)
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--config-kb", type=int, default=20)
+    parser.add_argument("--keygen-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{args.ports} ports, baud {args.baud}, running-config ~{args.config_kb} KB")
+    print(f"{'run executed':<22}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    summary("(idle)", asyncio.run(idle()))
+    for label, scenario in (("in the API process", in_process), ("by executor process", executor_process)):
+        emulator = start_emulator(args.ports, args)
+        try:
+            summary(label, asyncio.run(scenario(args.ports)))
+        finally:
+            emulator.terminate()
+            emulator.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Bulk preview of a job at 1k and 10k devices.
+
+Compares the old endpoint loop (one device lookup, one vendor and one
+sequential render per device) with the preview service: a cold render on the
+worker pool, a repeat with every preview cached, and the ETag check alone
+that answers an unchanged job with 304.
+
+    python -m benchmarks.bulk_preview --sizes 1000 10000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.core import models
+from backend.core.cache import DeviceResultCache
+from backend.core.services import preview_service
+from backend.infra import database, repository
+
+
+def seed(db, count: int):
+    job = repository.create_job(db, models.JobCreate(name="bench"))
+    db.bulk_insert_mappings(database.DBDevice, [
+        dict(job_id=job.id, hostname=f"sw-{i}", mgmt_ip=f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", mask="/8",
+             gateway="10.0.0.254", mgmt_vlan=10, port=i % 16 + 1, vendor="cisco" if i % 2 else None, status="pending")
+        for i in range(count)
+    ])
+    db.commit()
+    return job.id
+
+
+async def legacy(db, job_id: int):
+    previews = []
+    for device in repository.get_devices_by_job(db, job_id):
+        previews.append(await preview_service.render_preview(repository.get_device_by_id(db, device.id)))
+    return previews
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+async def run(sizes):
+    print(f"{'devices':>8}{'old s':>8}{'cold s':>8}{'cached s':>10}{'etag s':>8}")
+    for size in sizes:
+        engine = database.configure_sqlite(create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'preview.db')}"))
+        database.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        job_id = seed(db, size)
+
+        old, old_s = await timed(legacy(db, job_id))
+
+        cache = DeviceResultCache()
+        async def service():
+            devices = [models.Device.model_validate(d) for d in repository.get_devices_by_job(db, job_id)]
+            return await preview_service.get_previews(devices, cache=cache)
+        cold, cold_s = await timed(service())
+        cached, cached_s = await timed(service())
+        assert old == cold == cached
+
+        async def etag():
+            devices = [models.Device.model_validate(d) for d in repository.get_devices_by_job(db, job_id)]
+            return preview_service.preview_etag(devices, preview_service.preview_keys(devices))
+        _, etag_s = await timed(etag())
+
+        print(f"{size:>8}{old_s:>8.2f}{cold_s:>8.2f}{cached_s:>10.2f}{etag_s:>8.2f}")
+        db.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes))
+
+
+if __name__ == "__main__":
+    main()
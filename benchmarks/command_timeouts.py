@@ -0,0 +1,117 @@
+"""
+One timeout for every command versus per-command specs.
+
+Starts the pty switch emulator with switches that already have RSA keys (key
+generation asks before replacing them and then takes --keygen-delay seconds),
+optionally losing a share of the commands on the line. Runs one Cisco device
+per port twice: with the vendor's command specs stripped, so every command waits for
+[#>] within SERIAL_TIMEOUT as before, and with them. Reports verified devices,
+wall time and timeouts logged.
+
+    python -m benchmarks.command_timeouts --ports 8 --keygen-delay 12 --drop-rate 0.02
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+# Settings are read at import time, so point the service at scratch locations first
+_workdir = tempfile.mkdtemp(prefix="switch-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/bench.db")
+os.environ.setdefault("SERIAL_PORT_BASE_PATH", f"{_workdir}/port")
+
+from backend.app.config import settings  # noqa: E402
+from backend.core.services.scheduler import RunManager  # noqa: E402
+from backend.infra import database  # noqa: E402
+from backend.vendors.cisco import CiscoVendor  # noqa: E402
+from benchmarks.api_latency import seed_run  # noqa: E402
+from benchmarks.run_throughput import count_verified  # noqa: E402
+
+
+def start_emulator(args) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "backend.tools.switch_emulator",
+            "--ports", str(args.ports), "--base-path", settings.SERIAL_PORT_BASE_PATH,
+            "--keygen-delay", str(args.keygen_delay), "--rsa-keys-present",
+            "--drop-rate", str(args.drop_rate), "--seed", str(args.seed),
+        ],
+        stdout=subprocess.PIPE,
+    )
+    proc.stdout.readline()  # "Emulating ..." once the symlinks exist
+    return proc
+
+
+def count_timeouts(run_id: int) -> int:
+    db = database.SessionLocal()
+    try:
+        return db.query(database.DBEventLog).filter(
+            database.DBEventLog.run_id == run_id, database.DBEventLog.error_code == "SERIAL_TIMEOUT"
+        ).count()
+    finally:
+        db.close()
+
+
+@contextlib.contextmanager
+def without_specs():
+    """Cisco as it was: no command specs and no block timeouts, in the plans and for verify/save."""
+    get_bootstrap_commands = CiscoVendor.get_bootstrap_commands
+
+    async def plain_blocks(self, device_data):
+        blocks = await get_bootstrap_commands(self, device_data)
+        return [block.model_copy(update={"timeout": None, "specs": {}}) for block in blocks]
+
+    with patch.object(CiscoVendor, "command_specs", {}), patch.object(CiscoVendor, "get_bootstrap_commands", plain_blocks):
+        yield
+
+
+async def measure(mode: str, args):
+    emulator = start_emulator(args)
+    try:
+        with without_specs() if mode == "global timeout" else contextlib.nullcontext():
+            run_id = await seed_run(args.ports, "running")
+            start = time.perf_counter()
+            # The runner prints every event for the journal; keep the table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                await RunManager(run_id).execute_run()
+            wall = time.perf_counter() - start
+    finally:
+        emulator.terminate()
+        emulator.wait()
+    return {"verified": count_verified(run_id), "wall_s": wall, "timeouts": count_timeouts(run_id)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=8)
+    parser.add_argument("--keygen-delay", type=float, default=12.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backoff", type=float, default=0.5)
+    args = parser.parse_args()
+
+    settings.SERIAL_RETRY_BACKOFF = args.backoff
+    database.init_db()
+    print(
+        f"{args.ports} ports, key generation {args.keygen_delay:.0f} s after a [yes/no], "
+        f"{args.drop_rate:.0%} of commands lost, SERIAL_TIMEOUT {settings.SERIAL_TIMEOUT} s, {settings.SERIAL_RETRIES} retries"
+    )
+    print(f"{'mode':<16}{'verified':>10}{'wall s':>9}{'timeouts':>10}")
+
+    async def measure_all():
+        # One loop for both modes: the async engine's pool is bound to it
+        for mode in ("global timeout", "command specs"):
+            r = await measure(mode, args)
+            print(f"{mode:<16}{r['verified']:>10}{r['wall_s']:>9.2f}{r['timeouts']:>10}")
+
+    asyncio.run(measure_all())
+
+
+if __name__ == "__main__":
+    main()
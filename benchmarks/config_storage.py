@@ -0,0 +1,98 @@
+"""
+Database size and write time of captured running-configs.
+
+Writes one ~20 KB running-config per device for many runs of a 16-switch job,
+once the old way (plain text in run_devices.captured_config) and once through
+the compressed, content-addressed config blob store. Two re-run scenarios:
+identical configs on every run, and configs whose "Last configuration change"
+line differs per run (no dedup possible, compression only).
+
+    python -m benchmarks.config_storage --runs 50
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.infra import database, repository
+
+DEVICES = 16
+
+
+def running_config(device: int, run: int, volatile: bool, size_kb: int) -> str:
+    changed = f"10:{run % 60:02d}:00 UTC Mon Mar {run // 60 + 1} 2026" if volatile else "10:00:00 UTC Mon Mar 1 2026"
+    lines = [
+        "Building configuration...", "", "Current configuration : 20480 bytes", "!",
+        f"! Last configuration change at {changed}", "!",
+        "version 15.2", f"hostname sw{device}", "!",
+    ]
+    port = 1
+    while sum(len(line) + 1 for line in lines) < size_kb * 1024:
+        lines += [
+            f"interface GigabitEthernet1/0/{port}",
+            f" description access port {port} floor {device}",
+            " switchport access vlan 20", " switchport mode access", " spanning-tree portfast", "!",
+        ]
+        port += 1
+    return "\n".join(lines + ["end"]) + "\n"
+
+
+def legacy_update(db, run_id: int, device_id: int, config: str):
+    """What update_run_device_status did before the blob store."""
+    db_rd = db.query(database.DBRunDevice).filter(
+        database.DBRunDevice.run_id == run_id, database.DBRunDevice.device_id == device_id
+    ).first()
+    if not db_rd:
+        db_rd = database.DBRunDevice(run_id=run_id, device_id=device_id)
+        db.add(db_rd)
+    db_rd.status = "VERIFIED"
+    db_rd.captured_config = config
+    db.commit()
+    db.refresh(db_rd)
+
+
+def blob_update(db, run_id: int, device_id: int, config: str):
+    repository.update_run_device_status(db, run_id, device_id, "VERIFIED", captured_config=config)
+
+
+def measure(write, runs: int, volatile: bool, size_kb: int):
+    path = os.path.join(tempfile.mkdtemp(), "configs.db")
+    engine = database.configure_sqlite(create_engine(f"sqlite:///{path}"))
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    timings = []
+    for run in range(1, runs + 1):
+        for device in range(1, DEVICES + 1):
+            config = running_config(device, run, volatile, size_kb)
+            start = time.perf_counter()
+            write(db, run, device, config)
+            timings.append(time.perf_counter() - start)
+    db.close()
+
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    engine.dispose()
+    return os.path.getsize(path), statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--config-kb", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.runs} runs x {DEVICES} devices, ~{args.config_kb} KB running-config each")
+    print(f"{'scenario':<20}{'storage':<12}{'db MB':>8}{'write ms':>10}")
+    for label, volatile in (("identical re-runs", False), ("changing timestamp", True)):
+        for storage, write in (("plain text", legacy_update), ("blob store", blob_update)):
+            size, write_s = measure(write, args.runs, volatile, args.config_kb)
+            print(f"{label:<20}{storage:<12}{size / 2**20:>8.2f}{write_s * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+CSV device import throughput.
+
+Imports a generated 50k-row CSV into a job once the old way (every row read
+into memory, validated and committed through repository.create_device) and
+once through the streaming bulk importer. The old path is only run on the
+first --legacy-rows rows, its rate is what matters.
+
+    python -m benchmarks.csv_import --rows 50000
+"""
+import argparse
+import csv
+import io
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.core import models, services
+from backend.infra import database, repository
+
+HEADER = "port,hostname,mgmt_ip,mask,gateway,mgmt_vlan,model\n"
+
+
+def generate_csv(rows: int, invalid_every: int) -> str:
+    out = [HEADER]
+    for i in range(rows):
+        hostname = "" if invalid_every and i % invalid_every == invalid_every - 1 else f"sw{i}"
+        out.append(f"{i % 16 + 1},{hostname},10.{i // 65536}.{i // 256 % 256}.{i % 256},255.0.0.0,10.0.0.254,10,C3750\n")
+    return "".join(out)
+
+
+def legacy_import(db, job_id: int, content: str):
+    """What import_devices_from_csv did before: whole file in memory, one commit per row."""
+    count = 0
+    for row in csv.DictReader(io.StringIO(content)):
+        row = {k.strip(): v.strip() for k, v in row.items() if k and v}
+        if any(not row.get(field) for field in services.REQUIRED_FIELDS):
+            continue
+        repository.create_device(db, models.DeviceCreate(
+            job_id=job_id, hostname=row["hostname"], mgmt_ip=row["mgmt_ip"], mask=row["mask"],
+            gateway=row["gateway"], port=int(row["port"]), model=row.get("model"),
+            mgmt_vlan=int(row["mgmt_vlan"]), status="pending",
+        ))
+        count += 1
+    return count
+
+
+def bulk_import(db, job_id: int, content: str):
+    count, _ = services.import_devices_from_csv(db, job_id, io.StringIO(content))
+    return count
+
+
+def measure(importer, content: str):
+    path = os.path.join(tempfile.mkdtemp(), "import.db")
+    engine = database.configure_sqlite(create_engine(f"sqlite:///{path}"))
+    database.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    job = repository.create_job(db, models.JobCreate(name="bench"))
+
+    start = time.perf_counter()
+    count = importer(db, job.id, content)
+    elapsed = time.perf_counter() - start
+    db.close()
+    engine.dispose()
+    return count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--legacy-rows", type=int, default=5000)
+    parser.add_argument("--invalid-every", type=int, default=100, help="every Nth row lacks a hostname (0: none)")
+    args = parser.parse_args()
+
+    content = generate_csv(args.rows, args.invalid_every)
+    legacy_content = "".join(content.splitlines(keepends=True)[:args.legacy_rows + 1])
+
+    print(f"{args.rows} rows, every {args.invalid_every}th invalid")
+    print(f"{'importer':<16}{'rows':>8}{'imported':>10}{'seconds':>10}{'rows/s':>10}")
+    for label, importer, body, rows in (
+        ("per-row commit", legacy_import, legacy_content, args.legacy_rows),
+        ("bulk streaming", bulk_import, content, args.rows),
+    ):
+        count, elapsed = measure(importer, body)
+        print(f"{label:<16}{rows:>8}{count:>10}{elapsed:>10.2f}{rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Hot lookups on a database with a long run history, with and without indexes.
+
+Seeds thousands of runs (16 devices per job, a handful of events per device)
+and times the queries behind update_run_device_status, get_run_logs (full and
+one device's page) and get_devices_by_job before and after init_db creates the indexes.
+
+    python -m benchmarks.db_indexes --runs 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.infra import database, repository
+
+DEVICES_PER_JOB = 16
+EVENTS_PER_DEVICE = 8
+NEW_INDEXES = [
+    "ix_run_devices_run_id_device_id",
+    "ix_event_logs_run_id_id",
+    "ix_event_logs_run_id_device_id_id",
+    "ix_devices_job_id",
+    "ix_runs_job_id",
+]
+
+
+def seed(engine, runs: int, runs_per_job: int = 5):
+    now = datetime.now()
+    jobs = runs // runs_per_job
+    with engine.begin() as conn:
+        conn.execute(insert(database.DBJob), [{"id": j, "name": f"job {j}", "created_at": now} for j in range(1, jobs + 1)])
+        conn.execute(insert(database.DBDevice), [
+            {"id": (j - 1) * DEVICES_PER_JOB + p, "job_id": j, "port": p, "hostname": f"sw{j}-{p}",
+             "mgmt_ip": "10.0.0.1", "mask": "/24", "gateway": "10.0.0.254", "status": "pending"}
+            for j in range(1, jobs + 1) for p in range(1, DEVICES_PER_JOB + 1)
+        ])
+        conn.execute(insert(database.DBRun), [
+            {"id": r, "job_id": (r - 1) // runs_per_job + 1, "status": "COMPLETED", "parallelism": 4, "started_at": now}
+            for r in range(1, runs + 1)
+        ])
+        for r in range(1, runs + 1):
+            job_id = (r - 1) // runs_per_job + 1
+            device_ids = [(job_id - 1) * DEVICES_PER_JOB + p for p in range(1, DEVICES_PER_JOB + 1)]
+            conn.execute(insert(database.DBRunDevice), [
+                {"run_id": r, "device_id": d, "status": "VERIFIED"} for d in device_ids
+            ])
+            conn.execute(insert(database.DBEventLog), [
+                {"run_id": r, "device_id": d, "port": 1, "level": "INFO", "message": f"step {e}", "ts": now}
+                for d in device_ids for e in range(EVENTS_PER_DEVICE)
+            ])
+
+
+def time_queries(session_factory, runs: int, repeat: int):
+    db = session_factory()
+    timings = {}
+    probes = [runs // 2 + i for i in range(repeat)]
+
+    start = time.perf_counter()
+    for run_id in probes:
+        db.query(database.DBRunDevice).filter(
+            database.DBRunDevice.run_id == run_id, database.DBRunDevice.device_id == 1
+        ).first()
+    timings["run_device lookup"] = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for run_id in probes:
+        repository.get_run_logs(db, run_id)
+    timings["get_run_logs"] = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for run_id in probes:
+        first_device = (run_id - 1) // 5 * DEVICES_PER_JOB + 1
+        repository.get_run_logs(db, run_id, since_id=0, limit=50, device_id=first_device, include_raw=False)
+    timings["device log page"] = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for run_id in probes:
+        repository.get_devices_by_job(db, run_id // 5)
+    timings["get_devices_by_job"] = (time.perf_counter() - start) / repeat
+
+    db.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "history.db")
+    engine = database.configure_sqlite(create_engine(f"sqlite:///{path}"))
+    database.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in NEW_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    seed(engine, args.runs)
+    session_factory = sessionmaker(bind=engine)
+    print(f"{args.runs} runs, {args.runs * DEVICES_PER_JOB} run_devices, "
+          f"{args.runs * DEVICES_PER_JOB * EVENTS_PER_DEVICE} event_logs")
+
+    before = time_queries(session_factory, args.runs, args.repeat)
+    database.init_db(engine)
+    after = time_queries(session_factory, args.runs, args.repeat)
+
+    print(f"{'query':<22}{'no index ms':>13}{'indexed ms':>12}{'speedup':>9}")
+    for name in before:
+        print(f"{name:<22}{before[name] * 1e3:>13.2f}{after[name] * 1e3:>12.2f}{before[name] / after[name]:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Job dry-run validation at 1k and 10k devices.
+
+Validates a generated job once the way the dry-run endpoint used to (one
+validate_device_config call per device, each checking the device against the
+whole job) and once with policy.validate_job, and checks both produce the
+same errors. The last column is a re-validation through the validation cache
+after one device was edited. Every 50th device reuses an IP and every 16 devices share a port,
+so the duplicate checks have something to report.
+
+    python -m benchmarks.dry_run --sizes 1000 10000
+"""
+import argparse
+import asyncio
+import time
+
+from backend.core import models, policy
+
+
+def generate_job(count: int):
+    devices = []
+    for i in range(1, count + 1):
+        ip_index = i - 1 if i % 50 == 0 else i
+        devices.append(models.Device(
+            id=i, job_id=1, hostname=f"sw-{i}", port=i % 16 + 1,
+            mgmt_ip=f"10.{ip_index // 65536}.{ip_index // 256 % 256}.{ip_index % 256}",
+            mask=("/8", "255.0.0.0", "8")[i % 3], gateway="10.0.0.254", mgmt_vlan=10,
+            vendor="cisco" if i % 2 else None,
+        ))
+    return devices
+
+
+async def per_device(devices):
+    errors = []
+    for device in devices:
+        errors.extend(await policy.validate_device_config(device, devices))
+    return errors
+
+
+async def measure(validate, devices):
+    start = time.perf_counter()
+    errors = await validate(devices)
+    return errors, time.perf_counter() - start
+
+
+async def edited_rerun(devices):
+    """Warms a cache with the job, edits one device and times the re-validation."""
+    cache = policy.ValidationCache()
+    await policy.validate_job(devices, cache=cache)
+    devices = devices[:1] + [devices[1].model_copy(update={"hostname": "sw-edited"})] + devices[2:]
+    return await measure(lambda ds: policy.validate_job(ds, cache=cache), devices)
+
+
+async def run(sizes):
+    print(f"{'devices':>8}{'errors':>8}{'per-device s':>14}{'job s':>8}{'speedup':>9}{'1 edit s':>10}")
+    for size in sizes:
+        devices = generate_job(size)
+        old_errors, old_s = await measure(per_device, devices)
+        new_errors, new_s = await measure(policy.validate_job, devices)
+        assert [e.model_dump() for e in old_errors] == [e.model_dump() for e in new_errors]
+        _, cached_s = await edited_rerun(devices)
+        print(f"{size:>8}{len(new_errors):>8}{old_s:>14.2f}{new_s:>8.2f}{old_s / new_s:>8.0f}x{cached_s:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes))
+
+
+if __name__ == "__main__":
+    main()
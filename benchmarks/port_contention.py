@@ -0,0 +1,117 @@
+"""
+Concurrent runs on shared console ports.
+
+Seeds several jobs cabled to the same 16 ports and executes one run per job
+at the same time through RunManager.execute_run. The device work is replaced
+by a sleep of random length, so only scheduling is measured. Three ways:
+without the port arbiter (what the per-run semaphore alone allowed), one run
+after the other (the only safe way before) and concurrently with the arbiter.
+Reports wall time, port collisions and how busy the 16 ports were.
+
+    python -m benchmarks.port_contention --runs 3 --ports 16
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+# Settings are read at import time, so point the service at scratch locations first
+_workdir = tempfile.mkdtemp(prefix="switch-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/bench.db")
+
+from backend.core import models  # noqa: E402
+from backend.core.services import scheduler  # noqa: E402
+from backend.core.services.port_arbiter import PortArbiter  # noqa: E402
+from backend.core.services.scheduler import RunManager  # noqa: E402
+from backend.infra import database, repository  # noqa: E402
+
+
+class NoArbiter(PortArbiter):
+    """Every port is always free: the runs only know their own semaphore."""
+
+    async def acquire_any(self, holders):
+        return next(iter(holders))
+
+    def release(self, port: int):
+        pass
+
+
+def seed_runs(runs: int, ports: int, parallelism: int):
+    db = database.SessionLocal()
+    try:
+        run_ids = []
+        for r in range(runs):
+            job = repository.create_job(db, models.JobCreate(name=f"contention-{r}"))
+            for port in range(1, ports + 1):
+                repository.create_device(db, models.DeviceCreate(
+                    job_id=job.id, hostname=f"bench-{r}-sw{port}", mgmt_ip=f"10.{r}.0.{port}",
+                    mask="255.255.255.0", gateway=f"10.{r}.0.254", port=port,
+                ))
+            run_ids.append(repository.create_run(db, models.RunCreate(job_id=job.id, parallelism=parallelism)).id)
+        return run_ids
+    finally:
+        db.close()
+
+
+async def measure(mode: str, args):
+    run_ids = seed_runs(args.runs, args.ports, args.parallelism)
+    rng = random.Random(1)
+    durations = {}
+    in_use = {}
+    stats = {"collisions": 0, "busy_s": 0.0}
+
+    async def fake_run(self):
+        port = self.device.port
+        if port in in_use:
+            stats["collisions"] += 1
+        in_use[port] = in_use.get(port, 0) + 1
+        duration = durations.setdefault((self.run_id, self.device_id), rng.uniform(args.min_s, args.max_s))
+        await asyncio.sleep(duration)
+        stats["busy_s"] += duration
+        in_use[port] -= 1
+        if not in_use[port]:
+            del in_use[port]
+
+    arbiter = NoArbiter() if mode == "no arbiter" else PortArbiter()
+    start = time.perf_counter()
+    with patch.object(scheduler.BootstrapRunner, "run", fake_run), patch.object(scheduler, "port_arbiter", arbiter):
+        if mode == "one after another":
+            for run_id in run_ids:
+                await RunManager(run_id).execute_run()
+        else:
+            await asyncio.gather(*(RunManager(run_id).execute_run() for run_id in run_ids))
+    wall = time.perf_counter() - start
+    return {
+        "wall_s": wall,
+        "collisions": stats["collisions"],
+        "utilization": stats["busy_s"] / (args.ports * wall) * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ports", type=int, default=16)
+    parser.add_argument("--parallelism", type=int, default=16)
+    parser.add_argument("--min-s", type=float, default=0.5, help="shortest simulated device")
+    parser.add_argument("--max-s", type=float, default=2.0, help="longest simulated device")
+    args = parser.parse_args()
+
+    database.init_db()
+    print(f"{args.runs} runs x {args.ports} ports, parallelism {args.parallelism}, devices {args.min_s}-{args.max_s} s")
+    print(f"{'mode':<20}{'wall s':>9}{'collisions':>12}{'ports busy %':>14}")
+
+    async def measure_all():
+        # One loop for all modes: the async engine's pool is bound to it
+        for mode in ("no arbiter", "one after another", "arbiter"):
+            r = await measure(mode, args)
+            print(f"{mode:<20}{r['wall_s']:>9.2f}{r['collisions']:>12}{r['utilization']:>14.1f}")
+
+    asyncio.run(measure_all())
+
+
+if __name__ == "__main__":
+    main()
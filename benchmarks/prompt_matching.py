@@ -0,0 +1,70 @@
+"""
+Prompt detection cost on large outputs read in small chunks.
+
+Compares the legacy approach (append every chunk to a str and re-run the
+anchored regex over the whole output) with PromptMatcher, which keeps a
+bytearray and only searches the trailing window.
+
+    python -m benchmarks.prompt_matching --sizes 100 300 600 --chunk 64
+"""
+import argparse
+import re
+import time
+
+from backend.infra.serial import PromptMatcher
+
+
+def make_output(size_kb: int) -> bytes:
+    # running-config-like lines; no '#' or '>' so a chunk boundary can never
+    # look like a prompt and both readers consume the whole output
+    lines = []
+    i = 0
+    while sum(len(line) for line in lines) < size_kb * 1024:
+        lines.append(f"interface GigabitEthernet1/0/{i}\r\n description uplink {i} to core\r\n")
+        i += 1
+    return ("".join(lines) + "sw1#").encode("ascii")
+
+
+def legacy(data: bytes, chunk: int) -> str:
+    pattern = re.compile(r"([#>])\s*$", re.MULTILINE)
+    output = ""
+    for i in range(0, len(data), chunk):
+        output += data[i:i + chunk].decode("ascii", errors="ignore")
+        if pattern.search(output):
+            break
+    return output
+
+
+def streaming(data: bytes, chunk: int) -> str:
+    matcher = PromptMatcher(r"[#>]")
+    for i in range(0, len(data), chunk):
+        if matcher.feed(data[i:i + chunk]):
+            break
+    return matcher.text()
+
+
+def timed(fn, data: bytes, chunk: int):
+    start = time.perf_counter()
+    result = fn(data, chunk)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 600])
+    parser.add_argument("--chunk", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"chunk size {args.chunk} bytes")
+    print(f"{'size KB':>8}{'legacy ms':>12}{'stream ms':>12}{'speedup':>10}")
+    for size in args.sizes:
+        data = make_output(size)
+        t_legacy, out_legacy = timed(legacy, data, args.chunk)
+        t_stream, out_stream = timed(streaming, data, args.chunk)
+        assert out_legacy == out_stream
+        print(f"{size:>8}{t_legacy * 1e3:>12.1f}{t_stream * 1e3:>12.1f}"
+              f"{t_legacy / t_stream:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Re-running failed devices: a new full run versus a resume run.
+
+Starts the pty switch emulator with one Cisco device per port and runs
+them with every device timing out in its last block, after the RSA key
+was generated. Then times getting the devices to VERIFIED, once with a new
+full run (everything from "Enter Configuration", key generation included)
+and once with a resume run that continues after the last checkpoint. A
+full run against untouched switches is the reference.
+
+    python -m benchmarks.resume_run --ports 4 --keygen-delay 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+# Settings are read at import time, so point the service at scratch locations first
+_workdir = tempfile.mkdtemp(prefix="switch-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/bench.db")
+os.environ.setdefault("SERIAL_PORT_BASE_PATH", f"{_workdir}/port")
+
+from backend.core import config_plan, models  # noqa: E402
+from backend.core.services.bootstrap_runner import BootstrapRunner  # noqa: E402
+from backend.core.services.scheduler import RunManager  # noqa: E402
+from backend.infra import database, repository  # noqa: E402
+from benchmarks.run_throughput import count_verified, start_emulator  # noqa: E402
+
+
+async def interrupted_run(ports: int, interrupt: bool = True) -> int:
+    """
+    Runs one device per port and times every one of them out in its last
+    block, after the key was generated. Without interrupt only creates the
+    run, leaving the switches untouched.
+    """
+    db = database.SessionLocal()
+    try:
+        job = repository.create_job(db, models.JobCreate(name=f"resume-{ports}"))
+        for port in range(1, ports + 1):
+            repository.create_device(db, models.DeviceCreate(
+                job_id=job.id, hostname=f"bench-sw{port}", mgmt_ip=f"10.10.0.{port}",
+                mask="255.255.255.0", gateway="10.10.0.254", mgmt_vlan=10,
+                port=port, vendor="cisco",
+            ))
+        devices = repository.get_devices_by_job(db, job.id)
+        run_id = repository.create_run(db, models.RunCreate(job_id=job.id, parallelism=ports), await config_plan.plan_run_devices(devices)).id
+    finally:
+        db.close()
+    if not interrupt:
+        return run_id
+
+    run_block = BootstrapRunner._run_block
+
+    async def time_out_last_block(self, block):
+        if block.name == "Save Configuration":
+            await self._fail_timeout(block.commands[0])
+            return True
+        return await run_block(self, block)
+
+    with patch.object(BootstrapRunner, "_run_block", time_out_last_block):
+        await RunManager(run_id).execute_run()
+    return run_id
+
+
+async def new_run(source_run_id: int, mode: str) -> int:
+    db = database.SessionLocal()
+    try:
+        source = repository.get_run(db, source_run_id)
+        devices = repository.get_devices_by_job(db, source.job_id)
+        if mode == "resume":
+            rows = await config_plan.resume_run_devices(repository.get_unverified_run_devices(db, source.id), {d.id: d for d in devices})
+            run_create = models.RunCreate(job_id=source.job_id, parallelism=source.parallelism, mode="resume", resumed_from=source.id)
+        else:
+            rows = await config_plan.plan_run_devices(devices)
+            run_create = models.RunCreate(job_id=source.job_id, parallelism=source.parallelism)
+        return repository.create_run(db, run_create, rows).id
+    finally:
+        db.close()
+
+
+async def measure(mode: str, args):
+    # A fresh emulator each time, with the state the interrupted run left behind
+    emulator = start_emulator(args.ports, args)
+    try:
+        # The runner prints every event for the journal; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == "clean":
+                run_id = await new_run(await interrupted_run(args.ports, interrupt=False), "full")
+            else:
+                run_id = await new_run(await interrupted_run(args.ports), mode)
+            start = time.perf_counter()
+            await RunManager(run_id).execute_run()
+        wall = time.perf_counter() - start
+    finally:
+        emulator.terminate()
+        emulator.wait()
+    return {"verified": count_verified(run_id), "wall_s": wall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=4)
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--config-kb", type=int, default=20)
+    parser.add_argument("--keygen-delay", type=float, default=5.0)
+    args = parser.parse_args()
+
+    database.init_db()
+    print(f"{args.ports} ports, baud {args.baud}, key generation {args.keygen_delay:.1f} s")
+    print(f"{'mode':<10}{'verified':>10}{'wall s':>9}")
+
+    async def measure_all():
+        # One loop for both modes: the async engine's pool is bound to it
+        for mode in ("clean", "full", "resume"):
+            r = await measure(mode, args)
+            print(f"{mode:<10}{r['verified']:>10}{r['wall_s']:>9.2f}")
+
+    asyncio.run(measure_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+End-to-end run throughput against emulated switches.
+
+Starts the pty switch emulator in a separate process, creates a job with one
+Cisco device per port and runs RunManager.execute_run over 1..16 ports.
+Reports wall time, per-command round-trip latency and CPU used by the service
+process (the emulator's CPU is not included).
+
+    python -m benchmarks.run_throughput --ports 1 4 16 --baud 9600
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Settings are read at import time, so point the service at scratch locations first
+_workdir = tempfile.mkdtemp(prefix="switch-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/bench.db")
+os.environ.setdefault("SERIAL_PORT_BASE_PATH", f"{_workdir}/port")
+
+from backend.app.config import settings  # noqa: E402
+from backend.core import models  # noqa: E402
+from backend.core.services import bootstrap_runner  # noqa: E402
+from backend.core.services.scheduler import RunManager  # noqa: E402
+from backend.infra import database, repository  # noqa: E402
+from backend.infra.serial import AsyncSerialSession  # noqa: E402
+
+ROUND_TRIPS = []
+
+
+class TimedSession(AsyncSerialSession):
+    """Records the time from each send to the prompt that answers it."""
+
+    async def send_line(self, line: str):
+        self._sent_at = time.perf_counter()
+        await super().send_line(line)
+
+    async def read_until_prompt(self, *args, **kwargs) -> str:
+        output = await super().read_until_prompt(*args, **kwargs)
+        ROUND_TRIPS.append(time.perf_counter() - self._sent_at)
+        return output
+
+
+def start_emulator(ports: int, args) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "backend.tools.switch_emulator",
+            "--ports", str(ports), "--base-path", settings.SERIAL_PORT_BASE_PATH,
+            "--baud", str(args.baud), "--latency", str(args.latency),
+            "--config-kb", str(args.config_kb), "--keygen-delay", str(args.keygen_delay),
+        ],
+        stdout=subprocess.PIPE,
+    )
+    proc.stdout.readline()  # "Emulating ..." once the symlinks exist
+    return proc
+
+
+def seed_run(ports: int) -> int:
+    db = database.SessionLocal()
+    try:
+        job = repository.create_job(db, models.JobCreate(name=f"bench-{ports}"))
+        for port in range(1, ports + 1):
+            repository.create_device(db, models.DeviceCreate(
+                job_id=job.id, hostname=f"bench-sw{port}", mgmt_ip=f"10.10.0.{port}",
+                mask="255.255.255.0", gateway="10.10.0.254", mgmt_vlan=10,
+                port=port, vendor="cisco",
+            ))
+        run = repository.create_run(db, models.RunCreate(job_id=job.id, parallelism=ports))
+        return run.id
+    finally:
+        db.close()
+
+
+def count_verified(run_id: int) -> int:
+    db = database.SessionLocal()
+    try:
+        return db.query(database.DBRunDevice).filter_by(run_id=run_id, status="VERIFIED").count()
+    finally:
+        db.close()
+
+
+def measure(ports: int, args):
+    ROUND_TRIPS.clear()
+    emulator = start_emulator(ports, args)
+    try:
+        run_id = seed_run(ports)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        # The runner prints every event for the journal; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(RunManager(run_id).execute_run())
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+    latencies = sorted(ROUND_TRIPS)
+    return {
+        "ports": ports,
+        "verified": count_verified(run_id),
+        "wall_s": wall,
+        "round_trips": len(latencies),
+        "avg_ms": statistics.mean(latencies) * 1e3 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1e3 if latencies else 0.0,
+        "cpu_s": cpu,
+        "cpu_pct": cpu / wall * 100 if wall else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--config-kb", type=int, default=20)
+    parser.add_argument("--keygen-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    database.init_db()
+    bootstrap_runner.AsyncSerialSession = TimedSession
+
+    print(f"baud {args.baud}, latency {args.latency * 1e3:.0f} ms, running-config ~{args.config_kb} KB")
+    print(f"{'ports':>6}{'verified':>10}{'wall s':>9}{'trips':>7}{'avg ms':>9}{'p95 ms':>9}{'cpu s':>8}{'cpu %':>7}")
+    for ports in args.ports:
+        r = measure(ports, args)
+        print(f"{r['ports']:>6}{r['verified']:>10}{r['wall_s']:>9.2f}{r['round_trips']:>7}"
+              f"{r['avg_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['cpu_s']:>8.2f}{r['cpu_pct']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
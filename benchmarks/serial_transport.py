@@ -0,0 +1,127 @@
+"""
+Per-command overhead of the serial transport at 16 concurrent ports.
+
+Compares the legacy SerialSession driven through asyncio.to_thread with the
+event-loop driven AsyncSerialSession. Every port is a pseudo-terminal whose
+far end is answered by a single responder thread that echoes the command and
+returns a prompt immediately, so the measured time is pure transport overhead.
+
+    python -m benchmarks.serial_transport --ports 16 --commands 200
+"""
+import argparse
+import asyncio
+import os
+import selectors
+import threading
+import time
+
+from backend.infra.serial import AsyncSerialSession, SerialSession
+
+PROMPT = b"sw1(config)#"
+
+
+class PtyResponder(threading.Thread):
+    """Answers every line written to the ptys with an echo and a prompt."""
+
+    def __init__(self, masters):
+        super().__init__(daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self.pending = {}
+        for fd in masters:
+            self.selector.register(fd, selectors.EVENT_READ)
+            self.pending[fd] = b""
+        self.running = True
+
+    def run(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                fd = key.fd
+                try:
+                    data = os.read(fd, 4096)
+                except OSError:
+                    self.selector.unregister(fd)
+                    continue
+                self.pending[fd] += data
+                while b"\n" in self.pending[fd]:
+                    line, self.pending[fd] = self.pending[fd].split(b"\n", 1)
+                    os.write(fd, line + b"\r\n" + PROMPT)
+
+
+async def sample_threads(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        samples.append(threading.active_count())
+        await asyncio.sleep(0.005)
+
+
+async def drive_threaded(path: str, commands: int):
+    session = SerialSession(path, timeout=5)
+    await asyncio.to_thread(session.open)
+    try:
+        for i in range(commands):
+            await asyncio.to_thread(session.send_line, f"description bench {i}")
+            await asyncio.to_thread(session.read_until_prompt)
+    finally:
+        await asyncio.to_thread(session.close)
+
+
+async def drive_async(path: str, commands: int):
+    session = AsyncSerialSession(path, timeout=5)
+    await session.open()
+    try:
+        for i in range(commands):
+            await session.send_line(f"description bench {i}")
+            await session.read_until_prompt()
+    finally:
+        await session.close()
+
+
+async def measure(mode: str, paths, commands: int):
+    driver = drive_async if mode == "async" else drive_threaded
+    stop = asyncio.Event()
+    samples = []
+    sampler = asyncio.create_task(sample_threads(stop, samples))
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    await asyncio.gather(*(driver(p, commands) for p in paths))
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    await sampler
+    total = commands * len(paths)
+    return {
+        "mode": mode,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "per_command_us": wall / total * 1e6,
+        "max_threads": max(samples) if samples else threading.active_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=16)
+    parser.add_argument("--commands", type=int, default=200)
+    args = parser.parse_args()
+
+    pairs = [os.openpty() for _ in range(args.ports)]
+    masters = [m for m, _ in pairs]
+    paths = [os.ttyname(s) for _, s in pairs]
+    responder = PtyResponder(masters)
+    responder.start()
+
+    print(f"{args.ports} ports x {args.commands} commands")
+    print(f"{'mode':<10}{'wall s':>10}{'cpu s':>10}{'us/cmd':>10}{'threads':>10}")
+    for mode in ("to_thread", "async"):
+        r = asyncio.run(measure(mode, paths, args.commands))
+        print(f"{r['mode']:<10}{r['wall_s']:>10.3f}{r['cpu_s']:>10.3f}"
+              f"{r['per_command_us']:>10.1f}{r['max_threads']:>10}")
+
+    responder.running = False
+    responder.join()
+    for m, s in pairs:
+        os.close(m)
+        os.close(s)
+
+
+if __name__ == "__main__":
+    main()
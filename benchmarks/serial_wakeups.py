@@ -0,0 +1,104 @@
+"""
+Wakeups and prompt latency of SerialSession.read_until_prompt.
+
+Each port is a pseudo-terminal whose far end answers a command with a prompt
+after a fixed think time (like a switch applying a config line). The legacy
+10 ms sleep-polling loop is compared with the select-based wait.
+
+    python -m benchmarks.serial_wakeups --ports 16 --commands 10 --delay 0.2
+"""
+import argparse
+import os
+import threading
+import time
+
+from backend.infra.serial import PromptMatcher, SerialSession
+
+
+class PollingSerialSession(SerialSession):
+    """The previous read loop: poll in_waiting, sleep 10 ms when idle."""
+
+    def read_until_prompt(self, prompt_regex=r"[#>]", timeout=None):
+        start_time = time.time()
+        effective_timeout = timeout if timeout is not None else self.timeout
+        matcher = PromptMatcher(prompt_regex)
+        while True:
+            n = self.ser.in_waiting
+            if n > 0:
+                chunk = self.ser.read(n)
+                self.bytes_read += len(chunk)
+                if matcher.feed(chunk):
+                    break
+            else:
+                if time.time() - start_time > effective_timeout:
+                    break
+                time.sleep(0.01)
+                self.wakeups += 1
+        return matcher.text()
+
+
+def drive(session_cls, master: int, slave: int, commands: int, delay: float, results: list):
+    session = session_cls(os.ttyname(slave), timeout=5)
+    session.open()
+    latencies = []
+    try:
+        for _ in range(commands):
+            session.send_line("no shutdown")
+            os.read(master, 1024)
+            sent_at = [0.0]
+
+            def answer():
+                sent_at[0] = time.perf_counter()
+                os.write(master, b"\r\nsw1(config-if)#")
+
+            timer = threading.Timer(delay, answer)
+            timer.start()
+            session.read_until_prompt()
+            latencies.append(time.perf_counter() - sent_at[0])
+            timer.join()
+    finally:
+        session.close()
+    results.append((session.stats(), latencies))
+
+
+def measure(session_cls, pairs, commands: int, delay: float):
+    results = []
+    threads = [
+        threading.Thread(target=drive, args=(session_cls, m, s, commands, delay, results))
+        for m, s in pairs
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    wakeups = sum(stats["wakeups"] for stats, _ in results)
+    latencies = [lat for _, lats in results for lat in lats]
+    return {
+        "wakeups_per_s": wakeups / wall,
+        "avg_latency_ms": sum(latencies) / len(latencies) * 1e3,
+        "max_latency_ms": max(latencies) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=16)
+    parser.add_argument("--commands", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    pairs = [os.openpty() for _ in range(args.ports)]
+    print(f"{args.ports} ports x {args.commands} commands, {args.delay * 1e3:.0f} ms switch think time")
+    print(f"{'mode':<10}{'wakeups/s':>12}{'avg ms':>10}{'max ms':>10}")
+    for name, cls in (("polling", PollingSerialSession), ("select", SerialSession)):
+        r = measure(cls, pairs, args.commands, args.delay)
+        print(f"{name:<10}{r['wakeups_per_s']:>12.0f}{r['avg_latency_ms']:>10.2f}{r['max_latency_ms']:>10.2f}")
+    for m, s in pairs:
+        os.close(m)
+        os.close(s)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Concurrent commit throughput on the SQLite database.
+
+Mimics RunManager workers: every thread owns a session and commits small
+writes (an event log row plus a run_devices status update) as fast as it can.
+Runs once with a plain engine and once with the tuned pragmas from Settings
+(WAL, synchronous, busy timeout, cache and mmap size).
+
+    python -m benchmarks.sqlite_commits --workers 16 --commits 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.infra import database
+
+
+def make_engine(path: str, tuned: bool):
+    # The plain engine is the previous setup: only check_same_thread
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if tuned:
+        database.configure_sqlite(engine)
+    database.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def worker(session_factory, worker_id: int, commits: int, results: dict):
+    db = session_factory()
+    locked = 0
+    rd = database.DBRunDevice(run_id=1, device_id=worker_id, status="RUNNING")
+    for i in range(commits):
+        try:
+            db.add(rd)
+            db.add(database.DBEventLog(
+                run_id=1, device_id=worker_id, port=worker_id, level="INFO",
+                message=f"command {i}", ts=datetime.now(timezone.utc),
+            ))
+            rd.status = f"STEP {i}"
+            db.commit()
+        except OperationalError:
+            db.rollback()
+            locked += 1
+    db.close()
+    results[worker_id] = locked
+
+
+def measure(tuned: bool, workers: int, commits: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = make_engine(path, tuned)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    results = {}
+    threads = [
+        threading.Thread(target=worker, args=(session_factory, i, commits, results))
+        for i in range(1, workers + 1)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    engine.dispose()
+    failed = sum(results.values())
+    return {
+        "commits_per_s": (workers * commits - failed) / wall,
+        "locked": failed,
+        "wall_s": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--commits", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.commits} commits")
+    print(f"{'engine':<8}{'commits/s':>12}{'locked':>8}{'wall s':>9}")
+    for name, tuned in (("plain", False), ("tuned", True)):
+        r = measure(tuned, args.workers, args.commits)
+        print(f"{name:<8}{r['commits_per_s']:>12.0f}{r['locked']:>8}{r['wall_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Bootstrap rendering cost for many devices.
+
+Compares the previous per-call setup (a new Environment and a fresh parse of
+bootstrap.j2 for every device) with the shared TemplateRegistry, through the
+same CiscoVendor.get_bootstrap_commands path the runner and preview use.
+
+    python -m benchmarks.template_render --devices 10000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from jinja2 import Environment, FileSystemLoader
+
+from backend.vendors import cisco
+from backend.vendors.cisco import CiscoVendor
+from backend.vendors.templates import TEMPLATE_ROOT
+
+
+class _PerCallRegistry:
+    """The old behaviour: build an Environment and compile the template every time."""
+
+    def render(self, vendor_id: str, name: str = "bootstrap.j2", **data) -> str:
+        env = Environment(loader=FileSystemLoader(os.path.join(TEMPLATE_ROOT, vendor_id)))
+        return env.get_template(name).render(**data)
+
+
+def device_data(i: int) -> dict:
+    return {
+        "hostname": f"sw{i}",
+        "mgmt_ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+        "mgmt_mask": "255.255.0.0",
+        "gateway": "10.0.0.1",
+        "mgmt_vlan": 10 + i % 50,
+    }
+
+
+async def render_all(devices: int) -> float:
+    vendor = CiscoVendor()
+    start = time.perf_counter()
+    for i in range(devices):
+        await vendor.get_bootstrap_commands(device_data(i))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=10000)
+    args = parser.parse_args()
+
+    original = cisco.get_template_registry
+    try:
+        cisco.get_template_registry = _PerCallRegistry
+        per_call = asyncio.run(render_all(args.devices))
+    finally:
+        cisco.get_template_registry = original
+    shared = asyncio.run(render_all(args.devices))
+
+    print(f"{'setup':>10}{'devices':>9}{'total s':>9}{'us/device':>11}")
+    for label, total in (("per-call", per_call), ("registry", shared)):
+        print(f"{label:>10}{args.devices:>9}{total:>9.2f}{total / args.devices * 1e6:>11.0f}")
+    print(f"speedup x{per_call / shared:.1f}")
+
+
+if __name__ == "__main__":
+    main()
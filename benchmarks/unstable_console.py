@@ -0,0 +1,106 @@
+"""
+Runs over consoles that lose commands.
+
+Starts the pty switch emulator with a share of the commands lost on the line
+(no echo, no answer) and runs one Cisco device per port, without retries
+(every timeout fails the device, as before) and with the retry policy
+(reconnect, re-sync the prompt, send again). Reports verified devices, wall
+time and retries logged.
+
+    python -m benchmarks.unstable_console --ports 8 --drop-rate 0.02
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+# Settings are read at import time, so point the service at scratch locations first
+_workdir = tempfile.mkdtemp(prefix="switch-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/bench.db")
+os.environ.setdefault("SERIAL_PORT_BASE_PATH", f"{_workdir}/port")
+os.environ.setdefault("SERIAL_TIMEOUT", "3")
+
+from backend.app.config import settings  # noqa: E402
+from backend.core.services.scheduler import RunManager  # noqa: E402
+from backend.infra import database  # noqa: E402
+from backend.vendors.cisco import CiscoVendor  # noqa: E402
+from benchmarks.api_latency import seed_run  # noqa: E402
+from benchmarks.run_throughput import count_verified  # noqa: E402
+
+
+def start_emulator(args) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "backend.tools.switch_emulator",
+            "--ports", str(args.ports), "--base-path", settings.SERIAL_PORT_BASE_PATH,
+            "--baud", str(args.baud), "--config-kb", str(args.config_kb),
+            "--drop-rate", str(args.drop_rate), "--seed", str(args.seed),
+        ],
+        stdout=subprocess.PIPE,
+    )
+    proc.stdout.readline()  # "Emulating ..." once the symlinks exist
+    return proc
+
+
+def count_retries(run_id: int) -> int:
+    db = database.SessionLocal()
+    try:
+        return db.query(database.DBEventLog).filter(
+            database.DBEventLog.run_id == run_id, database.DBEventLog.message.like("%reconnecting for retry%")
+        ).count()
+    finally:
+        db.close()
+
+
+async def measure(retries: int, args):
+    settings.SERIAL_RETRIES = retries
+    settings.SERIAL_RETRY_BACKOFF = args.backoff
+    # Same seed, so both see the same lost commands as long as they send the same ones
+    emulator = start_emulator(args)
+    # Keys are generated at once here; a lost keygen line should cost SERIAL_TIMEOUT like any other
+    keygen = CiscoVendor.command_specs["crypto key generate rsa"].model_copy(update={"timeout": settings.SERIAL_TIMEOUT})
+    try:
+        with patch.dict(CiscoVendor.command_specs, {"crypto key generate rsa": keygen}):
+            run_id = await seed_run(args.ports, "running")
+        start = time.perf_counter()
+        # The runner prints every event for the journal; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            await RunManager(run_id).execute_run()
+        wall = time.perf_counter() - start
+    finally:
+        emulator.terminate()
+        emulator.wait()
+    return {"verified": count_verified(run_id), "wall_s": wall, "retries": count_retries(run_id)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=8)
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--config-kb", type=int, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backoff", type=float, default=0.5)
+    args = parser.parse_args()
+
+    database.init_db()
+    print(f"{args.ports} ports, {args.drop_rate:.0%} of commands lost, SERIAL_TIMEOUT {settings.SERIAL_TIMEOUT} s")
+    print(f"{'retries':>8}{'verified':>10}{'wall s':>9}{'retried':>9}")
+
+    async def measure_all():
+        # One loop for both: the async engine's pool is bound to it
+        for retries in (0, 2):
+            r = await measure(retries, args)
+            print(f"{retries:>8}{r['verified']:>10}{r['wall_s']:>9.2f}{r['retries']:>9}")
+
+    asyncio.run(measure_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,9 @@ const request = async (path, options = {}) => {
   return response.text();
 };
 
+// Last bulk preview per job with its ETag, so an unchanged job is not downloaded again
+const previewCache = {};
+
 export const api = {
   // Jobs
   getJobs: () => request('/jobs'),
@@ -60,7 +63,21 @@ export const api = {
   }),
 
   // Dry-run / Preview
-  getPreview: (jobId) => request(`/jobs/${jobId}/preview`, { method: 'POST' }),
+  getPreview: async (jobId) => {
+    const cached = previewCache[jobId];
+    const response = await fetch(`${API_URL}/jobs/${jobId}/preview`, {
+      headers: cached ? { 'If-None-Match': cached.etag } : {},
+    });
+    if (response.status === 304) return cached.data;
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+      throw new Error(error.detail || response.statusText);
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) previewCache[jobId] = { etag, data };
+    return data;
+  },
   runDryRun: (jobId) => request(`/jobs/${jobId}/dry-run`, { method: 'POST' }),
 
   // Runs
@@ -69,9 +86,20 @@ export const api = {
     method: 'POST',
     body: JSON.stringify({ job_id: jobId, parallelism }),
   }),
+  // Continues the devices of runId that did not verify from their last completed block
+  resumeRun: (jobId, runId, parallelism = 4) => request(`/jobs/${jobId}/runs`, {
+    method: 'POST',
+    body: JSON.stringify({ job_id: jobId, parallelism, mode: 'resume', resumed_from: runId }),
+  }),
   getRun: (id) => request(`/runs/${id}`),
   getRunDevices: (runId) => request(`/runs/${runId}/devices`),
-  getRunLogs: (id) => request(`/runs/${id}/logs`),
+  getRunLogs: (id, params = {}) => request(`/runs/${id}/logs?${new URLSearchParams(params)}`),
+  getRunLogRaw: (runId, logId) => request(`/runs/${runId}/logs/${logId}/raw`),
+  // Server-Sent Events: run/device status changes and new log rows
+  getRunEventsUrl: (id) => {
+    const passcode = localStorage.getItem('api_passcode');
+    return `${API_URL}/runs/${id}/events` + (passcode ? `?passcode=${encodeURIComponent(passcode)}` : '');
+  },
 
   API_URL: API_URL, // Export for direct link generation
 
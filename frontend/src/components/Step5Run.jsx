@@ -1,32 +1,37 @@
 import { useState, useEffect, useRef } from 'react'
 import { api } from '../api'
 
+// A queued run is waiting for the executor; neither is finished
+const isActive = (run) => run.status === 'queued' || run.status === 'running';
+
 function Step5Run({ jobId, onReset }) {
     const [parallelism, setParallelism] = useState(4);
     const [activeRun, setActiveRun] = useState(null);
     const [runDevices, setRunDevices] = useState([]);
+    const [runLogs, setRunLogs] = useState([]);
     const [selectedDeviceEvents, setSelectedDeviceEvents] = useState(null);
+    const [rawBodies, setRawBodies] = useState({});
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
-    const pollTimer = useRef(null);
+    const eventSource = useRef(null);
 
     useEffect(() => {
         // Check if there's an ongoing run for this job
         checkActiveRuns();
-        return () => stopPolling();
+        return () => stopStreaming();
     }, [jobId]);
 
     const checkActiveRuns = async () => {
         try {
             const runs = await api.getRuns(jobId);
-            const ongoing = runs.find(r => r.status === 'running');
+            const ongoing = runs.find(isActive);
             if (ongoing) {
                 setActiveRun(ongoing);
-                startPolling(ongoing.id);
+                startStreaming(ongoing.id);
             } else if (runs.length > 0) {
-                // Just show the latest completed run
+                // Just show the latest completed run; its stream ends after the history
                 setActiveRun(runs[0]);
-                loadRunData(runs[0].id);
+                startStreaming(runs[0].id);
             }
         } catch (err) {
             console.error("Failed to check runs", err);
@@ -39,7 +44,7 @@ function Step5Run({ jobId, onReset }) {
         try {
             const run = await api.createRun(jobId, parallelism);
             setActiveRun(run);
-            startPolling(run.id);
+            startStreaming(run.id);
         } catch (err) {
             setError(err.message);
         } finally {
@@ -47,55 +52,75 @@ function Step5Run({ jobId, onReset }) {
         }
     };
 
-    const startPolling = (runId) => {
-        stopPolling();
-        loadRunData(runId);
-        pollTimer.current = setInterval(() => loadRunData(runId), 2000);
-    };
-
-    const stopPolling = () => {
-        if (pollTimer.current) {
-            clearInterval(pollTimer.current);
-            pollTimer.current = null;
+    const resumeRun = async () => {
+        setLoading(true);
+        setError('');
+        try {
+            const run = await api.resumeRun(jobId, activeRun.id, parallelism);
+            setActiveRun(run);
+            startStreaming(run.id);
+        } catch (err) {
+            setError(err.message);
+        } finally {
+            setLoading(false);
         }
     };
 
-    const loadRunData = async (runId) => {
-        try {
-            const [runData, devicesData] = await Promise.all([
-                api.getRun(runId),
-                api.getRunDevices(runId)
-            ]);
-
-            setActiveRun(runData);
-            setRunDevices(devicesData);
+    const startStreaming = (runId) => {
+        stopStreaming();
+        setRunDevices([]);
+        setRunLogs([]);
+
+        // EventSource reconnects on its own and resumes after the last log id it received
+        const source = new EventSource(api.getRunEventsUrl(runId));
+        source.addEventListener('run', (e) => setActiveRun(JSON.parse(e.data)));
+        source.addEventListener('device', (e) => {
+            const rd = JSON.parse(e.data);
+            setRunDevices(prev => {
+                const idx = prev.findIndex(d => d.device_id === rd.device_id);
+                if (idx === -1) return [...prev, rd];
+                const next = [...prev];
+                next[idx] = { ...next[idx], ...rd };
+                return next;
+            });
+        });
+        source.addEventListener('log', (e) => {
+            const log = JSON.parse(e.data);
+            setRunLogs(prev => (prev.length && prev[prev.length - 1].id >= log.id) ? prev : [...prev, log]);
+        });
+        source.addEventListener('end', () => stopStreaming());
+        source.onerror = () => console.error("Run event stream interrupted, reconnecting");
+        eventSource.current = source;
+    };
 
-            if (runData.status !== 'running') {
-                stopPolling();
-            }
-        } catch (err) {
-            console.error("Polling error", err);
+    const stopStreaming = () => {
+        if (eventSource.current) {
+            eventSource.current.close();
+            eventSource.current = null;
         }
     };
 
-    const viewEvents = async (deviceId) => {
+    const loadRaw = async (logId) => {
         try {
-            const events = await api.getRunLogs(activeRun.id);
-            // Filter for specific device
-            const deviceEvents = events.filter(e => e.device_id === deviceId);
-            const devName = runDevices.find(rd => rd.device_id === deviceId)?.status || 'Device';
-            setSelectedDeviceEvents({ deviceId, events: deviceEvents });
+            const raw = await api.getRunLogRaw(activeRun.id, logId);
+            setRawBodies(prev => ({ ...prev, [logId]: raw }));
         } catch (err) {
-            alert("Failed to load events: " + err.message);
+            alert("Failed to load raw output: " + err.message);
         }
     };
 
+    const viewEvents = (deviceId) => {
+        // Logs arrive over the event stream, no extra request needed
+        const deviceEvents = runLogs.filter(e => e.device_id === deviceId);
+        setSelectedDeviceEvents({ deviceId, events: deviceEvents });
+    };
+
     return (
         <div className="card">
             <div className="flex justify-between items-center">
                 <h2>Step 5: Execution Dashboard</h2>
                 {activeRun && (
-                    <span className={`badge badge-${activeRun.status === 'running' ? 'running' : 'verified'}`}>
+                    <span className={`badge badge-${isActive(activeRun) ? 'running' : 'verified'}`}>
                         Run #{activeRun.id}: {activeRun.status}
                     </span>
                 )}
@@ -161,13 +186,18 @@ function Step5Run({ jobId, onReset }) {
                         </tbody>
                     </table>
 
-                    {activeRun.status !== 'running' && (
+                    {!isActive(activeRun) && (
                         <div className="mt-8 card" style={{ background: 'rgba(99, 102, 241, 0.1)', borderColor: 'var(--primary-color)' }}>
                             <h3>Run Completed</h3>
                             <p>Deployment finished. You can now download the audit reports.</p>
                             <div className="flex gap-2 mt-4">
                                 <button className="btn btn-secondary" onClick={() => api.downloadReport(activeRun.id, 'csv')}>Download CSV Report</button>
                                 <button className="btn btn-secondary" onClick={() => api.downloadReport(activeRun.id, 'json')}>Download JSON Report</button>
+                                {runDevices.some(rd => rd.status === 'FAILED') && (
+                                    <button className="btn btn-secondary" onClick={resumeRun} disabled={loading}>
+                                        {loading ? 'Resuming...' : 'Resume Failed Devices'}
+                                    </button>
+                                )}
                                 <button className="btn btn-primary" onClick={onReset}>Start New Job</button>
                             </div>
                         </div>
@@ -196,7 +226,12 @@ function Step5Run({ jobId, onReset }) {
                                     }}>
                                         {e.level}: {e.message}
                                     </span>
-                                    {e.raw && <pre style={{ marginTop: '0.25rem', fontSize: '0.75rem', color: '#6b7280', overflowX: 'auto' }}>{e.raw}</pre>}
+                                    {e.has_raw && rawBodies[e.id] === undefined && (
+                                        <button className="btn btn-ghost" style={{ padding: '0 0.5rem', fontSize: '0.7rem' }} onClick={() => loadRaw(e.id)}>
+                                            Show raw
+                                        </button>
+                                    )}
+                                    {rawBodies[e.id] !== undefined && <pre style={{ marginTop: '0.25rem', fontSize: '0.75rem', color: '#6b7280', overflowX: 'auto' }}>{rawBodies[e.id]}</pre>}
                                 </div>
                             ))}
                             {selectedDeviceEvents.events.length === 0 && <p className="text-center">No logs found for this device.</p>}